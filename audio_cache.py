@@ -0,0 +1,142 @@
+from __future__ import annotations
+import asyncio, os, shlex, time
+from collections import OrderedDict
+from typing import Optional, Set
+
+import config
+from audio_pipeline import BEFORE_OPTIONS, LOUDNORM_FILTER
+
+CACHE_DIR = os.path.join("data", "audio_cache")
+
+
+class AudioCache:
+    """
+    On-disk cache of already-normalized Opus files keyed by video id.
+
+    Files are produced by a background ffmpeg job the first time a track plays and are then
+    served with codec="copy", skipping the stream, loudnorm and libopus encode entirely.
+    Total size is bounded by `max_bytes`; the least recently played files are evicted first
+    (recency is the file mtime, so it survives restarts without a separate index).
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = 1024 * 1024 * 1024, max_jobs: int = 2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._files: OrderedDict[str, int] = OrderedDict()   # video id -> size, oldest first
+        self._size = 0
+        self._filling: Set[str] = set()
+        self._jobs = asyncio.Semaphore(max_jobs)
+        self.hits = 0
+        self.misses = 0
+        self.fills = 0
+        self.fill_failures = 0
+        self.evictions = 0
+        self._scan()
+
+    def _path(self, video_id: str) -> str:
+        return os.path.join(self.directory, f"{video_id}.opus")
+
+    def _scan(self):
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".part"):
+                os.remove(entry.path)   # interrupted fill
+            elif entry.name.endswith(".opus"):
+                st = entry.stat()
+                found.append((st.st_mtime, entry.name[:-5], st.st_size))
+        for _, vid, size in sorted(found):
+            self._files[vid] = size
+            self._size += size
+        self._evict()
+
+    # ----------------------------- lookups -----------------------------
+    def contains(self, video_id: str) -> bool:
+        return video_id in self._files
+
+    def path_for(self, video_id: str) -> Optional[str]:
+        """Cached file for a video id, marking it recently used. Counts a hit or miss."""
+        if video_id not in self._files:
+            self.misses += 1
+            return None
+        path = self._path(video_id)
+        if not os.path.exists(path):
+            self._size -= self._files.pop(video_id)
+            self.misses += 1
+            return None
+        self._files.move_to_end(video_id)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return path
+
+    # ----------------------------- filling -----------------------------
+    def schedule_fill(self, video_id: str, audio_url: str, audio_filter: str = LOUDNORM_FILTER) -> None:
+        if video_id in self._files or video_id in self._filling:
+            return
+        self._filling.add(video_id)
+        asyncio.create_task(self._fill(video_id, audio_url, audio_filter))
+
+    async def _fill(self, video_id: str, audio_url: str, audio_filter: str):
+        path = self._path(video_id)
+        tmp = path + ".part"
+        try:
+            async with self._jobs:
+                started = time.monotonic()
+                proc = await asyncio.create_subprocess_exec(
+                    config.FFMPEG_PATH, "-nostdin", "-loglevel", "error", "-y",
+                    *shlex.split(BEFORE_OPTIONS), "-i", audio_url,
+                    "-vn", "-af", audio_filter, "-c:a", "libopus", "-b:a", "96k", "-ar", "48000", "-ac", "2",
+                    "-f", "opus", tmp,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                _, err = await proc.communicate()
+            if proc.returncode != 0:
+                raise RuntimeError(err.decode(errors="replace").strip() or f"ffmpeg exited {proc.returncode}")
+            os.replace(tmp, path)
+            size = os.path.getsize(path)
+            self._files[video_id] = size
+            self._size += size
+            self.fills += 1
+            print(f"[audio-cache] cached {video_id} ({size // 1024} KiB in {time.monotonic() - started:.1f}s)")
+            self._evict()
+        except Exception as e:
+            self.fill_failures += 1
+            print(f"[audio-cache] fill failed for {video_id}: {type(e).__name__}: {e}")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+        finally:
+            self._filling.discard(video_id)
+
+    def _evict(self):
+        for vid in list(self._files):
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(self._path(vid))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue   # still open by a player (Windows); try the next one
+            self._size -= self._files.pop(vid)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "files": len(self._files),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "fills": self.fills,
+            "fill_failures": self.fill_failures,
+            "filling": len(self._filling),
+            "evictions": self.evictions,
+        }
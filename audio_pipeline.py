@@ -0,0 +1,69 @@
+from __future__ import annotations
+from collections import deque
+from typing import Deque
+
+import discord
+
+import config
+
+BEFORE_OPTIONS = "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
+LOUDNORM_FILTER = "loudnorm=I=-16:TP=-1.5:LRA=11"
+FRAME_SECONDS = 0.02   # audio in one Opus packet sent to Discord
+
+
+def _seek(start: float) -> str:
+    return f" -ss {start:.2f}" if start > 0 else ""
+
+
+def ffmpeg_source(audio_url: str, audio_filter: str = LOUDNORM_FILTER, start: float = 0.0) -> discord.FFmpegOpusAudio:
+    """Spawn the ffmpeg pipeline that streams, normalizes and encodes one track, optionally from `start` seconds in."""
+    return discord.FFmpegOpusAudio(
+        audio_url,
+        before_options=BEFORE_OPTIONS + _seek(start),
+        options=f'-vn -af "{audio_filter}" -c:a libopus -b:a 96k',
+        executable=config.FFMPEG_PATH,
+    )
+
+
+def cached_source(path: str, start: float = 0.0) -> discord.FFmpegOpusAudio:
+    """Play an already-normalized Opus file from the audio cache; packets are copied, not re-encoded."""
+    return discord.FFmpegOpusAudio(path, codec="copy", before_options=_seek(start).strip() or None,
+                                   options="-vn", executable=config.FFMPEG_PATH)
+
+
+class PrimedSource(discord.AudioSource):
+    """
+    Wraps an Opus source whose first packets were read ahead of time, so the voice player gets
+    audio the instant it starts instead of waiting on ffmpeg spawn, the HTTP connect and the
+    loudnorm look-ahead.
+
+    prime() blocks (run it in an executor) and must finish before the source is handed to
+    VoiceClient.play; after that only the player thread reads from it. `frames` counts packets
+    handed to the player, which is how far into the track playback really is (pauses included).
+    """
+
+    def __init__(self, source: discord.AudioSource):
+        self.source = source
+        self._buffer: Deque[bytes] = deque()
+        self.frames = 0
+
+    def prime(self, frames: int) -> int:
+        while len(self._buffer) < frames:
+            packet = self.source.read()
+            if not packet:
+                break
+            self._buffer.append(packet)
+        return len(self._buffer)
+
+    def read(self) -> bytes:
+        packet = self._buffer.popleft() if self._buffer else self.source.read()
+        if packet:
+            self.frames += 1
+        return packet
+
+    def is_opus(self) -> bool:
+        return self.source.is_opus()
+
+    def cleanup(self) -> None:
+        self._buffer.clear()
+        self.source.cleanup()
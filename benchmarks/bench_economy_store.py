@@ -0,0 +1,93 @@
+"""
+Economy storage cost on a 10k-user economy: the whole-file JSON store, the SQLite one, and the
+write-behind cache in front of SQLite (what the bot uses by default).
+
+Each simulated hand does what /blackjack does to the store: read the balance, debit the bet,
+then settle the round (payout plus stats) in one call. Hands for random users run
+concurrently on one event loop, and throughput plus per-hand latency are reported.
+
+    python benchmarks/bench_economy_store.py [--users 10000] [--hands 2000] [--concurrency 50]
+"""
+from __future__ import annotations
+import argparse, asyncio, json, os, random, shutil, sys, tempfile, time, types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# economy_store only reads optional knobs from config; don't require the bot's .env for a benchmark
+sys.modules.setdefault("config", types.ModuleType("config"))
+
+from economy_store import CachedEconomyStore, JsonEconomyStore, SqliteEconomyStore, _new_row
+
+
+def _seed(path: str, users: int):
+    eco = {}
+    for uid in range(users):
+        row = _new_row()
+        row.update(balance=random.randint(0, 50000), hands=random.randint(0, 500))
+        eco[str(uid)] = row
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(eco, f, indent=2)
+
+
+async def _hand(store, user_id: int, latencies: list):
+    t0 = time.perf_counter()
+    bal = await store.get_balance(user_id)
+    bet = min(bal, random.randint(1, 500))
+    if await store.debit(user_id, bet) is not None:
+        outcome = random.choice(("wins", "losses", "pushes"))
+        payout = {"wins": 2 * bet, "losses": 0, "pushes": bet}[outcome]
+        await store.settle(user_id, payout, **{outcome: 1}, biggest_win=bet if outcome == "wins" else 0)
+    latencies.append(time.perf_counter() - t0)
+
+
+async def _run(store, users: int, hands: int, concurrency: int):
+    latencies: list = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            await _hand(store, random.randrange(users), latencies)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(hands)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return hands / elapsed, latencies[len(latencies) // 2] * 1e3, latencies[int(len(latencies) * 0.99)] * 1e3
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=10000)
+    ap.add_argument("--hands", type=int, default=2000)
+    ap.add_argument("--json-hands", type=int, default=100, help="the JSON store is slow; fewer hands for it")
+    ap.add_argument("--concurrency", type=int, default=50)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="econ-bench-")
+    try:
+        json_path = os.path.join(tmp, "economy.json")
+        _seed(json_path, args.users)
+        print(f"{args.users} users, {args.concurrency} hands in flight, "
+              f"economy.json is {os.path.getsize(json_path) / 1e6:.1f} MB\n")
+        t0 = time.perf_counter()
+        sqlite = SqliteEconomyStore(os.path.join(tmp, "economy.db"), json_path)
+        print(f"(one-time migration into SQLite took {(time.perf_counter() - t0) * 1e3:.0f} ms)\n")
+
+        print(f"{'backend':<8} {'hands':>6} {'hands/s':>10} {'p50 ms':>9} {'p99 ms':>9}")
+
+        for name, make, hands in (("json", lambda: JsonEconomyStore(json_path), args.json_hands),
+                                  ("sqlite", lambda: sqlite, args.hands),
+                                  ("cached", lambda: CachedEconomyStore(SqliteEconomyStore(os.path.join(tmp, "economy.db"))), args.hands)):
+            t0 = time.perf_counter()
+            store = make()
+            opened = (time.perf_counter() - t0) * 1e3
+            rate, p50, p99 = asyncio.run(_run(store, args.users, hands, args.concurrency))
+            t0 = time.perf_counter()
+            store.close()   # the cache's final flush lands here
+            closed = (time.perf_counter() - t0) * 1e3
+            print(f"{name:<8} {hands:>6} {rate:>10.1f} {p50:>9.3f} {p99:>9.3f}   (open {opened:.0f} ms, close {closed:.0f} ms)")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
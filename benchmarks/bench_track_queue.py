@@ -0,0 +1,115 @@
+"""
+Queue editing cost: the old deque against track_queue.TrackQueue, at growing queue sizes.
+
+Each operation is repeated at random positions on a queue of N tracks (30% of them duplicate
+videos, like a big Spotify import played twice) and the mean time per call is reported.
+
+    python benchmarks/bench_track_queue.py [--sizes 1000 10000 50000] [--ops 2000]
+"""
+from __future__ import annotations
+import argparse, gc, itertools, os, random, sys, time
+from collections import deque
+from dataclasses import dataclass
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from track_queue import TrackQueue
+
+
+@dataclass(eq=False)
+class _Track:
+    # same shape as music.Track without importing discord
+    query: str
+    title: str
+    video_id: Optional[str] = None
+    duration: Optional[int] = None
+
+
+def _tracks(n: int):
+    distinct = max(1, int(n * 0.7))
+    return [_Track(f"q{i}", f"Song {i}", f"vid{random.randrange(distinct)}", 200) for i in range(n)]
+
+
+# ------------------------- deque versions (what music.py could do before) -------------------------
+def _deque_remove(q: deque, i: int):
+    q.rotate(-i)
+    t = q.popleft()
+    q.rotate(i)
+    return t
+
+def _deque_move(q: deque, src: int, dst: int):
+    t = _deque_remove(q, src)
+    q.insert(dst, t)
+
+def _deque_dedupe(q: deque):
+    seen, kept = set(), deque()
+    for t in q:
+        if t.video_id not in seen:
+            seen.add(t.video_id)
+            kept.append(t)
+    return kept
+
+
+def _time(fn, reps: int) -> float:
+    # like timeit, keep the collector out of the timing: a full pass over the 50k tracks can land
+    # in any single call and doubles whichever one it hits
+    gc.collect()
+    gc.disable()
+    try:
+        t0 = time.perf_counter()
+        for _ in range(reps):
+            fn()
+        return (time.perf_counter() - t0) / reps * 1e6   # microseconds per call
+    finally:
+        gc.enable()
+
+
+def bench(n: int, ops: int):
+    base = _tracks(n)
+    d, tq = deque(base), TrackQueue(base)
+    rnd = lambda: random.randrange(n - 1)
+
+    def d_remove():
+        i = rnd()
+        d.insert(i, _deque_remove(d, i))
+
+    def q_remove():
+        i = rnd()
+        tq.insert(i, tq.pop(i))
+
+    results = {
+        "remove+reinsert": (_time(d_remove, ops), _time(q_remove, ops)),
+        "move": (_time(lambda: _deque_move(d, rnd(), rnd()), ops),
+                 _time(lambda: tq.move(rnd(), rnd()), ops)),
+        "read position": (_time(lambda: d[rnd()], ops), _time(lambda: tq[rnd()], ops)),
+        # the best a deque can do: walk to i without copying the whole queue first
+        "page of 10": (_time(lambda: list(itertools.islice(d, (i := rnd()), i + 10)), ops),
+                       _time(lambda: tq.slice((i := rnd()), i + 10), ops)),
+    }
+    # whole-queue operations: time them once each on a fresh copy
+    dd, qq = deque(base), TrackQueue(base)
+    results["dedupe"] = (_time(lambda: _deque_dedupe(dd), 1), _time(lambda: qq.dedupe(), 1))
+    results["dedupe again"] = (_time(lambda: _deque_dedupe(dd), 1), _time(lambda: qq.dedupe(), 1))
+    dd, qq = deque(base), TrackQueue(base)
+    half = n // 2
+    results["jump to middle"] = (_time(lambda: [dd.popleft() for _ in range(half)], 1), _time(lambda: qq.jump(half), 1))
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    ap.add_argument("--ops", type=int, default=2000)
+    args = ap.parse_args()
+    random.seed(0)
+
+    for n in args.sizes:
+        print(f"\n{n} tracks (µs per call)")
+        print(f"{'operation':<18}{'deque':>12}{'TrackQueue':>14}")
+        for op, (d_us, q_us) in bench(n, args.ops).items():
+            print(f"{op:<18}{d_us:12.1f}{q_us:14.1f}")
+
+
+if __name__ == "__main__":
+    main()
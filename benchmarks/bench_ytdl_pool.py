@@ -0,0 +1,95 @@
+"""
+Per-query extraction latency: a fresh YoutubeDL per call (the old _search_ytdlp) vs the
+thread-confined instance pool in ytdl.py.
+
+Queries are direct-media URLs served by a local stub HTTP server, so the numbers measure
+YoutubeDL construction, extractor setup and connection reuse rather than YouTube itself.
+
+    python benchmarks/bench_ytdl_pool.py [--queries 200] [--workers 4]
+"""
+from __future__ import annotations
+import argparse, os, statistics, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_dlp
+import ytdl
+
+PAYLOAD = b"\xff\xfb\x90\x00" + b"\x00" * 4092   # one silent-ish MP3 frame worth of bytes
+
+
+class _Stub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _headers(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._headers()
+
+    def do_GET(self):
+        self._headers()
+        self.wfile.write(PAYLOAD)
+
+    def log_message(self, *args):
+        pass
+
+
+def _fresh_instance(query: str) -> dict:
+    # what _search_ytdlp used to do for every query
+    return yt_dlp.YoutubeDL(ytdl._options(ytdl.CLIENT_CHAIN[0], False)).extract_info(query, download=False)
+
+
+def _pooled(query: str) -> dict:
+    return ytdl.extract(query)
+
+
+def _run(fn, queries, workers):
+    latencies = []
+
+    def timed(q):
+        t0 = time.perf_counter()
+        fn(q)
+        latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(timed, queries))
+    return time.perf_counter() - t0, latencies
+
+
+def _report(name, wall, lat):
+    lat_ms = sorted(x * 1000 for x in lat)
+    p95 = lat_ms[int(len(lat_ms) * 0.95) - 1]
+    print(f"{name:<14} wall {wall:6.2f}s   median {statistics.median(lat_ms):7.2f} ms   "
+          f"p95 {p95:7.2f} ms   mean {statistics.mean(lat_ms):7.2f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--workers", type=int, default=4)
+    args = ap.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Stub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    queries = [f"{base}/track{i % 50}.mp3" for i in range(args.queries)]
+
+    # warm imports / lazy extractor loading so neither side pays it in the numbers
+    _fresh_instance(queries[0])
+    _pooled(queries[0])
+
+    print(f"{args.queries} queries, {args.workers} worker threads, stub at {base}")
+    _report("fresh per call", *_run(_fresh_instance, queries, args.workers))
+    _report("pooled", *_run(_pooled, queries, args.workers))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import asyncio, signal
 import discord, config, music, task_manager
 from discord.ext import commands, tasks
 import command_handler
@@ -10,8 +11,16 @@ intents.message_content = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 
 
-command_handler.setup_all(bot)
-music.setup_music(bot)
+
+@bot.event
+async def setup_hook():
+    # A bare SIGTERM (systemd, docker stop) ends the process without running atexit, so the
+    # economy's write-behind cache never gets its final flush. Close the bot instead; bot.run()
+    # then returns normally and the exit hooks run.
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+    except NotImplementedError:
+        pass   # Windows has no loop signal handlers; Ctrl+C still closes cleanly
 
 
 @bot.event
@@ -37,4 +46,9 @@ async def on_ready():
     curseforge_check.start(bot)
 
 
-bot.run(config.TOKEN)
+# Guarded so importing this file never starts a bot (yt-dlp workers start from ytdl_worker, not here).
+if __name__ == "__main__":
+    command_handler.setup_all(bot)
+    music.setup_music(bot)
+    bot.run(config.TOKEN)
+
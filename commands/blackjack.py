@@ -1,93 +1,47 @@
 from __future__ import annotations
-import json, os, random, asyncio
+import json, os, random, asyncio, time
 from dataclasses import dataclass, field
-from typing import List, Tuple, Optional
+from typing import Dict, List, Set, Tuple, Optional
 
 import discord, config
 from discord import app_commands
 from discord.ext import commands
 
+from economy_store import get_store
+from keyed_locks import KeyedLocks
+from timer_wheel import TimerWheel
+
 DATA_DIR = "data"
-ECON_FILE = os.path.join(DATA_DIR, "economy.json")
-STATE_FILE = os.path.join(DATA_DIR, "blackjack_states.json")
+SESSIONS_DIR = os.path.join(DATA_DIR, "blackjack")   # one small record per active hand
+STATE_FILE = os.path.join(DATA_DIR, "blackjack_states.json")   # old all-in-one format, imported once
 
-_ec_lock = asyncio.Lock()
-STATE_TTL_SECONDS = 300   # hand expires if idle > 5 minutes (persisted but not playable)
-STARTING_BALANCE = 500
+_user_locks = KeyedLocks()      # one player's commands run one at a time; different players in parallel
+STATE_TTL_SECONDS = 300   # hand expires if idle > 5 minutes; its bet is then settled per STALE_HANDS
+STALE_HANDS = getattr(config, "BLACKJACK_STALE_HANDS", "forfeit")   # "forfeit" (counts as a loss) or "refund"
 
-# ----------------------------- storage helpers -----------------------------
-def _ensure_files():
-    os.makedirs(DATA_DIR, exist_ok=True)
-    if not os.path.exists(ECON_FILE):
-        with open(ECON_FILE, "w", encoding="utf-8") as f:
-            json.dump({}, f)
-    if not os.path.exists(STATE_FILE):
-        with open(STATE_FILE, "w", encoding="utf-8") as f:
-            json.dump({}, f)
-
-async def _load_json(path: str) -> dict:
-    _ensure_files()
-    async with _ec_lock:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-
-async def _save_json(path: str, data: dict) -> None:
-    _ensure_files()
-    async with _ec_lock:
-        tmp = path + ".tmp"
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
-        os.replace(tmp, path)
+SESSIONS: Dict[int, "BJState"] = {}   # user id -> active hand; authoritative, records are for restarts
+_expiry = TimerWheel(tick=5, name="blackjack")
+_tasks: Set[asyncio.Task] = set()   # expiries and replies in flight; the loop only holds tasks weakly
 
-def _ensure_user_row(eco: dict, user_id: int) -> dict:
-    s = str(user_id)
-    if s not in eco:
-        eco[s] = {
-            "balance": STARTING_BALANCE,
-            "wins": 0,
-            "losses": 0,
-            "pushes": 0,
-            "hands": 0,
-            "biggest_win": 0,
-            "last_charity_ymd": None
-        }
-    return eco[s]
+# ----------------------------- storage helpers -----------------------------
 
+# balances and stats live in economy_store (SQLite by default, see ECONOMY_BACKEND)
 async def _get_balance(user_id: int) -> int:
-    eco = await _load_json(ECON_FILE)
-    row = _ensure_user_row(eco, user_id)
-    await _save_json(ECON_FILE, eco)
-    return int(row["balance"])
-
-async def _set_balance(user_id: int, new_balance: int):
-    eco = await _load_json(ECON_FILE)
-    row = _ensure_user_row(eco, user_id)
-    row["balance"] = max(0, int(new_balance))
-    await _save_json(ECON_FILE, eco)
-
-async def _bump_stats(user_id: int, *, win=0, loss=0, push=0, payout=0):
-    eco = await _load_json(ECON_FILE)
-    row = _ensure_user_row(eco, user_id)
-    row["wins"] += win
-    row["losses"] += loss
-    row["pushes"] += push
-    if win or loss or push:
-        row["hands"] += 1
-    if payout > row.get("biggest_win", 0):
-        row["biggest_win"] = payout
-    await _save_json(ECON_FILE, eco)
+    return await get_store().get_balance(user_id)
+
+async def _debit(user_id: int, amount: int) -> Optional[int]:
+    """Take a bet; the new balance, or None if they can't cover it. Check and debit are one step."""
+    return await get_store().debit(user_id, amount)
+
+async def _settle(user_id: int, delta: int = 0, **stats) -> int:
+    """Pay out a round and record its results in one write; returns the new balance."""
+    return await get_store().settle(user_id, delta, **stats)
 
 async def _get_last_charity_ymd(user_id: int) -> Optional[str]:
-    eco = await _load_json(ECON_FILE)
-    row = _ensure_user_row(eco, user_id)
-    await _save_json(ECON_FILE, eco)
-    return row.get("last_charity_ymd")
+    return await get_store().get_last_charity_ymd(user_id)
 
 async def _set_last_charity_ymd(user_id: int, ymd: str):
-    eco = await _load_json(ECON_FILE)
-    row = _ensure_user_row(eco, user_id)
-    row["last_charity_ymd"] = ymd
-    await _save_json(ECON_FILE, eco)
+    await get_store().set_last_charity_ymd(user_id, ymd)
 
 def _parse_bet(bet_raw: Optional[str], balance: int) -> Optional[int]:
     if bet_raw is None:
@@ -105,9 +59,9 @@ def _parse_bet(bet_raw: Optional[str], balance: int) -> Optional[int]:
 SUITS = ["♠", "♥", "♦", "♣"]
 RANKS = ["A", "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K"]
 
-def _new_deck(shoe_decks: int = 6) -> List[str]:
+def _new_deck(shoe_decks: int = 6, seed: Optional[int] = None) -> List[str]:
     deck = [f"{r}{s}" for r in RANKS for s in SUITS] * shoe_decks
-    random.shuffle(deck)
+    random.Random(seed).shuffle(deck)
     return deck
 
 def _rank(card: str) -> str:
@@ -145,7 +99,10 @@ def _is_blackjack(cards: List[str]) -> bool:
 class BJState:
     user_id: int
     bet: int
-    deck: List[str] = field(default_factory=_new_deck)
+    # the shoe is dealt from the end of `deck`, which is rebuilt from `seed` when a hand is restored
+    # (None: an older hand that came with its deck spelled out, and keeps it that way)
+    seed: Optional[int] = None
+    deck: List[str] = field(default_factory=list)
 
     # Hand 1 (always exists)
     player: List[str] = field(default_factory=list)
@@ -167,11 +124,18 @@ class BJState:
     active_idx: int = 1  # 1 or 2 (if split)
     last_ts: float = 0.0
 
+    def __post_init__(self):
+        if not self.deck:
+            if self.seed is None:
+                self.seed = random.getrandbits(64)
+            self.deck = _new_deck(seed=self.seed)
+
     def serialize(self) -> dict:
+        shoe = {"deck": self.deck} if self.seed is None else {"seed": self.seed, "left": len(self.deck)}
         return {
             "user_id": self.user_id,
             "bet": self.bet,
-            "deck": self.deck,
+            **shoe,
             "player": self.player,
             "doubled1": self.doubled1,
             "surrendered1": self.surrendered1,
@@ -190,8 +154,11 @@ class BJState:
 
     @staticmethod
     def deserialize(d: dict) -> "BJState":
-        obj = BJState(d["user_id"], d["bet"])
-        obj.deck = d["deck"]
+        if "deck" in d:   # written before shoes were seeded
+            obj = BJState(d["user_id"], d["bet"], deck=d["deck"])
+        else:
+            obj = BJState(d["user_id"], d["bet"], seed=d["seed"])
+            del obj.deck[d["left"]:]
         obj.player = d["player"]
         obj.doubled1 = d.get("doubled1", False)
         obj.surrendered1 = d.get("surrendered1", False)
@@ -208,25 +175,112 @@ class BJState:
         obj.last_ts = d.get("last_ts", 0.0)
         return obj
 
+def _session_path(user_id: int) -> str:
+    return os.path.join(SESSIONS_DIR, f"{user_id}.json")
+
 async def _load_state(user_id: int) -> BJState | None:
-    states = await _load_json(STATE_FILE)
-    s = states.get(str(user_id))
-    if not s:
-        return None
-    return BJState.deserialize(s)
+    return SESSIONS.get(user_id)
 
 async def _save_state(state: BJState | None):
-    states = await _load_json(STATE_FILE)
+    """Keep the hand in the session table, write its record, and push back its expiry."""
     if state is None:
-        await _save_json(STATE_FILE, states)
         return
-    states[str(state.user_id)] = state.serialize()
-    await _save_json(STATE_FILE, states)
+    SESSIONS[state.user_id] = state
+    _schedule_expiry(state.user_id, STATE_TTL_SECONDS)
+    path = _session_path(state.user_id)
+    try:
+        os.makedirs(SESSIONS_DIR, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state.serialize(), f, separators=(",", ":"))
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[blackjack] Could not save hand for {state.user_id}: {type(e).__name__}: {e}")
 
 async def _clear_state(user_id: int):
-    states = await _load_json(STATE_FILE)
-    states.pop(str(user_id), None)
-    await _save_json(STATE_FILE, states)
+    SESSIONS.pop(user_id, None)
+    _expiry.cancel(user_id)
+    try:
+        os.remove(_session_path(user_id))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"[blackjack] Could not remove hand for {user_id}: {type(e).__name__}: {e}")
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+def _schedule_expiry(user_id: int, delay: float, replace: bool = True):
+    _expiry.schedule(user_id, delay, lambda: _spawn(_expire_hand(user_id)), replace=replace)
+
+async def _expire_hand(user_id: int) -> Optional[str]:
+    """Settle a hand left idle past STATE_TTL_SECONDS: refund its stakes or forfeit them."""
+    async with _user_locks(user_id):
+        state = SESSIONS.get(user_id)
+        if state is None:
+            return None
+        idle = time.time() - state.last_ts
+        if state.last_ts and idle < STATE_TTL_SECONDS:
+            _schedule_expiry(user_id, STATE_TTL_SECONDS - idle)   # played since the timer was set
+            return None
+        await _clear_state(user_id)
+        hands = [(state.bet, state.surrendered1)]
+        if state.split:
+            hands.append((state.bet2, state.surrendered2))
+        stake = sum(bet for bet, _ in hands)
+        returned, losses = 0, 0
+        for bet, folded in hands:
+            if folded:
+                returned += bet // 2   # a folded hand is owed half its bet either way, as in a resolved round
+                losses += 1
+            elif STALE_HANDS == "refund":
+                returned += bet
+            else:
+                losses += 1
+        await _settle(user_id, returned, losses=losses)
+        if returned == stake:
+            outcome = f"Your **${stake}** bet was returned."
+        elif returned:
+            outcome = f"**${returned}** of your **${stake}** bet was returned."
+        else:
+            outcome = f"Your **${stake}** bet was forfeited."
+        print(f"[blackjack] Hand for {user_id} expired; {STALE_HANDS}, returned ${returned} of ${stake}")
+        return outcome
+
+def _restore_sessions():
+    """Load saved hands (and the old blackjack_states.json, once) into the session table."""
+    if os.path.exists(STATE_FILE):
+        try:
+            with open(STATE_FILE, "r", encoding="utf-8") as f:
+                old = json.load(f)
+            os.makedirs(SESSIONS_DIR, exist_ok=True)
+            for d in old.values():
+                if d.get("active"):
+                    with open(_session_path(d["user_id"]), "w", encoding="utf-8") as f:
+                        json.dump(BJState.deserialize(d).serialize(), f, separators=(",", ":"))
+            os.replace(STATE_FILE, STATE_FILE + ".migrated")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[blackjack] Could not import {STATE_FILE}: {type(e).__name__}: {e}")
+    if not os.path.isdir(SESSIONS_DIR):
+        return
+    for entry in os.scandir(SESSIONS_DIR):
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            with open(entry.path, "r", encoding="utf-8") as f:
+                state = BJState.deserialize(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[blackjack] Skipping damaged hand {entry.path}: {type(e).__name__}: {e}")
+            continue
+        SESSIONS[state.user_id] = state
+
+async def _arm_expiry():
+    # on_ready can fire again after a reconnect; timers already running are left alone
+    for user_id, state in SESSIONS.items():
+        _schedule_expiry(user_id, max(0.0, state.last_ts + STATE_TTL_SECONDS - time.time()), replace=False)
 
 def _format_hand(cards: List[str], hide_first: bool = False) -> str:
     if not hide_first:
@@ -340,12 +394,17 @@ async def _dealer_play(state: BJState):
             break
 
 async def _resolve_split_or_single(inter: discord.Interaction, state: BJState, *, natural: bool = False):
-    """Resolve a single-hand round or both hands if split."""
+    """Resolve a single-hand round or both hands if split, settling it with one store write."""
     user_id = inter.user.id
     results_lines: List[str] = []
     total_payout = 0
+    outcome = {"wins": 0, "losses": 0, "pushes": 0, "biggest_win": 0}
+
+    def record(result: str, won: int = 0):
+        outcome[result] += 1
+        outcome["biggest_win"] = max(outcome["biggest_win"], won)
 
-    async def settle_one(cards: List[str], bet: int, tag: str):
+    def settle_one(cards: List[str], bet: int, tag: str):
         nonlocal total_payout
         pv, _ = _hand_value(cards)
         dv, _ = _hand_value(state.dealer)
@@ -356,46 +415,46 @@ async def _resolve_split_or_single(inter: discord.Interaction, state: BJState, *
             if player_bj and dealer_bj:
                 results_lines.append(f"{tag}: Push on blackjacks. Bet returned.")
                 total_payout += bet
-                await _bump_stats(user_id, push=1)
+                record("pushes")
             elif player_bj:
                 win_amt = int(bet * 2.5)
                 total_payout += win_amt
                 results_lines.append(f"{tag}: Blackjack — you win **${win_amt - bet}**.")
-                await _bump_stats(user_id, win=1, payout=win_amt - bet)
+                record("wins", win_amt - bet)
             else:
                 results_lines.append(f"{tag}: Dealer blackjack. You lose.")
-                await _bump_stats(user_id, loss=1)
+                record("losses")
             return
 
         if pv > 21:
             results_lines.append(f"{tag}: You busted. You lose.")
-            await _bump_stats(user_id, loss=1)
+            record("losses")
             return
 
         if dv > 21:
             win_amt = bet * 2
             total_payout += win_amt
             results_lines.append(f"{tag}: Dealer busts — you win **${win_amt - bet}**.")
-            await _bump_stats(user_id, win=1, payout=win_amt - bet)
+            record("wins", win_amt - bet)
         elif pv > dv:
             win_amt = bet * 2
             total_payout += win_amt
             results_lines.append(f"{tag}: You win **${win_amt - bet}**.")
-            await _bump_stats(user_id, win=1, payout=win_amt - bet)
+            record("wins", win_amt - bet)
         elif pv < dv:
             results_lines.append(f"{tag}: You lose.")
-            await _bump_stats(user_id, loss=1)
+            record("losses")
         else:
             total_payout += bet
             results_lines.append(f"{tag}: Push. Bet returned.")
-            await _bump_stats(user_id, push=1)
+            record("pushes")
 
     # if folded (surrendered) on single-hand flow
     if not state.split and state.surrendered1:
         refund = state.bet // 2
         total_payout += refund
         results_lines.append(f"Returned **${refund}** for folding.")
-        await _bump_stats(user_id, loss=1)
+        record("losses")
     else:
         # If both hands finished (or single), dealer plays (except pure natural resolution handled upstream)
         if not natural:
@@ -407,36 +466,36 @@ async def _resolve_split_or_single(inter: discord.Interaction, state: BJState, *
                 r = state.bet // 2
                 total_payout += r
                 results_lines.append(f"Hand 1: Folded — returned **${r}**.")
-                await _bump_stats(user_id, loss=1)
+                record("losses")
             else:
-                await settle_one(state.player, state.bet, "Hand 1")
+                settle_one(state.player, state.bet, "Hand 1")
 
             # Hand 2
             if state.surrendered2:
                 r = state.bet2 // 2
                 total_payout += r
                 results_lines.append(f"Hand 2: Folded — returned **${r}**.")
-                await _bump_stats(user_id, loss=1)
+                record("losses")
             else:
-                await settle_one(state.hand2, state.bet2, "Hand 2")
+                settle_one(state.hand2, state.bet2, "Hand 2")
         else:
-            await settle_one(state.player, state.bet, "Result")
+            settle_one(state.player, state.bet, "Result")
 
-    if total_payout:
-        bal = await _get_balance(user_id)
-        await _set_balance(user_id, bal + total_payout)
+    # payout and every stat for the round in one transaction
+    bal = await _settle(user_id, total_payout, **outcome)
 
     state.active = False
-    await _save_state(state)
+    await _clear_state(user_id)
 
-    footer = "  ".join(results_lines) + f"  Balance: **${await _get_balance(user_id)}**"
+    footer = "  ".join(results_lines) + f"  Balance: **${bal}**"
     e = _out_embed(inter.user, state, reveal=True, footer=footer, resolved=True)
     await inter.followup.send(embed=e)
-    await _clear_state(user_id)
 
 # ----------------------------- slash commands -----------------------------
 def setup(bot: commands.Bot | discord.Bot) -> None:
     guilds = [discord.Object(id=config.GUILD_ID)]
+    _restore_sessions()
+    bot.add_listener(_arm_expiry, "on_ready")
 
     @bot.tree.command(name="balance", description="Show your casino balance", guilds=guilds)
     async def balance(interaction: discord.Interaction):
@@ -446,9 +505,7 @@ def setup(bot: commands.Bot | discord.Bot) -> None:
     @bot.tree.command(name="leaderboard", description="Top balances", guilds=guilds)
     async def leaderboard(interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
-        eco = await _load_json(ECON_FILE)
-        rows = sorted(((int(uid), d.get("balance", 0), d.get("hands", 0)) for uid, d in eco.items()),
-                      key=lambda x: x[1], reverse=True)[:10]
+        rows = await get_store().top(10)
         lines = []
         for i, (uid, bal, hands) in enumerate(rows, 1):
             lines.append(f"{i}. <@{uid}> — **${bal}** — Total Hands: **{hands}**")
@@ -456,95 +513,124 @@ def setup(bot: commands.Bot | discord.Bot) -> None:
 
     @bot.tree.command(name="charity", description="Claim a daily random grant (0–1000). Once per day.", guilds=guilds)
     async def charity(interaction: discord.Interaction):
-        from datetime import date as _date
-        today = _date.today().isoformat()
-        last = await _get_last_charity_ymd(interaction.user.id)
-        if last == today:
-            return await interaction.response.send_message("You already claimed today. Try again tomorrow.", ephemeral=True)
-        bal = await _get_balance(interaction.user.id)
-        if bal >= 2000:
-            return await interaction.response.send_message("You've got plenty of money, you don't need charity!", ephemeral=True)
-        amount = random.randint(0, 1000)
-        await _set_balance(interaction.user.id, bal + amount)
-        await _set_last_charity_ymd(interaction.user.id, today)
-        await interaction.response.send_message(f"🎁 Charity granted **${amount}**. New balance: **${bal + amount}**", ephemeral=True)
+        async with _user_locks(interaction.user.id):
+            from datetime import date as _date
+            today = _date.today().isoformat()
+            last = await _get_last_charity_ymd(interaction.user.id)
+            if last == today:
+                return await interaction.response.send_message("You already claimed today. Try again tomorrow.", ephemeral=True)
+            bal = await _get_balance(interaction.user.id)
+            if bal >= 2000:
+                return await interaction.response.send_message("You've got plenty of money, you don't need charity!", ephemeral=True)
+            amount = random.randint(0, 1000)
+            bal = await _settle(interaction.user.id, amount)
+            await _set_last_charity_ymd(interaction.user.id, today)
+            await interaction.response.send_message(f"🎁 Charity granted **${amount}**. New balance: **${bal}**", ephemeral=True)
 
     @bot.tree.command(name="broke", description="Only usable entirely broke ($0). Gives a random amount of money ($1-$50)", guilds=guilds)
     async def broke(interaction: discord.Interaction):
-        bal = await _get_balance(interaction.user.id)
-        if bal != 0:
-            return await interaction.response.send_message("You ain't broke!", ephemeral=True)
-        chance = random.randint(1,1000)
-        print(f"Number Generated: {chance}")
-        if  chance == 69:
-            await _set_balance(interaction.user.id, bal + 1000)
-            await interaction.response.send_message(f"It's you're lucky day, here's $1000 on the house. Don't blow it all in one bet.", ephemeral=True)
-            return
-        amount = random.randint(1, 50)
-        await _set_balance(interaction.user.id, bal + amount)
-        await interaction.response.send_message(f"Pity money granted. New balance: **${bal + amount}**", ephemeral=True)
+        async with _user_locks(interaction.user.id):
+            bal = await _get_balance(interaction.user.id)
+            if bal != 0:
+                return await interaction.response.send_message("You ain't broke!", ephemeral=True)
+            chance = random.randint(1,1000)
+            print(f"Number Generated: {chance}")
+            if  chance == 69:
+                await _settle(interaction.user.id, 1000)
+                await interaction.response.send_message(f"It's you're lucky day, here's $1000 on the house. Don't blow it all in one bet.", ephemeral=True)
+                return
+            amount = random.randint(1, 50)
+            bal = await _settle(interaction.user.id, amount)
+            await interaction.response.send_message(f"Pity money granted. New balance: **${bal}**", ephemeral=True)
 
     @bot.tree.command(name="blackjack", description="Start or resume a blackjack hand", guilds=guilds)
     @app_commands.describe(bet="Your wager (e.g., 250 or 'all'). Ignored if resuming an active hand.")
     async def blackjack(interaction: discord.Interaction, bet: Optional[str] = None):
         await interaction.response.defer(ephemeral=True)
+        async with _user_locks(interaction.user.id):
+            # Resume if there’s an active hand
+            existing = await _load_state(interaction.user.id)
+            if existing and existing.active:
+                bal = await _get_balance(interaction.user.id)
+                footer = _options_text(existing, resolved=False, balance=bal)
+                return await interaction.followup.send(
+                    embed=_out_embed(interaction.user, existing, reveal=False, footer=footer, resolved=False)
+                )
 
-        # Resume if there’s an active hand
-        existing = await _load_state(interaction.user.id)
-        if existing and existing.active:
             bal = await _get_balance(interaction.user.id)
-            footer = _options_text(existing, resolved=False, balance=bal)
-            return await interaction.followup.send(
-                embed=_out_embed(interaction.user, existing, reveal=False, footer=footer, resolved=False)
-            )
 
-        bal = await _get_balance(interaction.user.id)
+            # Parse bet (supports "all"/"max" or a number)
+            bet_val = _parse_bet(bet, bal)
+            if bet_val is None:
+                return await interaction.followup.send("Provide a valid bet (e.g., `250` or `all`).")
+            # Take bet (checked again atomically; another command may have spent it meanwhile)
+            new_bal = await _debit(interaction.user.id, bet_val)
+            if new_bal is None:
+                return await interaction.followup.send(f"Insufficient balance. You have **${await _get_balance(interaction.user.id)}**.")
+
+            state = BJState(user_id=interaction.user.id, bet=bet_val)
+            # initial deal
+            state.player.append(state.deck.pop())
+            state.dealer.append(state.deck.pop())
+            state.player.append(state.deck.pop())
+            state.dealer.append(state.deck.pop())
+            state.last_ts = interaction.created_at.timestamp() if interaction.created_at else 0
 
-        # Parse bet (supports "all"/"max" or a number)
-        bet_val = _parse_bet(bet, bal)
-        if bet_val is None:
-            return await interaction.followup.send("Provide a valid bet (e.g., `250` or `all`).")
-        if bet_val > bal:
-            return await interaction.followup.send(f"Insufficient balance. You have **${bal}**.")
-
-        # Take bet
-        await _set_balance(interaction.user.id, bal - bet_val)
-
-        state = BJState(user_id=interaction.user.id, bet=bet_val, deck=_new_deck())
-        # initial deal
-        state.player.append(state.deck.pop())
-        state.dealer.append(state.deck.pop())
-        state.player.append(state.deck.pop())
-        state.dealer.append(state.deck.pop())
-        state.last_ts = interaction.created_at.timestamp() if interaction.created_at else 0
-
-        player_bj = _is_blackjack(state.player)
-        dealer_bj = _is_blackjack(state.dealer)
-        if player_bj or dealer_bj:
-            await _resolve_split_or_single(interaction, state, natural=True)
-            return
+            player_bj = _is_blackjack(state.player)
+            dealer_bj = _is_blackjack(state.dealer)
+            if player_bj or dealer_bj:
+                await _resolve_split_or_single(interaction, state, natural=True)
+                return
 
-        await _save_state(state)
-        bal = await _get_balance(interaction.user.id)
-        footer = _options_text(state, resolved=False, balance=bal)
-        await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
+            await _save_state(state)
+            footer = _options_text(state, resolved=False, balance=new_bal)
+            await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
 
     @bot.tree.command(name="hit", description="Hit in your blackjack hand", guilds=guilds)
     async def hit(interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
-        state = await _load_state(interaction.user.id)
-        if not _validate_state(interaction, state):
-            return
+        async with _user_locks(interaction.user.id):
+            state = await _load_state(interaction.user.id)
+            if not _validate_state(interaction, state):
+                return
+
+            cards = _active_cards(state)
+            cards.append(state.deck.pop())
+            _set_active_cards(state, cards)
+
+            v, _ = _hand_value(cards)
+            # If bust or (double -> forced stand after one card)
+            if v >= 21 or _current_doubled(state):
+                _mark_finished_current(state)
+                # move to second hand if exists
+                if state.split and state.active_idx == 1 and not state.finished2:
+                    state.active_idx = 2
+                    await _save_state(state)
+                    bal = await _get_balance(interaction.user.id)
+                    footer = _options_text(state, resolved=False, balance=bal)
+                    return await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
+
+                # resolve if both done
+                if _both_finished(state):
+                    await _save_state(state)
+                    return await _resolve_split_or_single(interaction, state)
 
-        cards = _active_cards(state)
-        cards.append(state.deck.pop())
-        _set_active_cards(state, cards)
+            await _save_state(state)
+            bal = await _get_balance(interaction.user.id)
+            footer = _options_text(state, resolved=False, balance=bal)
+            await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
+
+    @bot.tree.command(name="stand", description="Stand in your blackjack hand", guilds=guilds)
+    async def stand(interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        async with _user_locks(interaction.user.id):
+            state = await _load_state(interaction.user.id)
+            if not _validate_state(interaction, state):
+                return
 
-        v, _ = _hand_value(cards)
-        # If bust or (double -> forced stand after one card)
-        if v >= 21 or _current_doubled(state):
             _mark_finished_current(state)
-            # move to second hand if exists
+
+            # move to next hand if split
             if state.split and state.active_idx == 1 and not state.finished2:
                 state.active_idx = 2
                 await _save_state(state)
@@ -552,168 +638,144 @@ def setup(bot: commands.Bot | discord.Bot) -> None:
                 footer = _options_text(state, resolved=False, balance=bal)
                 return await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
 
-            # resolve if both done
             if _both_finished(state):
                 await _save_state(state)
                 return await _resolve_split_or_single(interaction, state)
 
-        await _save_state(state)
-        bal = await _get_balance(interaction.user.id)
-        footer = _options_text(state, resolved=False, balance=bal)
-        await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
-
-    @bot.tree.command(name="stand", description="Stand in your blackjack hand", guilds=guilds)
-    async def stand(interaction: discord.Interaction):
-        await interaction.response.defer(ephemeral=True)
-        state = await _load_state(interaction.user.id)
-        if not _validate_state(interaction, state):
-            return
-
-        _mark_finished_current(state)
-
-        # move to next hand if split
-        if state.split and state.active_idx == 1 and not state.finished2:
-            state.active_idx = 2
             await _save_state(state)
             bal = await _get_balance(interaction.user.id)
             footer = _options_text(state, resolved=False, balance=bal)
-            return await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
-
-        if _both_finished(state):
-            await _save_state(state)
-            return await _resolve_split_or_single(interaction, state)
-
-        await _save_state(state)
-        bal = await _get_balance(interaction.user.id)
-        footer = _options_text(state, resolved=False, balance=bal)
-        await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
+            await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
 
     @bot.tree.command(name="double", description="Double your bet and take one card", guilds=guilds)
     async def double(interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
-        state = await _load_state(interaction.user.id)
-        if not _validate_state(interaction, state):
-            return
-
-        cards = _active_cards(state)
-        if len(cards) != 2:
-            return await interaction.followup.send("You can only double on your first action of a hand.")
-
-        if _current_doubled(state):
-            return await interaction.followup.send("You already doubled this hand.")
+        async with _user_locks(interaction.user.id):
+            state = await _load_state(interaction.user.id)
+            if not _validate_state(interaction, state):
+                return
+
+            cards = _active_cards(state)
+            if len(cards) != 2:
+                return await interaction.followup.send("You can only double on your first action of a hand.")
+
+            if _current_doubled(state):
+                return await interaction.followup.send("You already doubled this hand.")
+
+            needed = state.bet if state.active_idx == 1 else state.bet2
+            bal = await _debit(interaction.user.id, needed)
+            if bal is None:
+                return await interaction.followup.send("Insufficient balance to double.")
+            if state.active_idx == 1:
+                state.bet *= 2
+            else:
+                state.bet2 *= 2
 
-        bal = await _get_balance(interaction.user.id)
-        needed = state.bet if state.active_idx == 1 else state.bet2
-        if bal < needed:
-            return await interaction.followup.send("Insufficient balance to double.")
+            _set_current_doubled(state)
 
-        await _set_balance(interaction.user.id, bal - needed)
-        if state.active_idx == 1:
-            state.bet *= 2
-        else:
-            state.bet2 *= 2
+            # one card only, then stand on this hand
+            cards.append(state.deck.pop())
+            _set_active_cards(state, cards)
+            _mark_finished_current(state)
 
-        _set_current_doubled(state)
+            # move to next or resolve
+            if state.split and state.active_idx == 1 and not state.finished2:
+                state.active_idx = 2
+                await _save_state(state)
+                footer = _options_text(state, resolved=False, balance=bal)
+                return await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
 
-        # one card only, then stand on this hand
-        cards.append(state.deck.pop())
-        _set_active_cards(state, cards)
-        _mark_finished_current(state)
+            if _both_finished(state):
+                await _save_state(state)
+                return await _resolve_split_or_single(interaction, state)
 
-        # move to next or resolve
-        if state.split and state.active_idx == 1 and not state.finished2:
-            state.active_idx = 2
             await _save_state(state)
-            bal = await _get_balance(interaction.user.id)
             footer = _options_text(state, resolved=False, balance=bal)
-            return await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
-
-        if _both_finished(state):
-            await _save_state(state)
-            return await _resolve_split_or_single(interaction, state)
-
-        await _save_state(state)
-        bal = await _get_balance(interaction.user.id)
-        footer = _options_text(state, resolved=False, balance=bal)
-        await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
+            await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
 
     @bot.tree.command(name="fold", description="Fold your hand (get half your bet back)", guilds=guilds)
     async def fold(interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
-        state = await _load_state(interaction.user.id)
-        if not _validate_state(interaction, state):
-            return
+        async with _user_locks(interaction.user.id):
+            state = await _load_state(interaction.user.id)
+            if not _validate_state(interaction, state):
+                return
+
+            # Only allowed as first action on a hand
+            if _current_len(state) != 2:
+                return await interaction.followup.send("You can only fold on your first action of a hand.")
+            if state.split and state.active_idx == 2 and not state.finished1:
+                # shouldn't happen, but keep order: play hand 1 fully first
+                return await interaction.followup.send("Finish Hand 1 first.")
+
+            if state.active_idx == 1:
+                state.surrendered1 = True
+            else:
+                state.surrendered2 = True
 
-        # Only allowed as first action on a hand
-        if _current_len(state) != 2:
-            return await interaction.followup.send("You can only fold on your first action of a hand.")
-        if state.split and state.active_idx == 2 and not state.finished1:
-            # shouldn't happen, but keep order: play hand 1 fully first
-            return await interaction.followup.send("Finish Hand 1 first.")
+            _mark_finished_current(state)
 
-        if state.active_idx == 1:
-            state.surrendered1 = True
-        else:
-            state.surrendered2 = True
+            if state.split and state.active_idx == 1 and not state.finished2:
+                state.active_idx = 2
+                await _save_state(state)
+                bal = await _get_balance(interaction.user.id)
+                footer = _options_text(state, resolved=False, balance=bal)
+                return await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
 
-        _mark_finished_current(state)
+            if _both_finished(state):
+                await _save_state(state)
+                return await _resolve_split_or_single(interaction, state)
 
-        if state.split and state.active_idx == 1 and not state.finished2:
-            state.active_idx = 2
             await _save_state(state)
             bal = await _get_balance(interaction.user.id)
             footer = _options_text(state, resolved=False, balance=bal)
-            return await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
-
-        if _both_finished(state):
-            await _save_state(state)
-            return await _resolve_split_or_single(interaction, state)
-
-        await _save_state(state)
-        bal = await _get_balance(interaction.user.id)
-        footer = _options_text(state, resolved=False, balance=bal)
-        await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
+            await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
 
     @bot.tree.command(name="split", description="Split your initial pair into two hands", guilds=guilds)
     async def split_cmd(interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
-        state = await _load_state(interaction.user.id)
-        if not _validate_state(interaction, state):
-            return
+        async with _user_locks(interaction.user.id):
+            state = await _load_state(interaction.user.id)
+            if not _validate_state(interaction, state):
+                return
 
-        if state.split or state.active_idx != 1:
-            return await interaction.followup.send("You can only split once, before playing Hand 1.")
-        bal = await _get_balance(interaction.user.id)
-        if not _can_split(state, bal):
-            return await interaction.followup.send("You can only split identical ranks and you must have enough balance for a second bet.")
-
-        # Take second bet
-        await _set_balance(interaction.user.id, bal - state.bet)
-
-        # Perform split
-        c1, c2 = state.player[0], state.player[1]
-        state.player = [c1, state.deck.pop()]
-        state.hand2 = [c2, state.deck.pop()]
-        state.bet2 = state.bet
-        state.split = True
-        state.active_idx = 1
-        state.finished1 = False
-        state.finished2 = False
-
-        await _save_state(state)
-        bal = await _get_balance(interaction.user.id)
-        footer = _options_text(state, resolved=False, balance=bal)
-        await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
+            if state.split or state.active_idx != 1:
+                return await interaction.followup.send("You can only split once, before playing Hand 1.")
+            bal = await _get_balance(interaction.user.id)
+            if not _can_split(state, bal):
+                return await interaction.followup.send("You can only split identical ranks and you must have enough balance for a second bet.")
+
+            # Take second bet
+            new_bal = await _debit(interaction.user.id, state.bet)
+            if new_bal is None:
+                return await interaction.followup.send("You can only split identical ranks and you must have enough balance for a second bet.")
+
+            # Perform split
+            c1, c2 = state.player[0], state.player[1]
+            state.player = [c1, state.deck.pop()]
+            state.hand2 = [c2, state.deck.pop()]
+            state.bet2 = state.bet
+            state.split = True
+            state.active_idx = 1
+            state.finished1 = False
+            state.finished2 = False
+
+            await _save_state(state)
+            footer = _options_text(state, resolved=False, balance=new_bal)
+            await interaction.followup.send(embed=_out_embed(interaction.user, state, reveal=False, footer=footer, resolved=False))
 
 # ----------------------------- common validation -----------------------------
 def _validate_state(inter: discord.Interaction, state: Optional[BJState]) -> bool:
     if state is None or not state.active:
-        asyncio.create_task(inter.followup.send("You do not have an active hand. Use `/blackjack bet:<amount>` to start."))
+        _spawn(inter.followup.send("You do not have an active hand. Use `/blackjack bet:<amount>` to start."))
         return False
     now_ts = inter.created_at.timestamp() if inter.created_at else 0
     if state.last_ts and now_ts - state.last_ts > STATE_TTL_SECONDS:
-        asyncio.create_task(inter.followup.send("Your hand expired due to inactivity."))
-        asyncio.create_task(_clear_state(inter.user.id))
+        _spawn(_report_expired(inter))
         return False
     state.last_ts = now_ts
     return True
+
+async def _report_expired(inter: discord.Interaction):
+    outcome = await _expire_hand(inter.user.id)   # runs once the command that noticed has let go of the lock
+    await inter.followup.send("Your hand expired due to inactivity." + (f" {outcome}" if outcome else ""))
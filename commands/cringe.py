@@ -2,7 +2,8 @@ from __future__ import annotations
 import discord, config
 from discord import app_commands
 from discord.ext import commands
-import asyncio
+
+from voice_moderation import MODERATION
 
 
 def setup(bot: commands.Bot | discord.Bot) -> None:
@@ -15,33 +16,12 @@ def setup(bot: commands.Bot | discord.Bot) -> None:
         if not member.voice or not member.voice.channel:
             return await interaction.followup.send("That user is not in a voice channel.")
 
-        end_time = asyncio.get_event_loop().time() + seconds    # Can just replace seconds with and int to make the duration fixed
-                                                                # (for when dowski sets the duration to like, 10000 seconds)
-        await member.edit(mute=True, reason="No more cringe")
+        # seconds could be capped here for when dowski sets the duration to like, 10000 seconds
+        await MODERATION.sanction(
+            member, seconds, mute=True, deafen=False,
+            reason="No more cringe", release_reason="Cringe legalized",
+            channel=interaction.channel,
+            release_message="{name} is now free to spread their cringe once more.",
+        )
 
         await interaction.followup.send(f"Preventing {member.display_name} from spouting more cringe...")
-
-        while asyncio.get_event_loop().time() < end_time:
-            vs = member.voice
-            if vs and not vs.mute:
-                await member.edit(mute=True, reason="Surpressing cringe.")
-            await asyncio.sleep(0.1)
-
-        await member.edit(mute=False, reason="Cringe legalized")
-
-        await interaction.followup.send(f"{member.display_name} is now free to spread their cringe once more.")
-
-        
-
-        
-
-
-
-
-
-
-
-
-
-
-
@@ -71,6 +71,21 @@ def setup(bot: commands.Bot | discord.Bot) -> None:
             inline=False
         )
 
+        embed.add_field(
+            name="**🎵 /remove /move /jump /dedupe /shuffle**",
+            value=(
+                "**Description:**\n"
+                " • Edit the queue. Positions are the numbers shown by `/queue`.\n"
+                "**Commands:**\n"
+                " • `/remove [position]` — Removes a track.\n"
+                " • `/move [from_position] [to_position]` — Moves a track.\n"
+                " • `/jump [position]` — Skips straight to a track.\n"
+                " • `/dedupe` — Removes repeated songs.\n"
+                " • `/shuffle` — Shuffles the queue.\n"
+            ),
+            inline=False
+        )
+
         embed.add_field(
             name="**🎵 /nowplaying**",
             value=(
@@ -120,14 +135,16 @@ def setup(bot: commands.Bot | discord.Bot) -> None:
             name="**🛠️ /purge**",
             value=(
                 "**Description:**\n"
-                " • Deletes messages. Supports the following subcommands.\n"
+                " • Deletes messages. `[num_messages]` is how many recent messages are checked; only the matching ones go. `/purge filter` instead deletes up to `[num_messages]` matches, looking back up to 20000 messages.\n"
                 "**Subcommands:**\n"
                 " • `/purge any [num_messages]` — Deletes any messages.\n"
                 " • `/purge bots [num_messages]` — Deletes only bot messages.\n"
                 " • `/purge humans [num_messages]` — Deletes only user messages.\n"
                 " • `/purge images [num_messages]` — Deletes messages containing images.\n"
                 " • `/purge embeds [num_messages]` — Deletes messages containing embeds.\n"
-                " • `/purge contains [num_messages] [phrase]` — Deletes messages containing a specified phrase."
+                " • `/purge contains [num_messages] [phrase]` — Deletes messages containing a specified phrase.\n"
+                " • `/purge filter [num_messages] [expression]` — Deletes messages matching every term, e.g. `from:@user has:image`, `bot re:/discord\\.gg/`, `\"spam\" after:2h`, `minlen:500`. Use `or` between alternatives and `-` to negate a term.\n"
+                " • Add `dry_run: True` to any of them to only count what would be deleted. A Cancel button stops a purge in progress."
             ),
             inline=False
         )
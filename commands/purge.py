@@ -1,59 +1,259 @@
 from __future__ import annotations
+import asyncio, datetime, time
+from typing import Dict, List, Optional
+
 import discord, config
 from discord import app_commands
 from discord.ext import commands
 
-def setup(bot: commands.Bot) -> None:
-    purge = app_commands.Group(name="purge", description="Bulk‐delete messages", guild_ids=[config.GUILD_ID])
+from message_filter import FilterError, MessageFilter, quote
 
-    async def _do_purge(interaction, limit, check=None):
-        if not interaction.user.guild_permissions.manage_messages:
-            return await interaction.response.send_message(
-                "You do not have permission to use this command.", ephemeral=True
-            )
+MAX_DELETE = 10000     # most messages one /purge will delete
+MAX_SCAN = 20000       # most messages one /purge will look through
+BULK_SIZE = 100        # Discord's bulk delete limit
+BULK_MAX_AGE = datetime.timedelta(days=14, minutes=-5)   # bulk delete refuses anything older (with some margin)
+SINGLE_DELETE_DELAY = 1.0   # seconds between one-by-one deletes of old messages
+PROGRESS_INTERVAL = 3       # seconds between progress message edits
 
-        n = max(1, min(limit, 100))
+RUNNING: Dict[int, "PurgeJob"] = {}   # channel id -> purge in progress
+
+
+class PurgeJob:
+    """
+    Deletes up to `limit` messages matching `check`, newest first, looking at most `scan_limit`
+    messages back (and no further than the filter's `after` bound, if it has one).
+
+    History is streamed page by page into a small queue while a second task deletes: messages
+    under 14 days old go out 100 per bulk call, older ones (which bulk delete rejects) one at a
+    time with a delay between them. With `dry_run` nothing is deleted, only counted.
+    """
+
+    def __init__(self, channel: discord.TextChannel, check: MessageFilter,
+                 limit: int, scan_limit: int = MAX_SCAN, dry_run: bool = False):
+        self.channel = channel
+        self.check = None if check.matches_everything else check
+        self.before = check.before
+        self.after = check.after
+        self.limit = limit
+        self.scan_limit = scan_limit
+        self.dry_run = dry_run
+        self.scanned = 0
+        self.matched = 0
+        self.old = 0   # matches too old to bulk delete
+        self.deleted = 0
+        self.failed = 0
+        self.cancelled = False
+        self.error: Optional[str] = None
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=2 * BULK_SIZE)
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    async def run(self) -> None:
+        scanner = asyncio.create_task(self._scan())
+        try:
+            if self.dry_run:
+                await scanner
+            else:
+                await self._delete()
+        finally:
+            scanner.cancel()
+
+    async def _scan(self):
+        cutoff = discord.utils.utcnow() - BULK_MAX_AGE
+        stopped = False
+        try:
+            history = self.channel.history(limit=self.scan_limit, before=self.before, after=self.after, oldest_first=False)
+            async for message in history:
+                if self.cancelled or self.matched >= self.limit:
+                    break
+                self.scanned += 1
+                if self.check is not None and not self.check(message):
+                    continue
+                self.matched += 1
+                if message.created_at < cutoff:
+                    self.old += 1
+                if not self.dry_run:
+                    await self._queue.put(message)
+        except asyncio.CancelledError:
+            stopped = True   # run() only cancels us once the deleter is gone
+            raise
+        except discord.HTTPException as e:
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"[purge] reading history of {self.channel} failed: {self.error}")
+        finally:
+            # however the scan ends, the deleter must not wait forever on the next message
+            if not self.dry_run and not stopped:
+                await self._queue.put(None)
+
+    async def _delete(self):
+        cutoff = discord.utils.utcnow() - BULK_MAX_AGE
+        batch: List[discord.Message] = []
+        while True:
+            message = await self._queue.get()
+            if message is None or self.cancelled:
+                if batch and not self.cancelled:
+                    await self._bulk(batch)
+                return
+            if message.created_at >= cutoff:
+                batch.append(message)
+                # send when full, or when the scanner has caught up and is waiting on the next page
+                if len(batch) >= BULK_SIZE or self._queue.empty():
+                    await self._bulk(batch)
+                    batch = []
+            else:
+                if batch:
+                    await self._bulk(batch)
+                    batch = []
+                await self._single(message)
+
+    async def _bulk(self, batch: List[discord.Message]):
+        try:
+            if len(batch) == 1:
+                await batch[0].delete()
+            else:
+                await self.channel.delete_messages(batch)
+            self.deleted += len(batch)
+        except discord.NotFound:
+            # someone else deleted one of them; fall back to one by one for this batch
+            for message in batch:
+                await self._single(message, paced=False)
+        except discord.HTTPException as e:
+            self.failed += len(batch)
+            print(f"[purge] bulk delete of {len(batch)} failed: {type(e).__name__}: {e}")
+
+    async def _single(self, message: discord.Message, paced: bool = True):
+        try:
+            await message.delete()
+            self.deleted += 1
+        except discord.NotFound:
+            pass
+        except discord.HTTPException as e:
+            self.failed += 1
+            print(f"[purge] delete of {message.id} failed: {type(e).__name__}: {e}")
+        if paced:
+            await asyncio.sleep(SINGLE_DELETE_DELAY)
+
+    def progress(self) -> str:
+        if self.dry_run:
+            return (f"🔎 Scanned {self.scanned} message(s), {self.matched} would be deleted"
+                    + (f" ({self.old} older than 14 days, deleted one at a time)." if self.old else "."))
+        text = f"🧹 Deleted {self.deleted}/{self.matched} matching message(s), scanned {self.scanned}."
+        if self.old:
+            text += f" {self.old} are older than 14 days and go one at a time."
+        if self.failed:
+            text += f" {self.failed} could not be deleted."
+        if self.error:
+            text += f" Stopped early: {self.error}"
+        return text
 
-        await interaction.response.defer(ephemeral=True)
 
-        if check is None:
-            deleted = await interaction.channel.purge(limit=n)
-        else:
-            deleted = await interaction.channel.purge(limit=n, check=check)
+class _CancelView(discord.ui.View):
+    def __init__(self, job: PurgeJob):
+        super().__init__(timeout=None)
+        self.job = job
 
-        await interaction.followup.send(
-            f"🧹 Deleted {len(deleted)} message(s).", ephemeral=True
+    @discord.ui.button(label="Cancel", style=discord.ButtonStyle.danger)
+    async def cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.job.cancel()
+        button.disabled = True
+        await interaction.response.edit_message(view=self)
+
+
+async def run_purge(interaction: discord.Interaction, limit: int, expression: str = "", dry_run: bool = False,
+                    scan_limit: Optional[int] = None):
+    """
+    Delete up to `limit` messages matching `expression` in the channel. `scan_limit` caps how many
+    of the most recent messages are looked at (MAX_SCAN when not given).
+    """
+    if not interaction.user.guild_permissions.manage_messages:
+        return await interaction.response.send_message(
+            "You do not have permission to use this command.", ephemeral=True
+        )
+
+    try:
+        check = MessageFilter(expression)
+    except FilterError as e:
+        return await interaction.response.send_message(f"Bad filter: {e}", ephemeral=True)
+
+    channel = interaction.channel
+    if channel.id in RUNNING:
+        return await interaction.response.send_message(
+            "A purge is already running in this channel.", ephemeral=True
         )
 
+    limit = max(1, min(limit, MAX_DELETE))
+    job = PurgeJob(channel, check, limit, min(scan_limit or MAX_SCAN, MAX_SCAN), dry_run=dry_run)
+    view = _CancelView(job)
+    started = time.monotonic()
+    try:
+        RUNNING[channel.id] = job
+        await interaction.response.defer(ephemeral=True)
+        status = await interaction.followup.send("🧹 Starting...", view=view, ephemeral=True, wait=True)
+
+        run = asyncio.create_task(job.run())
+        while not run.done():
+            await asyncio.wait({run}, timeout=PROGRESS_INTERVAL)
+            if not run.done():
+                try:
+                    await status.edit(content=job.progress())
+                except discord.HTTPException:
+                    pass   # interaction token expired on a very long purge; keep going silently
+        await run
+    finally:
+        RUNNING.pop(channel.id, None)
+        view.stop()
+
+    summary = job.progress()
+    if job.cancelled:
+        summary = "Cancelled. " + summary
+    summary += f" ({time.monotonic() - started:.0f}s)"
+    try:
+        await status.edit(content=summary, view=None)
+    except discord.HTTPException:
+        pass
+
+
+def setup(bot: commands.Bot) -> None:
+    purge = app_commands.Group(name="purge", description="Bulk‐delete messages", guild_ids=[config.GUILD_ID])
+
     @purge.command(name="any", description="Delete the most recent messages regardless of author")
-    @app_commands.describe(count="How many messages to delete (1–100)")
-    async def purge_any(interaction: discord.Interaction, count: int):
-        await _do_purge(interaction, count)
+    @app_commands.describe(count=f"How many recent messages to clear (1–{MAX_DELETE})", dry_run="Only count what would be deleted")
+    async def purge_any(interaction: discord.Interaction, count: int, dry_run: bool = False):
+        await run_purge(interaction, count, dry_run=dry_run, scan_limit=count)
 
     @purge.command(name="bots", description="Delete only messages sent by bots")
-    @app_commands.describe(count="How many bot‐messages to delete (1–100)")
-    async def purge_bots(interaction: discord.Interaction, count: int):
-        await _do_purge(interaction, count, check=lambda m: m.author.bot)
+    @app_commands.describe(count=f"How many recent messages to check for bot messages (1–{MAX_DELETE})", dry_run="Only count what would be deleted")
+    async def purge_bots(interaction: discord.Interaction, count: int, dry_run: bool = False):
+        await run_purge(interaction, count, "bot", dry_run=dry_run, scan_limit=count)
 
     @purge.command(name="humans", description="Delete only messages sent by humans")
-    @app_commands.describe(count="How many human‐messages to delete (1–100)")
-    async def purge_humans(interaction: discord.Interaction, count: int):
-        await _do_purge(interaction, count, check=lambda m: not m.author.bot)
+    @app_commands.describe(count=f"How many recent messages to check for human messages (1–{MAX_DELETE})", dry_run="Only count what would be deleted")
+    async def purge_humans(interaction: discord.Interaction, count: int, dry_run: bool = False):
+        await run_purge(interaction, count, "human", dry_run=dry_run, scan_limit=count)
 
     @purge.command(name="images", description="Delete messages that contain an image")
-    @app_commands.describe(count="How many image‐messages to delete (1–100)")
-    async def purge_images(interaction: discord.Interaction, count: int):
-        await _do_purge(interaction, count, check=lambda m: m.attachments)
+    @app_commands.describe(count=f"How many recent messages to check for images (1–{MAX_DELETE})", dry_run="Only count what would be deleted")
+    async def purge_images(interaction: discord.Interaction, count: int, dry_run: bool = False):
+        await run_purge(interaction, count, "has:image", dry_run=dry_run, scan_limit=count)
 
     @purge.command(name="embeds", description="Delete messages that contain an embed")
-    @app_commands.describe(count="How many image‐messages to delete (1–100)")
-    async def purge_images(interaction: discord.Interaction, count: int):
-        await _do_purge(interaction, count, check=lambda m: m.embeds)
-    
+    @app_commands.describe(count=f"How many recent messages to check for embeds (1–{MAX_DELETE})", dry_run="Only count what would be deleted")
+    async def purge_embeds(interaction: discord.Interaction, count: int, dry_run: bool = False):
+        await run_purge(interaction, count, "has:embed", dry_run=dry_run, scan_limit=count)
+
     @purge.command(name="contains", description="Delete messages containing a given substring",)
-    @app_commands.describe(count="How many recent messages to scan (1–100)", substring="Text to match (case-insensitive)",)
-    async def purge_contains(interaction: discord.Interaction, count: int, substring: str,):
-        await _do_purge(interaction, count, check=lambda m: substring.lower() in m.content.lower())
+    @app_commands.describe(count=f"How many recent messages to search (1–{MAX_DELETE})", substring="Text to match (case-insensitive)",
+                           dry_run="Only count what would be deleted")
+    async def purge_contains(interaction: discord.Interaction, count: int, substring: str, dry_run: bool = False):
+        await run_purge(interaction, count, quote(substring), dry_run=dry_run, scan_limit=count)
+
+    @purge.command(name="filter", description="Delete messages matching a filter expression")
+    @app_commands.describe(count=f"How many matching messages to delete (1–{MAX_DELETE})",
+                           expression=r'e.g. from:@user has:image, bot "giveaway", re:/disc(or)?d\.gg/ after:2h, minlen:500',
+                           dry_run="Only count what would be deleted")
+    async def purge_filter(interaction: discord.Interaction, count: int, expression: str, dry_run: bool = False):
+        await run_purge(interaction, count, expression, dry_run=dry_run)
 
 
     bot.tree.add_command(purge)
@@ -2,7 +2,8 @@ from __future__ import annotations
 import discord, config
 from discord import app_commands
 from discord.ext import commands
-import asyncio
+
+from voice_moderation import MODERATION
 
 
 def setup(bot: commands.Bot | discord.Bot) -> None:
@@ -15,18 +16,11 @@ def setup(bot: commands.Bot | discord.Bot) -> None:
         if not member.voice or not member.voice.channel:
             return await interaction.followup.send("That user is not in a voice channel.")
 
-        end_time = asyncio.get_event_loop().time() + seconds
-
-        await member.edit(mute=True, deafen=True, reason="Hi dowski :)")
-
-        await interaction.followup.send(f"{member.display_name.upper()}, GO SIT IN THE CORNER AND THINK ABOUT WHAT YOU'VE DONE")
-
-        while asyncio.get_event_loop().time() < end_time:
-            vs = member.voice
-            if vs and (not vs.mute or not vs.deaf):
-                await member.edit(mute=True, deafen=True, reason="NO, YOU CAN'T COME OUT OF TIMEOUT YET")
-            await asyncio.sleep(0.1)
-
-        await member.edit(mute=False, deafen=False, reason="Freedom.")
+        await MODERATION.sanction(
+            member, seconds, mute=True, deafen=True,
+            reason="Hi dowski :)", release_reason="Freedom.",
+            channel=interaction.channel,
+            release_message="{name} can come out of the corner now",
+        )
 
-        await interaction.followup.send(f"{member.display_name} can come out of the corner now")
\ No newline at end of file
+        await interaction.followup.send(f"{member.display_name.upper()}, GO SIT IN THE CORNER AND THINK ABOUT WHAT YOU'VE DONE")
\ No newline at end of file
@@ -0,0 +1,467 @@
+from __future__ import annotations
+import asyncio, atexit, heapq, json, os, sqlite3, time
+from typing import Dict, List, Optional, Tuple
+
+import config
+
+DATA_DIR = "data"
+ECON_FILE = os.path.join(DATA_DIR, "economy.json")
+ECON_DB = os.path.join(DATA_DIR, "economy.db")
+BACKEND = getattr(config, "ECONOMY_BACKEND", "sqlite")   # "sqlite" or "json"
+CACHE = getattr(config, "ECONOMY_CACHE", True)            # serve from memory, write behind
+FLUSH_INTERVAL = getattr(config, "ECONOMY_FLUSH_INTERVAL", 5)   # seconds; the most a crash can lose
+FLUSH_ROWS = getattr(config, "ECONOMY_FLUSH_ROWS", 500)         # flush early once this many rows are dirty
+
+STARTING_BALANCE = 500
+
+STAT_FIELDS = ("wins", "losses", "pushes", "hands", "biggest_win")
+
+
+def _new_row() -> dict:
+    return {"balance": STARTING_BALANCE, "wins": 0, "losses": 0, "pushes": 0, "hands": 0,
+            "biggest_win": 0, "last_charity_ymd": None}
+
+
+def _row_values(user_id: int, row: dict) -> tuple:
+    row = {**_new_row(), **row}
+    return (int(user_id), int(row["balance"]), *(int(row[k]) for k in STAT_FIELDS), row["last_charity_ymd"])
+
+
+class EconomyStore:
+    """
+    Where casino balances and stats live. A user's row is created with STARTING_BALANCE the
+    first time anything touches it, as the blackjack helpers always did.
+    """
+
+    async def get_row(self, user_id: int) -> dict:
+        raise NotImplementedError
+
+    async def get_balance(self, user_id: int) -> int:
+        return int((await self.get_row(user_id))["balance"])
+
+    async def set_balance(self, user_id: int, balance: int) -> None:
+        raise NotImplementedError
+
+    async def bump_stats(self, user_id: int, *, win: int = 0, loss: int = 0, push: int = 0, payout: int = 0) -> None:
+        raise NotImplementedError
+
+    async def debit(self, user_id: int, amount: int) -> Optional[int]:
+        """
+        Take `amount` from the user's balance if they have that much, in one step. Returns the new
+        balance, or None (and changes nothing) if they can't cover it.
+        """
+        raise NotImplementedError
+
+    async def settle(self, user_id: int, delta: int = 0, *, wins: int = 0, losses: int = 0, pushes: int = 0,
+                     biggest_win: int = 0) -> int:
+        """
+        Apply a whole round at once: add `delta` to the balance (never below 0), count the hands
+        won/lost/pushed, raise biggest_win if beaten. Returns the new balance.
+        """
+        raise NotImplementedError
+
+    async def get_last_charity_ymd(self, user_id: int) -> Optional[str]:
+        return (await self.get_row(user_id)).get("last_charity_ymd")
+
+    async def set_last_charity_ymd(self, user_id: int, ymd: str) -> None:
+        raise NotImplementedError
+
+    async def top(self, n: int) -> List[Tuple[int, int, int]]:
+        """(user id, balance, hands) for the `n` richest users."""
+        raise NotImplementedError
+
+    # bulk access, for CachedEconomyStore
+    def load_all(self) -> Dict[int, dict]:
+        raise NotImplementedError
+
+    def write_rows(self, rows: Dict[int, dict]) -> None:
+        """Store these whole rows, replacing what's there, all at once."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class JsonEconomyStore(EconomyStore):
+    """
+    The original format: every user in one data/economy.json, read and rewritten whole on each
+    call. Kept so a deployment can stay on it; fine for a handful of players.
+    """
+
+    def __init__(self, path: str = ECON_FILE):
+        self.path = path
+        self._lock = asyncio.Lock()
+
+    def _read(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write(self, eco: Dict[str, dict]) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(eco, f, indent=2)
+        os.replace(tmp, self.path)
+
+    async def _update(self, user_id: int, change) -> dict:
+        # the lock covers the whole read-modify-write, so concurrent hands can't lose updates
+        async with self._lock:
+            eco = self._read()
+            row = eco.setdefault(str(user_id), _new_row())
+            change(row)
+            self._write(eco)
+            return dict(row)
+
+    async def get_row(self, user_id: int) -> dict:
+        return await self._update(user_id, lambda row: None)
+
+    async def set_balance(self, user_id: int, balance: int) -> None:
+        await self._update(user_id, lambda row: row.update(balance=max(0, int(balance))))
+
+    async def bump_stats(self, user_id: int, *, win: int = 0, loss: int = 0, push: int = 0, payout: int = 0) -> None:
+        def change(row: dict):
+            row["wins"] += win
+            row["losses"] += loss
+            row["pushes"] += push
+            if win or loss or push:
+                row["hands"] += 1
+            if payout > row.get("biggest_win", 0):
+                row["biggest_win"] = payout
+        await self._update(user_id, change)
+
+    async def debit(self, user_id: int, amount: int) -> Optional[int]:
+        async with self._lock:
+            eco = self._read()
+            row = eco.setdefault(str(user_id), _new_row())
+            if row["balance"] < amount:
+                return None
+            row["balance"] -= amount
+            self._write(eco)
+            return int(row["balance"])
+
+    async def settle(self, user_id: int, delta: int = 0, *, wins: int = 0, losses: int = 0, pushes: int = 0,
+                     biggest_win: int = 0) -> int:
+        def change(row: dict):
+            row["balance"] = max(0, int(row["balance"]) + delta)
+            row["wins"] += wins
+            row["losses"] += losses
+            row["pushes"] += pushes
+            row["hands"] += wins + losses + pushes
+            row["biggest_win"] = max(row.get("biggest_win", 0), biggest_win)
+        return int((await self._update(user_id, change))["balance"])
+
+    async def set_last_charity_ymd(self, user_id: int, ymd: str) -> None:
+        await self._update(user_id, lambda row: row.update(last_charity_ymd=ymd))
+
+    async def top(self, n: int) -> List[Tuple[int, int, int]]:
+        async with self._lock:
+            eco = self._read()
+        rows = ((int(uid), d.get("balance", 0), d.get("hands", 0)) for uid, d in eco.items())
+        return sorted(rows, key=lambda r: r[1], reverse=True)[:n]
+
+    def load_all(self) -> Dict[int, dict]:
+        return {int(uid): {**_new_row(), **d} for uid, d in self._read().items()}
+
+    def write_rows(self, rows: Dict[int, dict]) -> None:
+        eco = self._read()
+        eco.update((str(uid), row) for uid, row in rows.items())
+        self._write(eco)
+
+
+class SqliteEconomyStore(EconomyStore):
+    """
+    Balances in data/economy.db, one row per user, changed with single-row UPDATEs.
+
+    WAL mode with synchronous=NORMAL makes each commit an append to the write-ahead log with no
+    fsync, so a hand costs a few small writes however many users there are; a power cut can
+    lose the last moments, never corrupt the file. Calls run inline on the event loop: they
+    are short, and one connection on one thread keeps them in order.
+
+    On first open, an existing data/economy.json is imported once (it's left on disk).
+    """
+
+    def __init__(self, path: str = ECON_DB, json_path: str = ECON_FILE):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._tx():
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    user_id          INTEGER PRIMARY KEY,
+                    balance          INTEGER NOT NULL,
+                    wins             INTEGER NOT NULL DEFAULT 0,
+                    losses           INTEGER NOT NULL DEFAULT 0,
+                    pushes           INTEGER NOT NULL DEFAULT 0,
+                    hands            INTEGER NOT NULL DEFAULT 0,
+                    biggest_win      INTEGER NOT NULL DEFAULT 0,
+                    last_charity_ymd TEXT
+                )""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS users_balance ON users (balance)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._migrate(json_path)
+
+    def _tx(self):
+        return _Transaction(self._db)
+
+    def _migrate(self, json_path: str):
+        if self._db.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                eco = json.load(f)
+        except FileNotFoundError:
+            eco = {}
+        except (OSError, ValueError) as e:
+            # don't mark it migrated; try again next start once the file is fixed
+            print(f"[economy] Could not read {json_path} for migration: {type(e).__name__}: {e}")
+            return
+        with self._tx():
+            self._db.executemany("INSERT OR IGNORE INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                 (_row_values(uid, d) for uid, d in eco.items()))
+            self._db.execute("INSERT INTO meta VALUES ('json_migrated', ?)", (json_path,))
+        if eco:
+            print(f"[economy] Migrated {len(eco)} user(s) from {json_path} to {self.path}")
+
+    def _ensure(self, user_id: int):
+        self._db.execute("INSERT OR IGNORE INTO users (user_id, balance) VALUES (?, ?)", (user_id, STARTING_BALANCE))
+
+    async def get_row(self, user_id: int) -> dict:
+        with self._tx():
+            self._ensure(user_id)
+            values = self._db.execute(
+                "SELECT balance, wins, losses, pushes, hands, biggest_win, last_charity_ymd FROM users WHERE user_id = ?",
+                (user_id,)).fetchone()
+        return dict(zip(("balance", *STAT_FIELDS, "last_charity_ymd"), values))
+
+    async def get_balance(self, user_id: int) -> int:
+        row = self._db.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        if row is not None:
+            return row[0]
+        with self._tx():
+            self._ensure(user_id)
+        return STARTING_BALANCE
+
+    async def set_balance(self, user_id: int, balance: int) -> None:
+        with self._tx():
+            self._ensure(user_id)
+            self._db.execute("UPDATE users SET balance = ? WHERE user_id = ?", (max(0, int(balance)), user_id))
+
+    async def bump_stats(self, user_id: int, *, win: int = 0, loss: int = 0, push: int = 0, payout: int = 0) -> None:
+        with self._tx():
+            self._ensure(user_id)
+            self._db.execute(
+                "UPDATE users SET wins = wins + ?, losses = losses + ?, pushes = pushes + ?, hands = hands + ?, "
+                "biggest_win = MAX(biggest_win, ?) WHERE user_id = ?",
+                (win, loss, push, 1 if (win or loss or push) else 0, payout, user_id))
+
+    async def debit(self, user_id: int, amount: int) -> Optional[int]:
+        with self._tx():
+            self._ensure(user_id)
+            changed = self._db.execute("UPDATE users SET balance = balance - ? WHERE user_id = ? AND balance >= ?",
+                                       (amount, user_id, amount)).rowcount
+            if not changed:
+                return None
+            return self._db.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    async def settle(self, user_id: int, delta: int = 0, *, wins: int = 0, losses: int = 0, pushes: int = 0,
+                     biggest_win: int = 0) -> int:
+        with self._tx():
+            self._ensure(user_id)
+            self._db.execute(
+                "UPDATE users SET balance = MAX(0, balance + ?), wins = wins + ?, losses = losses + ?, "
+                "pushes = pushes + ?, hands = hands + ?, biggest_win = MAX(biggest_win, ?) WHERE user_id = ?",
+                (delta, wins, losses, pushes, wins + losses + pushes, biggest_win, user_id))
+            return self._db.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    async def set_last_charity_ymd(self, user_id: int, ymd: str) -> None:
+        with self._tx():
+            self._ensure(user_id)
+            self._db.execute("UPDATE users SET last_charity_ymd = ? WHERE user_id = ?", (ymd, user_id))
+
+    async def top(self, n: int) -> List[Tuple[int, int, int]]:
+        return self._db.execute("SELECT user_id, balance, hands FROM users ORDER BY balance DESC LIMIT ?", (n,)).fetchall()
+
+    def load_all(self) -> Dict[int, dict]:
+        cur = self._db.execute("SELECT user_id, balance, wins, losses, pushes, hands, biggest_win, last_charity_ymd FROM users")
+        return {uid: dict(zip(("balance", *STAT_FIELDS, "last_charity_ymd"), values)) for uid, *values in cur}
+
+    def write_rows(self, rows: Dict[int, dict]) -> None:
+        with self._tx():
+            self._db.executemany("INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                 (_row_values(uid, row) for uid, row in rows.items()))
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT (or ROLLBACK on error) on an autocommit connection."""
+
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+class CachedEconomyStore(EconomyStore):
+    """
+    Every row held in memory, loaded from `backend` once, with changes written behind.
+
+    Reads never touch disk. Each change marks its row dirty; dirty rows go to the backend in one
+    batch FLUSH_INTERVAL seconds after the first of them, or straight away once FLUSH_ROWS are
+    waiting, and on close() (registered with atexit). A crash therefore loses at most the last
+    FLUSH_INTERVAL seconds of changes. Every operation finishes without awaiting, so each one
+    is atomic with respect to the others, as the backend's transactions were.
+    """
+
+    def __init__(self, backend: EconomyStore, flush_interval: float = FLUSH_INTERVAL, flush_rows: int = FLUSH_ROWS):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self._rows: Dict[int, dict] = backend.load_all()
+        self._dirty: set = set()
+        self._flusher: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.last_flush = time.monotonic()
+
+    def _row(self, user_id: int) -> dict:
+        row = self._rows.get(user_id)
+        if row is None:
+            row = self._rows[user_id] = _new_row()
+            self._touch(user_id)
+        return row
+
+    def _touch(self, user_id: int):
+        self._dirty.add(user_id)
+        if len(self._dirty) >= self.flush_rows:
+            self.flush()
+        elif not self._arm():
+            self.flush()   # no event loop (scripts, shutdown): write through
+
+    def _arm(self) -> bool:
+        """Make sure a flush is coming within flush_interval; False when there's no loop to run one."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        # the flusher itself counts as done once it is flushing: a failed write must schedule a new one
+        if self._flusher is None or self._flusher.done() or self._flusher is asyncio.current_task():
+            self._flusher = loop.create_task(self._flush_later())
+        return True
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self.flush()
+
+    def flush(self) -> None:
+        if not self._dirty:
+            return
+        batch = {uid: dict(self._rows[uid]) for uid in self._dirty}
+        self._dirty.clear()
+        try:
+            self.backend.write_rows(batch)
+        except Exception as e:
+            self._dirty.update(batch)   # keep them and try again in flush_interval
+            print(f"[economy] flush of {len(batch)} row(s) failed: {type(e).__name__}: {e}")
+            self._arm()
+            return
+        self.flushes += 1
+        self.last_flush = time.monotonic()
+
+    async def get_row(self, user_id: int) -> dict:
+        return dict(self._row(user_id))
+
+    async def get_balance(self, user_id: int) -> int:
+        return self._row(user_id)["balance"]
+
+    async def set_balance(self, user_id: int, balance: int) -> None:
+        self._row(user_id)["balance"] = max(0, int(balance))
+        self._touch(user_id)
+
+    async def bump_stats(self, user_id: int, *, win: int = 0, loss: int = 0, push: int = 0, payout: int = 0) -> None:
+        await self.settle(user_id, wins=win, losses=loss, pushes=push, biggest_win=payout)
+
+    async def debit(self, user_id: int, amount: int) -> Optional[int]:
+        row = self._row(user_id)
+        if row["balance"] < amount:
+            return None
+        row["balance"] -= amount
+        self._touch(user_id)
+        return row["balance"]
+
+    async def settle(self, user_id: int, delta: int = 0, *, wins: int = 0, losses: int = 0, pushes: int = 0,
+                     biggest_win: int = 0) -> int:
+        row = self._row(user_id)
+        row["balance"] = max(0, row["balance"] + delta)
+        row["wins"] += wins
+        row["losses"] += losses
+        row["pushes"] += pushes
+        row["hands"] += wins + losses + pushes
+        row["biggest_win"] = max(row["biggest_win"], biggest_win)
+        self._touch(user_id)
+        return row["balance"]
+
+    async def get_last_charity_ymd(self, user_id: int) -> Optional[str]:
+        return self._row(user_id)["last_charity_ymd"]
+
+    async def set_last_charity_ymd(self, user_id: int, ymd: str) -> None:
+        self._row(user_id)["last_charity_ymd"] = ymd
+        self._touch(user_id)
+
+    async def top(self, n: int) -> List[Tuple[int, int, int]]:
+        best = heapq.nlargest(n, self._rows.items(), key=lambda item: item[1]["balance"])
+        return [(uid, row["balance"], row["hands"]) for uid, row in best]
+
+    def load_all(self) -> Dict[int, dict]:
+        return {uid: dict(row) for uid, row in self._rows.items()}
+
+    def write_rows(self, rows: Dict[int, dict]) -> None:
+        for uid, row in rows.items():
+            self._rows[uid] = {**_new_row(), **row}
+            self._dirty.add(uid)
+        self.flush()
+
+    def close(self) -> None:
+        if self._flusher is not None and not self._flusher.done():
+            try:
+                self._flusher.cancel()
+            except RuntimeError:
+                pass   # its loop is already closed; the flush below covers it
+        self.flush()
+        self.backend.close()
+
+
+BACKENDS = {"sqlite": SqliteEconomyStore, "json": JsonEconomyStore}
+
+_STORE: Optional[EconomyStore] = None
+
+
+def get_store() -> EconomyStore:
+    """The configured store, opened on first use (and flushed and closed at exit)."""
+    global _STORE
+    if _STORE is None:
+        try:
+            backend = BACKENDS[BACKEND]
+        except KeyError:
+            raise RuntimeError(f"Unknown ECONOMY_BACKEND {BACKEND!r}; use one of {', '.join(BACKENDS)}") from None
+        _STORE = CachedEconomyStore(backend()) if CACHE else backend()
+        atexit.register(close_store)
+    return _STORE
+
+
+def close_store() -> None:
+    global _STORE
+    if _STORE is not None:
+        _STORE.close()
+        _STORE = None
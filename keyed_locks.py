@@ -0,0 +1,33 @@
+from __future__ import annotations
+import asyncio, weakref
+from typing import Hashable
+
+
+class KeyedLocks:
+    """
+    One asyncio.Lock per key (a user id, say), created on demand.
+
+    The table holds its locks weakly: a lock lives only as long as someone is holding or waiting
+    on it, then drops out by itself, so it never grows with the number of keys ever seen. Two
+    callers with the same key can't end up with different locks, since a lock in use is always
+    still in the table.
+
+        async with USER_LOCKS(user_id):
+            ...
+    """
+
+    def __init__(self):
+        self._locks: "weakref.WeakValueDictionary[Hashable, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def __call__(self, key: Hashable) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        return lock
+
+    def locked(self, key: Hashable) -> bool:
+        lock = self._locks.get(key)
+        return lock is not None and lock.locked()
+
+    def __len__(self) -> int:
+        return len(self._locks)
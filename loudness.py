@@ -0,0 +1,112 @@
+from __future__ import annotations
+import asyncio, json, math, os, re, shlex
+from typing import Dict, Optional
+
+import config
+from audio_pipeline import BEFORE_OPTIONS, LOUDNORM_FILTER
+
+LOUDNESS_FILE = os.path.join("data", "loudness.json")
+
+TARGET_I = -16.0
+TARGET_TP = -1.5
+
+_JSON_BLOCK = re.compile(r"\{[^{}]*\}")
+
+
+def _gain_db(m: dict) -> float:
+    """
+    Gain that brings a measured track to TARGET_I, capped so its true peak stays under TARGET_TP.
+    Capping trades a little loudness on very dynamic tracks for never needing a limiter, which is
+    what lets playback use a plain `volume` filter instead of loudnorm's look-ahead.
+    """
+    i, tp = float(m["input_i"]), float(m["input_tp"])
+    if not (math.isfinite(i) and math.isfinite(tp)):
+        return 0.0   # silent / unmeasurable
+    return round(min(TARGET_I - i, TARGET_TP - tp), 2)
+
+
+class LoudnessStore:
+    """
+    Per-video loudness measurements from a one-off loudnorm analysis pass.
+
+    Measured tracks play with `volume=<gain>dB`; only never-seen tracks pay for single-pass
+    loudnorm. Analysis runs in the background, one ffmpeg at a time.
+    """
+
+    def __init__(self, path: str = LOUDNESS_FILE, max_jobs: int = 1):
+        self.path = path
+        self._measurements: Dict[str, dict] = {}
+        self._pending: set[str] = set()
+        self._jobs = asyncio.Semaphore(max_jobs)
+        self.analyzed = 0
+        self.failures = 0
+        self._load()
+
+    def has(self, video_id: Optional[str]) -> bool:
+        return bool(video_id) and video_id in self._measurements
+
+    def filter_for(self, video_id: Optional[str]) -> str:
+        m = self._measurements.get(video_id) if video_id else None
+        if m is None:
+            return LOUDNORM_FILTER
+        return f"volume={m['gain_db']}dB"
+
+    async def analyze(self, video_id: str, audio_url: str) -> Optional[dict]:
+        """Measure a track (decode only, no output) and store the result. Returns the measurement."""
+        if video_id in self._measurements:
+            return self._measurements[video_id]
+        if video_id in self._pending:
+            return None
+        self._pending.add(video_id)
+        try:
+            async with self._jobs:
+                proc = await asyncio.create_subprocess_exec(
+                    config.FFMPEG_PATH, "-nostdin", "-hide_banner", "-nostats",
+                    *shlex.split(BEFORE_OPTIONS), "-i", audio_url,
+                    "-vn", "-af", f"{LOUDNORM_FILTER}:print_format=json", "-f", "null", "-",
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                _, err = await proc.communicate()
+            text = err.decode(errors="replace")
+            blocks = _JSON_BLOCK.findall(text)
+            if proc.returncode != 0 or not blocks:
+                raise RuntimeError(text.strip().splitlines()[-1] if text.strip() else f"ffmpeg exited {proc.returncode}")
+            raw = json.loads(blocks[-1])
+            m = {k: raw[k] for k in ("input_i", "input_tp", "input_lra", "input_thresh", "target_offset")}
+            m["gain_db"] = _gain_db(m)
+            self._measurements[video_id] = m
+            self.analyzed += 1
+            self._save()
+            print(f"[loudness] {video_id}: I={m['input_i']} TP={m['input_tp']} -> {m['gain_db']} dB")
+            return m
+        except Exception as e:
+            self.failures += 1
+            print(f"[loudness] analysis failed for {video_id}: {type(e).__name__}: {e}")
+            return None
+        finally:
+            self._pending.discard(video_id)
+
+    def stats(self) -> dict:
+        return {
+            "measured": len(self._measurements),
+            "analyzed": self.analyzed,
+            "pending": len(self._pending),
+            "failures": self.failures,
+        }
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._measurements = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"[loudness] Could not read {self.path}: {type(e).__name__}: {e}")
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._measurements, f)
+        os.replace(tmp, self.path)
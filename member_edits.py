@@ -0,0 +1,152 @@
+from __future__ import annotations
+import asyncio, logging, re, time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import discord
+
+_MEMBER_ROUTE = re.compile(r"/guilds/(\d+)/members/\d+")
+
+
+class _PendingEdit:
+    __slots__ = ("member", "fields", "reason", "waiters")
+
+    def __init__(self, member: discord.Member, fields: dict, reason: Optional[str]):
+        self.member = member
+        self.fields = fields
+        self.reason = reason
+        self.waiters: List[asyncio.Future] = []
+
+
+class _RateLimitLog(logging.Handler):
+    """
+    discord.py retries 429s itself and only says so in its log; count the member-edit ones per
+    guild, and note how long Discord asked us to back off.
+    """
+
+    def __init__(self, dispatcher: "MemberEditDispatcher"):
+        super().__init__(logging.WARNING)
+        self.dispatcher = dispatcher
+
+    def emit(self, record: logging.LogRecord):
+        # only the "Retrying in" line: the "erroring instead" one is followed by a RateLimited
+        # exception, which the worker already counts
+        msg = str(record.msg)
+        if not (msg.startswith("We are being rate limited") and "Retrying in" in msg) or len(record.args or ()) < 3:
+            return
+        method, url, retry_after = record.args[:3]
+        match = _MEMBER_ROUTE.search(str(url))
+        if method == "PATCH" and match:
+            self.dispatcher.note_rate_limit(int(match.group(1)), float(retry_after))
+
+
+class MemberEditDispatcher:
+    """
+    Funnels member.edit() calls (server mute/deafen) through one worker per guild.
+
+    Edits for a member that is already waiting are merged into the waiting one (later fields
+    win), so a burst of enforcement for someone spamming unmute turns into a single PATCH. Each
+    guild has at most one edit in flight, which also means at most one per member. When Discord
+    answers 429, the guild's worker holds off for the retry-after it gave before sending more.
+    """
+
+    def __init__(self):
+        self._pending: Dict[int, "OrderedDict[int, _PendingEdit]"] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._resume_at: Dict[int, float] = {}   # guild id -> monotonic time its bucket resets
+        self.in_flight = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.rate_limited: Dict[int, int] = {}   # guild id -> 429s seen on member edits
+        logging.getLogger("discord.http").addHandler(_RateLimitLog(self))
+
+    def submit(self, member: discord.Member, reason: Optional[str] = None, **fields) -> asyncio.Future:
+        """Queue an edit; resolves once it (or the edit it was merged into) has been applied."""
+        guild_id = member.guild.id
+        queue = self._pending.setdefault(guild_id, OrderedDict())
+        pending = queue.get(member.id)
+        if pending is None:
+            pending = queue[member.id] = _PendingEdit(member, dict(fields), reason)
+        else:
+            pending.member = member
+            pending.fields.update(fields)
+            pending.reason = reason or pending.reason
+            self.coalesced += 1
+        future = asyncio.get_running_loop().create_future()
+        pending.waiters.append(future)
+        worker = self._workers.get(guild_id)
+        if worker is None or worker.done():
+            self._workers[guild_id] = asyncio.create_task(self._work(guild_id))
+        return future
+
+    def note_rate_limit(self, guild_id: int, retry_after: float) -> None:
+        self.rate_limited[guild_id] = self.rate_limited.get(guild_id, 0) + 1
+        self._resume_at[guild_id] = max(self._resume_at.get(guild_id, 0.0), time.monotonic() + retry_after)
+
+    async def _work(self, guild_id: int):
+        queue = self._pending[guild_id]
+        while queue:
+            wait = self._resume_at.get(guild_id, 0.0) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)   # intents keep merging while we hold off
+            _, edit = queue.popitem(last=False)
+            self.in_flight += 1
+            try:
+                await edit.member.edit(reason=edit.reason, **edit.fields)
+            except discord.RateLimited as e:
+                # discord.py gave up waiting (max_ratelimit_timeout); put it back and back off
+                self.note_rate_limit(guild_id, e.retry_after)
+                self._requeue(queue, edit)
+                continue
+            except Exception as e:
+                if isinstance(e, discord.HTTPException) and e.status == 429:
+                    self.note_rate_limit(guild_id, _retry_after(e))
+                    self._requeue(queue, edit)
+                    continue
+                self.failed += 1
+                for w in edit.waiters:
+                    if not w.done():
+                        w.set_exception(e)
+                continue
+            finally:
+                self.in_flight -= 1
+            self.sent += 1
+            for w in edit.waiters:
+                if not w.done():
+                    w.set_result(None)
+        self._pending.pop(guild_id, None)
+
+    @staticmethod
+    def _requeue(queue: "OrderedDict[int, _PendingEdit]", edit: _PendingEdit):
+        newer = queue.pop(edit.member.id, None)
+        if newer is not None:
+            # a newer intent arrived meanwhile; it wins, and everyone waits on it
+            edit.fields.update(newer.fields)
+            edit.reason = newer.reason or edit.reason
+            edit.waiters += newer.waiters
+        queue[edit.member.id] = edit
+        queue.move_to_end(edit.member.id, last=False)
+
+    def stats(self) -> dict:
+        return {
+            "queued": sum(len(q) for q in self._pending.values()),
+            "in_flight": self.in_flight,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "rate_limited": sum(self.rate_limited.values()),
+        }
+
+
+def _retry_after(e: discord.HTTPException) -> float:
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    for name in ("X-RateLimit-Reset-After", "Retry-After"):
+        try:
+            return float(headers[name])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return 1.0
+
+
+EDITS = MemberEditDispatcher()
@@ -0,0 +1,258 @@
+from __future__ import annotations
+import datetime, re
+from typing import Callable, List, Optional, Tuple
+
+import discord
+
+Predicate = Callable[[discord.Message], bool]
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp")
+_LINK = re.compile(r"https?://\S", re.I)
+_RELATIVE = re.compile(r"(\d+)([smhdw])", re.I)
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+_MENTION = re.compile(r"<@!?(\d+)>")
+
+# one term: optional "-", optional "key:", then a "quoted string", a /regex/ or a bare word
+_TOKEN = re.compile(r'(-)?(?:(\w+):)?("(?:[^"\\]|\\.)*"|/(?:[^/\\]|\\.)*/|\S+)')
+
+# cheaper checks run first so most messages are rejected before any text is looked at
+_COST = {"author": 0, "bot": 0, "human": 0, "before": 0, "after": 0, "minlen": 1, "maxlen": 1, "has": 1,
+         "contains": 2, "regex": 3}
+
+
+class FilterError(ValueError):
+    pass
+
+
+class MessageFilter:
+    """
+    A /purge filter expression compiled into one predicate.
+
+    Terms are separated by spaces and must all match; `or` starts an alternative group, and a
+    leading `-` negates a term. Regexes are compiled and text needles lowercased once here, and
+    each message's content is lowercased at most once however many text terms there are.
+
+        from:<user>        author by mention, id or name
+        bot / human        who sent it
+        has:image|embed|attachment|link
+        "some text"        contains (case-insensitive); bare words work too
+        re:/pattern/       regex search (case-insensitive)
+        before:X after:X   X is YYYY-MM-DD, a message id, or an age like 30m, 6h, 2d
+        minlen:N maxlen:N  content length
+
+    When the whole expression is one group, its before/after bounds are also exposed as
+    `before`/`after` so the history fetch itself can stop at them.
+    """
+
+    __slots__ = ("expression", "before", "after", "_check")
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        self.before: Optional[datetime.datetime] = None
+        self.after: Optional[datetime.datetime] = None
+        groups = _parse(self.expression)
+        if len(groups) == 1:
+            for negated, kind, value in groups[0]:
+                if negated:
+                    continue
+                if kind == "before":
+                    self.before = min(self.before or value, value)
+                elif kind == "after":
+                    self.after = max(self.after or value, value)
+        compiled = [_compile_group(g) for g in groups]
+        if not compiled:
+            self._check = None
+        elif len(compiled) == 1:
+            self._check = compiled[0]
+        else:
+            self._check = lambda m: any(check(m) for check in compiled)
+
+    @property
+    def matches_everything(self) -> bool:
+        return self._check is None
+
+    def __call__(self, message: discord.Message) -> bool:
+        return self._check is None or self._check(message)
+
+    def __repr__(self) -> str:
+        return f"MessageFilter({self.expression!r})"
+
+
+def quote(text: str) -> str:
+    """`text` as a single contains term, for building expressions from plain input."""
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+# ----------------------------- parsing -----------------------------
+Term = Tuple[bool, str, object]   # (negated, kind, value)
+
+
+def _parse(expression: str) -> List[List[Term]]:
+    groups: List[List[Term]] = [[]]
+    pos = 0
+    while True:
+        while pos < len(expression) and expression[pos].isspace():
+            pos += 1
+        if pos >= len(expression):
+            break
+        match = _TOKEN.match(expression, pos)
+        pos = match.end()
+        negated, key, raw = bool(match.group(1)), (match.group(2) or "").lower(), match.group(3)
+        if not key and not negated and raw.lower() == "or":
+            if not groups[-1]:
+                raise FilterError("`or` needs a term on both sides")
+            groups.append([])
+            continue
+        groups[-1].append((negated, *_term(key, raw)))
+    if not groups[-1]:
+        if len(groups) > 1:
+            raise FilterError("`or` needs a term on both sides")
+        return []
+    return groups
+
+
+def _unquote(raw: str) -> str:
+    if len(raw) >= 2 and raw[0] == raw[-1] == '"':
+        return re.sub(r'\\(.)', r'\1', raw[1:-1])
+    return raw
+
+
+def _term(key: str, raw: str) -> Tuple[str, object]:
+    if not key:
+        word = raw.lower()
+        if word in ("bot", "bots"):
+            return "bot", None
+        if word in ("human", "humans"):
+            return "human", None
+        if len(raw) > 1 and raw[0] == raw[-1] == "/":
+            return "regex", _regex(raw)
+        return "contains", _unquote(raw).lower()
+    value = _unquote(raw)
+    if key in ("from", "author", "user"):
+        return "author", _author(value)
+    if key == "is":
+        if value.lower() in ("bot", "human"):
+            return value.lower(), None
+        raise FilterError(f"`is:` takes bot or human, not `{value}`")
+    if key == "has":
+        kind = value.lower().rstrip("s")
+        if kind not in ("image", "embed", "attachment", "link", "file"):
+            raise FilterError(f"`has:` takes image, embed, attachment or link, not `{value}`")
+        return "has", "attachment" if kind == "file" else kind
+    if key in ("re", "regex"):
+        return "regex", _regex(raw)
+    if key in ("contains", "text"):
+        return "contains", value.lower()
+    if key in ("before", "after"):
+        return key, _when(value)
+    if key in ("minlen", "maxlen"):
+        if not value.isdigit():
+            raise FilterError(f"`{key}:` takes a number, not `{value}`")
+        return key, int(value)
+    raise FilterError(f"Unknown filter `{key}:`")
+
+
+def _regex(raw: str) -> "re.Pattern":
+    if len(raw) > 1 and raw[0] == raw[-1] == "/":
+        pattern = raw[1:-1].replace("\\/", "/")
+    else:
+        pattern = _unquote(raw)
+    try:
+        return re.compile(pattern, re.I)
+    except re.error as e:
+        raise FilterError(f"Bad regex `{pattern}`: {e}") from None
+
+
+def _author(value: str):
+    mention = _MENTION.fullmatch(value)
+    if mention:
+        return int(mention.group(1))
+    if value.isdigit():
+        return int(value)
+    return value.lstrip("@").lower()
+
+
+def _when(value: str) -> datetime.datetime:
+    if value.isdigit() and len(value) > 10:
+        return discord.utils.snowflake_time(int(value))
+    relative = _RELATIVE.fullmatch(value)
+    if relative:
+        return discord.utils.utcnow() - datetime.timedelta(seconds=int(relative.group(1)) * _UNITS[relative.group(2).lower()])
+    try:
+        when = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise FilterError(f"`{value}` is not a date (YYYY-MM-DD), message id or age like 2d") from None
+    return when if when.tzinfo else when.replace(tzinfo=datetime.timezone.utc)
+
+
+# ----------------------------- compiling -----------------------------
+def _is_image(message: discord.Message) -> bool:
+    for a in message.attachments:
+        if (a.content_type or "").startswith("image/") or a.filename.lower().endswith(IMAGE_EXTENSIONS):
+            return True
+    return any(e.type in ("image", "gifv") or e.image or e.thumbnail for e in message.embeds)
+
+
+_HAS = {
+    "image": _is_image,
+    "embed": lambda m: bool(m.embeds),
+    "attachment": lambda m: bool(m.attachments),
+    "link": lambda m: _LINK.search(m.content) is not None,
+}
+
+
+def _predicate(kind: str, value) -> Predicate:
+    if kind == "bot":
+        return lambda m: m.author.bot
+    if kind == "human":
+        return lambda m: not m.author.bot
+    if kind == "author":
+        if isinstance(value, int):
+            return lambda m: m.author.id == value
+        return lambda m: value in (m.author.name.lower(), (m.author.global_name or "").lower(),
+                                   m.author.display_name.lower())
+    if kind == "has":
+        return _HAS[value]
+    if kind == "before":
+        return lambda m: m.created_at < value
+    if kind == "after":
+        return lambda m: m.created_at > value
+    if kind == "minlen":
+        return lambda m: len(m.content) >= value
+    if kind == "maxlen":
+        return lambda m: len(m.content) <= value
+    if kind == "regex":
+        search = value.search
+        return lambda m: search(m.content) is not None
+    raise AssertionError(kind)
+
+
+def _negate(p: Predicate) -> Predicate:
+    return lambda m: not p(m)
+
+
+def _compile_group(terms: List[Term]) -> Predicate:
+    """AND of `terms`, cheapest first; all contains terms share one lowercased copy of the content."""
+    checks: List[Tuple[int, Predicate]] = []
+    needles = [v for neg, kind, v in terms if kind == "contains" and not neg]
+    banned = [v for neg, kind, v in terms if kind == "contains" and neg]
+    for negated, kind, value in terms:
+        if kind != "contains":
+            p = _predicate(kind, value)
+            checks.append((_COST[kind], _negate(p) if negated else p))
+    if needles or banned:
+        def text(m: discord.Message) -> bool:
+            content = m.content.lower()
+            return all(n in content for n in needles) and not any(n in content for n in banned)
+        checks.append((_COST["contains"], text))
+    checks.sort(key=lambda c: c[0])
+    ordered = [c for _, c in checks]
+    if len(ordered) == 1:
+        return ordered[0]
+
+    def check(m: discord.Message) -> bool:
+        for c in ordered:
+            if not c(m):
+                return False
+        return True
+    return check
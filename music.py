@@ -1,18 +1,27 @@
 from __future__ import annotations
 import asyncio
+import itertools
 import random
+import time
 from collections import deque
-from typing import Dict, Deque, Tuple, Optional
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Awaitable, Callable, Dict, Deque, Iterable, Optional, Set, Tuple
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
-import yt_dlp
 import spotipy
-import tempfile
 
 import config
 import private
+import ytdl
+from track_cache import ResolutionCache, SpotifyMatchCache
+from track_queue import TrackQueue
+from timer_wheel import TimerWheel
+from queue_journal import QueueJournal, load_journals
+from audio_pipeline import FRAME_SECONDS, PrimedSource, cached_source, ffmpeg_source
+from audio_cache import AudioCache
+from loudness import LoudnessStore
 
 from pathlib import Path
 
@@ -20,40 +29,744 @@ PLAYLISTS_DIR = Path(getattr(config, "PLAYLISTS_DIR", Path(__file__).parent / "p
 PLAYLISTS_DIR.mkdir(parents=True, exist_ok=True)
 
 
-SONG_QUEUES: Dict[str, Deque[Tuple[str, str]]] = {}
 
-async def _search_ytdlp(query: str) -> dict:
-    """Return yt-dlp info dict for a single track or ytsearch1 result, with SABR-resistant client fallbacks."""
-    import yt_dlp
-    from yt_dlp.utils import DownloadError, ExtractorError
+@dataclass
+class Track:
+    """A queue entry. Only identity and metadata; the stream URL is looked up just before playback."""
+    query: str
+    title: str
+    video_id: Optional[str] = None
+    duration: Optional[int] = None
+    spotify_id: Optional[str] = None   # set when the video was matched from a Spotify track
+    page_url: Optional[str] = None     # set for non-YouTube videos: the page their stream comes from
+
+
+def _track_dict(track: Track) -> dict:
+    """Journal form of a Track: identity only (never the expiring stream URL), Nones dropped."""
+    return {k: v for k, v in asdict(track).items() if v is not None}
+
+def _track_from(d: dict) -> Optional[Track]:
+    """A journaled track, or None (logged) if the record doesn't describe one."""
+    try:
+        return Track(**d)
+    except TypeError as e:
+        print(f"[journal] dropping bad track record {d!r}: {e}")
+        return None
+
+
+# The on-disk caches are opened by setup_music, not at import, so importing this module reads and
+# deletes nothing (an AudioCache scan clears *.part files, i.e. fills in progress).
+RESOLUTION_CACHE: Optional[ResolutionCache] = None
+SPOTIFY_MATCHES: Optional[SpotifyMatchCache] = None
+SpotifyRef = Tuple[Optional[str], Optional[str]]   # (spotify track id, ISRC)
+PREFETCH_AHEAD = getattr(config, "PREFETCH_AHEAD", 2)   # upcoming tracks to keep a live stream URL for
+_STREAM_LOOKUPS: Dict[str, asyncio.Task] = {}
+AUDIO_CACHE: Optional[AudioCache] = None
+LOUDNESS: Optional[LoudnessStore] = None
+
+PREWARM_LEAD = getattr(config, "PREWARM_LEAD", 15)   # seconds before a track ends to spin up the next one
+PREWARM_FRAMES = 150   # 20 ms Opus frames buffered ahead of the switch (3 s)
+
+PLAYLIST_CONCURRENCY = getattr(config, "PLAYLIST_CONCURRENCY", 4)   # parallel lookups per /playlist
+PROGRESS_INTERVAL = 5   # seconds between playlist progress message edits
+HISTORY_SIZE = 50   # finished tracks remembered per guild
+QUEUE_PAGE_SIZE = 10   # tracks per /queue page
+JOURNAL_POSITION_INTERVAL = 10   # seconds between playback position checkpoints
+IDLE_TIMEOUT = getattr(config, "DISCONNECT_TIMEOUT", 1800)   # seconds idle before leaving voice
+IDLE_TIMERS = TimerWheel(tick=5, name="idle")   # guild id -> idle disconnect deadline
+
+SPOTIFY_PAGE_SIZE = 100   # API maximum for playlist_items
+SPOTIFY_PAGE_CONCURRENCY = getattr(config, "SPOTIFY_PAGE_CONCURRENCY", 4)
+SPOTIFY_FIELDS = "items.track(id,name,artists(name),external_ids(isrc)),total"
+
+def _fmt_duration(seconds: int) -> str:
+    m, s = divmod(int(seconds), 60)
+    h, m = divmod(m, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+def _watch_url(video_id: str) -> str:
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+def _build_query(text: str, *, lyrics: bool = False) -> str:
+    """Turn user text into a yt-dlp query: URLs pass through, anything else becomes a ytsearch1."""
+    text = text.strip()
+    if text.startswith(("http://", "https://")):
+        return text
+    if lyrics and text and not text.lower().endswith("lyrics"):
+        text = f"{text} lyrics"
+    return f"ytsearch1:{text}"
+
+def _first_entry(info: dict) -> Optional[dict]:
+    if "entries" in info:
+        entries = info.get("entries") or []
+        return entries[0] if entries else None
+    return info
+
+async def _lookup(query: str, fallback_title: str = "Untitled", priority: int = ytdl.INTERACTIVE,
+                  spotify: Optional[SpotifyRef] = None) -> Optional[Track]:
+    """
+    Turn a query into a queueable Track through RESOLUTION_CACHE. Misses do a flat search, which
+    only fetches the result list, so nothing expensive happens until the track is about to play.
+    Spotify tracks check SPOTIFY_MATCHES first and skip the search entirely on a hit.
+    Returns None if the search came back empty.
+    """
+    if spotify is not None:
+        match = SPOTIFY_MATCHES.get(*spotify)
+        if match:
+            return Track(query=query, title=match["title"] or fallback_title, video_id=match["id"],
+                         duration=match["duration"], spotify_id=spotify[0])
+        track = await _lookup(query, fallback_title, priority)
+        if track is not None and track.video_id:
+            SPOTIFY_MATCHES.put(spotify[0], spotify[1], track.video_id, track.title, track.duration)
+            track.spotify_id = spotify[0]
+        return track
+
+    cached = RESOLUTION_CACHE.lookup(query)
+    if cached is None:
+        info = _first_entry(await ytdl.search(query, flat=True, priority=priority))
+        if info is None:
+            return None
+        if info.get("_type") == "url":
+            # flat search entry: its url is the watch page, not a stream
+            info = {**info, "url": None}
+        cached = RESOLUTION_CACHE.store(query, info)
+    return Track(query=query, title=cached["title"] or fallback_title,
+                 video_id=cached["id"], duration=cached["duration"], page_url=cached.get("page"))
+
+def _stream_query(track: Track) -> str:
+    """What to re-extract a track's stream from. Only YouTube ids become watch URLs."""
+    if track.page_url:
+        return track.page_url
+    return _watch_url(track.video_id) if track.video_id else track.query
+
+async def _extract_stream(track: Track, priority: int) -> str:
+    info = _first_entry(await ytdl.search(_stream_query(track), priority=priority))
+    if info is None or not info.get("url"):
+        raise LookupError(f"no playable stream for {track.query!r}")
+    RESOLUTION_CACHE.store(None if track.video_id else track.query, info)
+    return info["url"]
+
+async def _stream_url(track: Track, priority: int = ytdl.INTERACTIVE) -> str:
+    """
+    Playable URL for a track. Served from the cache while it is fresh, otherwise re-extracted by
+    video id. Concurrent callers (playback and prefetch) share one extraction per track.
+    """
+    if track.video_id:
+        cached = RESOLUTION_CACHE.get(track.video_id)
+        if cached and RESOLUTION_CACHE.is_fresh(cached):
+            return cached["url"]
+    key = track.video_id or track.query
+    task = _STREAM_LOOKUPS.get(key)
+    if task is None:
+        task = asyncio.create_task(_extract_stream(track, priority))
+        _STREAM_LOOKUPS[key] = task
+        task.add_done_callback(lambda _: _STREAM_LOOKUPS.pop(key, None))
+    elif priority == ytdl.INTERACTIVE:
+        ytdl.promote(_stream_query(track))   # a prefetch is in flight and playback now needs it
+    return await asyncio.shield(task)
+
+def _forget_unplayable(track: Track) -> None:
+    """A track's video is gone (see ytdl.is_unavailable): make the next lookup for it search again."""
+    if not track.video_id:
+        return
+    RESOLUTION_CACHE.forget(track.video_id)
+    if track.spotify_id:
+        SPOTIFY_MATCHES.invalidate(track.video_id)
+
+def _needs_stream(track: Track) -> bool:
+    if track.video_id and AUDIO_CACHE.contains(track.video_id):
+        return False
+    cached = RESOLUTION_CACHE.get(track.video_id) if track.video_id else None
+    return not (cached and RESOLUTION_CACHE.is_fresh(cached))
+
+async def _open_source(track: Track, priority: int = ytdl.INTERACTIVE, start: float = 0.0) -> discord.AudioSource:
+    """Audio source for a track, `start` seconds in: the local Opus file if we have one, otherwise the live stream."""
+    if track.video_id:
+        path = AUDIO_CACHE.path_for(track.video_id)
+        if path:
+            return cached_source(path, start)
+    return ffmpeg_source(await _stream_url(track, priority), LOUDNESS.filter_for(track.video_id), start)
+
+async def _analyze_and_cache(track: Track):
+    """First-play background work: measure loudness once, then transcode into the audio cache with that gain."""
+    try:
+        audio_url = await _stream_url(track, ytdl.BACKGROUND)
+        if not LOUDNESS.has(track.video_id):
+            await LOUDNESS.analyze(track.video_id, audio_url)
+        if not AUDIO_CACHE.contains(track.video_id):
+            AUDIO_CACHE.schedule_fill(track.video_id, audio_url, LOUDNESS.filter_for(track.video_id))
+    except Exception as e:
+        print(f"[audio-cache] {track.title}: {type(e).__name__}: {e}")
+
+async def _prefetch_one(track: Track):
+    try:
+        await _stream_url(track, ytdl.BACKGROUND)
+    except Exception as e:
+        print(f"[prefetch] {track.title}: {type(e).__name__}: {e}")
+
+class PlaylistLoader:
+    """
+    Resolves playlist entries on `concurrency` workers and appends them to the player's queue
+    in the order they were added, even though lookups finish out of order. Finished results wait
+    in `_results` until everything before them is done, so the queue grows from the head.
+    """
+
+    def __init__(self, player: "GuildPlayer", concurrency: int = PLAYLIST_CONCURRENCY,
+                 on_ready: Optional[Callable[[], None]] = None):
+        self.player = player
+        self.concurrency = max(1, concurrency)
+        self.on_ready = on_ready
+        self.total = 0
+        self.done = 0
+        self.queued = 0
+        self.failed = 0
+        self.cancelled = False
+        self._pending: asyncio.Queue = asyncio.Queue()
+        self._results: Dict[int, Optional[Track]] = {}
+        self._next_commit = 0
+        self._workers: list[asyncio.Task] = []
+
+    def add(self, items: Iterable[Tuple[str, str, Optional[SpotifyRef]]]) -> None:
+        """Submit (query, fallback_title, spotify_ref or None) entries in playlist order."""
+        for query, fallback, spotify in items:
+            self._pending.put_nowait((self.total, query, fallback, spotify))
+            self.total += 1
+
+    def close(self) -> None:
+        """No more items will be added; workers exit once the backlog drains."""
+        for _ in range(self.concurrency):
+            self._pending.put_nowait(None)
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        for w in self._workers:
+            w.cancel()
+
+    async def run(self) -> None:
+        self.player.loaders.add(self)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        finally:
+            self.player.loaders.discard(self)
+
+    async def _worker(self):
+        while True:
+            item = await self._pending.get()
+            if item is None:
+                return
+            idx, query, fallback, spotify = item
+            try:
+                track = await _lookup(query, fallback, ytdl.BACKGROUND, spotify)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[playlist] lookup failed for {query!r}: {type(e).__name__}: {e}")
+                track = None
+            self._results[idx] = track
+            self.done += 1
+            self._commit()
+
+    def _commit(self):
+        if self.cancelled:
+            return
+        appended = False
+        while self._next_commit in self._results:
+            track = self._results.pop(self._next_commit)
+            self._next_commit += 1
+            if track is None:
+                self.failed += 1
+                continue
+            self.player.queue.append(track)
+            self.queued += 1
+            appended = True
+        if appended:
+            self.player.prefetch_upcoming()
+            if self.on_ready is not None:
+                self.on_ready()
+
+
+@dataclass
+class _Prewarm:
+    track: Track
+    source: PrimedSource
+    ready: asyncio.Future
+
+    def discard(self):
+        self.source.cleanup()
+
+
+class GuildPlayer:
+    """
+    Music state for one guild: the track playing now, what's queued, what recently played, and
+    the background work tied to that queue (playlist loads, the pre-warmed next track).
+
+    Created on first use by get_player() and torn down by destroy_player() when the bot leaves
+    voice. Queue edits, the playing track and its position go to a QueueJournal so the queue
+    survives a restart. `lock` is held while the next track is picked and started, so a finished song's
+    callback, /play, /skip and playlist loaders never pop the queue or start playback twice.
+    """
+
+    __slots__ = ("guild_id", "loop", "voice_client", "channel", "current", "queue", "history",
+                 "loaders", "prewarm", "prewarm_timer", "lock", "pages", "pages_version",
+                 "journal", "where", "source", "offset", "resume")
+
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self.loop = asyncio.get_running_loop()
+        self.voice_client: Optional[discord.VoiceClient] = None
+        self.channel: Optional[discord.abc.Messageable] = None   # where "Now playing" goes
+        self.current: Optional[Track] = None
+        self.queue = TrackQueue()
+        self.queue.on_change = self._journal_queue
+        self.history: Deque[Track] = deque(maxlen=HISTORY_SIZE)
+        self.loaders: Set[PlaylistLoader] = set()
+        self.prewarm: Optional[_Prewarm] = None
+        self.prewarm_timer: Optional[asyncio.Task] = None
+        self.lock = asyncio.Lock()
+        self.pages: Dict[int, str] = {}   # rendered /queue pages for queue.version == pages_version
+        self.pages_version = -1
+        self.journal = QueueJournal(guild_id)
+        self.where: Tuple[Optional[int], Optional[int]] = (None, None)   # (voice channel id, text channel id)
+        self.source: Optional[PrimedSource] = None
+        self.offset = 0.0   # where in the track the current source started
+        self.resume: Optional[Tuple[Track, float]] = None   # head cut off by a restart, and where to pick it up
+
+    def attach(self, voice_client: discord.VoiceClient, channel: discord.abc.Messageable) -> None:
+        self.voice_client = voice_client
+        self.channel = channel
+        self.update_idle()
+        where = (voice_client.channel.id, getattr(channel, "id", None))
+        if where != self.where:
+            self.where = where
+            self.journal.write("where", voice=where[0], text=where[1])
+
+    def is_active(self) -> bool:
+        vc = self.voice_client
+        return vc is not None and vc.is_connected() and (vc.is_playing() or vc.is_paused())
+
+    # ----------------------------- playback -----------------------------
+    def kick(self) -> None:
+        """Start the queue if nothing is playing (e.g. the first track ended before more were resolved)."""
+        if self.voice_client is not None and self.voice_client.is_connected() and not self.is_active():
+            asyncio.create_task(self.play_next())
+
+    async def play_next(self, post_now_playing: bool = True, start: float = 0.0) -> None:
+        """Start the head of the queue; `start` seeks into it (used when resuming after a restart)."""
+        async with self.lock:
+            try:
+                await self._start_next(post_now_playing, start)
+            finally:
+                self.update_idle()
 
-    client_chain = ["tv_embedded", "android", "web_creator"]  # avoid plain "web"
-    last_err = None
-    loop = asyncio.get_running_loop()
+    async def _start_next(self, post_now_playing: bool, start: float) -> None:
+        vc = self.voice_client
+        if vc is None or self.is_active():
+            return
+        while self.queue:
+            track = self.queue.popleft()
+            if not start and self.resume is not None and self.resume[0] is track:
+                start = self.resume[1]
+            self.resume = None
+            source = None if start else await self.take_prewarmed(track)
+            if source is None:
+                try:
+                    source = await _open_source(track, start=start)
+                except Exception as e:
+                    print(f"Error resolving {track.title}: {type(e).__name__}: {e}")
+                    if ytdl.is_unavailable(e):
+                        _forget_unplayable(track)   # a timeout or flaky client says nothing about the match
+                    asyncio.create_task(self.channel.send(f"Skipping **{track.title}** (couldn't load it)."))
+                    start = 0.0
+                    continue
+            if not isinstance(source, PrimedSource):
+                source = PrimedSource(source)   # unprimed; wrapped only to count the packets played
+
+            if not vc.is_connected() or vc.is_playing() or vc.is_paused():
+                # disconnected (or shutting down) while we were resolving; keep our place either way,
+                # so the journal still has the track for the next start
+                source.cleanup()
+                self.queue.appendleft(track)
+                if start:
+                    self.resume = (track, start)
+                    self.compact_journal()   # the pop and re-insert above dropped the journal's resume point
+                return
 
-    for client in client_chain:
-        opts = {
-            "format": "ba/bestaudio/best",
-            "noplaylist": True,
-            # Do not force-disable manifests; let yt-dlp pick workable ones
-            "extractor_args": {"youtube": {"player_client": client}},
-            "quiet": True,
-            "no_warnings": True,
-        }
+            self.current, self.source, self.offset = track, source, start
+            self.journal.write("play", t=_track_dict(track), start=start)
+            vc.play(source, after=lambda error, track=track: self.loop.call_soon_threadsafe(self._track_ended, track, error))
+            if track.video_id and not (AUDIO_CACHE.contains(track.video_id) and LOUDNESS.has(track.video_id)):
+                asyncio.create_task(_analyze_and_cache(track))
+            self.prefetch_upcoming()
+            self.schedule_prewarm(max(0, (track.duration or 0) - start - PREWARM_LEAD))
+
+            if post_now_playing:
+                asyncio.create_task(self.channel.send(f"Now playing: **{track.title}**"))
+            return
+
+    def _track_ended(self, track: Track, error: Optional[Exception]) -> None:
+        vc = self.voice_client
+        if vc is None or not vc.is_connected() or vc.client.is_closed():
+            # stopped by the bot shutting down or leaving voice, not by the track finishing: leave
+            # the journal's current track alone and don't start the next one
+            return
+        if error:
+            print(f"Error playing {track.title}: {error}")
+        if self.current is track:
+            self.current, self.source = None, None
+            self.journal.write("idle")
+        self.history.append(track)
+        asyncio.create_task(self.play_next())
+
+    # ----------------------------- idle -----------------------------
+    def is_idle(self) -> bool:
+        """Connected but doing nothing useful: nothing playing, paused, or playing to an empty channel."""
+        vc = self.voice_client
+        if vc is None or not vc.is_connected():
+            return False
+        if not vc.is_playing():
+            return True   # stopped or paused
+        return all(m.bot for m in vc.channel.members)
+
+    def update_idle(self) -> None:
+        """Start the disconnect countdown when we go idle (keeping one already running), cancel it on activity."""
+        if PLAYERS.get(self.guild_id) is not self:
+            return   # destroyed (a late after-callback); the timer belongs to the guild's current player
+        if self.is_idle():
+            IDLE_TIMERS.schedule(self.guild_id, IDLE_TIMEOUT, self._idle_expired, replace=False)
+        else:
+            IDLE_TIMERS.cancel(self.guild_id)
+
+    def _idle_expired(self) -> None:
+        asyncio.create_task(self._leave_idle())
+
+    async def _leave_idle(self):
+        if PLAYERS.get(self.guild_id) is not self or not self.is_idle():
+            return
+        vc, channel = self.voice_client, self.channel
+        print(f"[idle] leaving voice in guild {self.guild_id} after {IDLE_TIMEOUT}s idle")
+        destroy_player(self.guild_id)
         try:
-            return await loop.run_in_executor(
-                None, lambda: yt_dlp.YoutubeDL(opts).extract_info(query, download=False)
-            )
-        except (DownloadError, ExtractorError) as e:
-            msg = str(e)
-            # SABR or missing URL indicators. Try next client.
-            if ("SABR" in msg) or ("missing a url" in msg) or ("Requested format is not available" in msg):
-                last_err = e
-                continue
-            # Other error. Bubble up.
-            raise
-    # If all clients failed, raise the last error so callers can message the user.
-    raise last_err if last_err else RuntimeError("yt-dlp failed with unknown error")
+            await vc.disconnect()
+            if channel is not None:
+                await channel.send(f"Left voice after {IDLE_TIMEOUT // 60} minutes of inactivity.")
+        except discord.HTTPException:
+            pass
+
+    def position(self) -> float:
+        """Seconds into the current track, from the packets the voice player has actually sent."""
+        if self.source is None:
+            return 0.0
+        return self.offset + self.source.frames * FRAME_SECONDS
+
+    # ----------------------------- journal -----------------------------
+    def _journal_queue(self, op: str, *args) -> None:
+        if op in ("append", "insert"):
+            *index, track = args
+            self.journal.write(op, **({"i": index[0]} if index else {}), t=_track_dict(track))
+        elif op in ("pop", "jump"):
+            self.journal.write(op, i=args[0])
+        elif op == "move":
+            self.journal.write(op, src=args[0], dst=args[1])
+        elif op == "reset":
+            self.journal.write(op, tracks=[_track_dict(t) for t in args[0]])
+        if self.journal.needs_compaction(len(self.queue)):
+            self.compact_journal()
+
+    def compact_journal(self) -> None:
+        current = _track_dict(self.current) if self.current else None
+        resume = 0.0
+        if self.resume is not None and self.queue and self.queue[0] is self.resume[0]:
+            resume = self.resume[1]
+        self.journal.compact([_track_dict(t) for t in self.queue], current, self.position(), *self.where,
+                             resume=resume)
+
+    def checkpoint(self) -> None:
+        """Record how far into the current track we are, so a restart resumes near here."""
+        if self.current is not None and self.is_active():
+            self.journal.write("pos", s=round(self.position(), 1))
+
+    def restore(self, state: dict) -> float:
+        """
+        Load a replayed journal. The interrupted track goes back to the head of the queue;
+        returns how far into it playback should resume. Records that aren't tracks are dropped.
+        """
+        loaded = [_track_from(d) for d in state["tracks"]]
+        start = state["resume"] if loaded and loaded[0] is not None else 0.0
+        tracks = [t for t in loaded if t is not None]
+        current = _track_from(state["current"]) if state["current"] else None
+        if current is not None:
+            tracks.insert(0, current)
+            start = state["position"] or 0.0
+        self.resume = (tracks[0], start) if start else None
+        self.queue = TrackQueue(tracks)
+        self.queue.on_change = self._journal_queue
+        self.where = (state["voice"], state["text"])
+        self.compact_journal()   # the file now describes the queue as loaded, head and resume point included
+        return start
+
+    def queue_changed(self) -> None:
+        """Tracks were inserted, removed or reordered: re-warm the head and keep the next few URLs fresh."""
+        self.reset_prewarm()
+        self.prefetch_upcoming()
+
+    def prefetch_upcoming(self) -> None:
+        """Warm stream URLs for the next PREFETCH_AHEAD tracks in the background."""
+        for track in itertools.islice(self.queue, PREFETCH_AHEAD):
+            if _needs_stream(track) and (track.video_id or track.query) not in _STREAM_LOOKUPS:
+                asyncio.create_task(_prefetch_one(track))
+
+    def queue_page(self, page: int) -> str:
+        """One rendered /queue page, built from just those tracks and cached until the queue changes."""
+        if self.pages_version != self.queue.version:
+            self.pages.clear()
+            self.pages_version = self.queue.version
+        text = self.pages.get(page)
+        if text is None:
+            start = page * QUEUE_PAGE_SIZE
+            lines = []
+            for pos, track in enumerate(self.queue.slice(start, start + QUEUE_PAGE_SIZE), start + 1):
+                length = f" `{_fmt_duration(track.duration)}`" if track.duration else ""
+                lines.append(f"`{pos}.` {track.title}{length}")
+            text = self.pages[page] = "\n".join(lines)
+        return text
+
+    # ----------------------------- playlists -----------------------------
+    async def load_playlist(self, feed: Callable[[PlaylistLoader], Awaitable[None]], expected: int = 0) -> None:
+        """
+        Resolve the rest of a playlist in the background, posting progress as it goes. `feed` adds
+        items to the loader (possibly as they are fetched); resolution starts as soon as the first arrive.
+        """
+        loader = PlaylistLoader(self, on_ready=self.kick)
+        run = asyncio.create_task(loader.run())
+
+        async def produce():
+            try:
+                await feed(loader)
+            except Exception as e:
+                print(f"[playlist] feeding stopped early: {type(e).__name__}: {e}")
+            finally:
+                loader.close()
+        producer = asyncio.create_task(produce())
+
+        try:
+            progress = await self.channel.send(f"Queuing playlist... 0/{max(expected, loader.total)} resolved.")
+            while not run.done():
+                await asyncio.wait({run}, timeout=PROGRESS_INTERVAL)
+                if loader.cancelled:
+                    producer.cancel()
+                elif not run.done():
+                    try:
+                        await progress.edit(content=f"Queuing playlist... {loader.done}/{max(expected, loader.total)} resolved.")
+                    except discord.HTTPException:
+                        pass
+
+            if loader.cancelled:
+                await progress.edit(content=f"Playlist loading cancelled after {loader.queued + 1} track(s).")
+                return
+            summary = f"Queued **{loader.queued + 1}** tracks."
+            if loader.failed:
+                summary += f" ({loader.failed} could not be found.)"
+            await progress.edit(content=summary)
+        finally:
+            # a cancel can land after run() has finished, or this task can die mid-report; either
+            # way the feed (e.g. still paging through Spotify) must not outlive the load
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+    def cancel_loads(self) -> int:
+        """Stop every in-flight playlist load. Returns how many were cancelled."""
+        loaders, self.loaders = self.loaders, set()
+        for loader in loaders:
+            loader.cancel()
+        return len(loaders)
+
+    # ----------------------------- pre-warm -----------------------------
+    def schedule_prewarm(self, delay: float) -> None:
+        """Pre-warm whatever is at the head of the queue `delay` seconds from now."""
+        if self.prewarm_timer is not None:
+            self.prewarm_timer.cancel()
+
+        async def fire():
+            await asyncio.sleep(delay)
+            await self._prewarm_head()
+
+        self.prewarm_timer = asyncio.create_task(fire())
+
+    async def _prewarm_head(self):
+        if not self.queue:
+            return
+        track = self.queue[0]
+        if self.prewarm is not None:
+            if self.prewarm.track is track:
+                return
+            self.prewarm.discard()
+            self.prewarm = None
+
+        try:
+            inner = await _open_source(track, ytdl.BACKGROUND)
+        except Exception as e:
+            print(f"[prewarm] {track.title}: {type(e).__name__}: {e}")
+            return
+        if not self.queue or self.queue[0] is not track or self.prewarm is not None:
+            inner.cleanup()
+            return   # queue moved on while we were resolving
+
+        source = PrimedSource(inner)
+        ready = self.loop.run_in_executor(None, source.prime, PREWARM_FRAMES)
+        self.prewarm = _Prewarm(track, source, ready)
+
+    async def take_prewarmed(self, track: Track) -> Optional[PrimedSource]:
+        """The primed source for `track` if one exists; a pre-warm for any other track is thrown away."""
+        pw, self.prewarm = self.prewarm, None
+        if pw is None:
+            return None
+        if pw.track is not track:
+            pw.discard()
+            return None
+        try:
+            frames = await pw.ready
+        except Exception as e:
+            print(f"[prewarm] priming {track.title} failed: {type(e).__name__}: {e}")
+            frames = 0
+        if not frames:
+            pw.discard()
+            return None
+        return pw.source
+
+    def reset_prewarm(self) -> None:
+        """The queue head may have changed: drop a stale pre-warm, re-warming straight away if we're already in the lead window."""
+        if self.prewarm is not None and not (self.queue and self.queue[0] is self.prewarm.track):
+            self.prewarm.discard()
+            self.prewarm = None
+        if self.prewarm_timer is not None and self.prewarm_timer.done():
+            self.schedule_prewarm(0)
+
+    def cancel_prewarm(self) -> None:
+        if self.prewarm is not None:
+            self.prewarm.discard()
+            self.prewarm = None
+        if self.prewarm_timer is not None:
+            self.prewarm_timer.cancel()
+            self.prewarm_timer = None
+
+    def teardown(self) -> None:
+        IDLE_TIMERS.cancel(self.guild_id)
+        self.cancel_loads()
+        self.cancel_prewarm()
+        self.queue.on_change = None
+        self.queue.clear()
+        self.current, self.source, self.resume = None, None, None
+        self.journal.discard()
+
+
+PLAYERS: Dict[int, GuildPlayer] = {}
+
+def get_player(guild_id: int) -> GuildPlayer:
+    player = PLAYERS.get(guild_id)
+    if player is None:
+        player = PLAYERS[guild_id] = GuildPlayer(guild_id)
+    return player
+
+def destroy_player(guild_id: int) -> None:
+    """Drop a guild's player and everything running on its behalf."""
+    player = PLAYERS.pop(guild_id, None)
+    if player is not None:
+        player.teardown()
+
+
+class QueueView(discord.ui.View):
+    """Page buttons under a /queue embed. Each press renders only the page being shown."""
+
+    def __init__(self, player: GuildPlayer, timeout: float = 180):
+        super().__init__(timeout=timeout)
+        self.player = player
+        self.page = 0
+        self.message: Optional[discord.Message] = None
+
+    def page_count(self) -> int:
+        return max(1, -(-len(self.player.queue) // QUEUE_PAGE_SIZE))
+
+    def render(self) -> discord.Embed:
+        q = self.player.queue
+        pages = self.page_count()
+        self.page = min(self.page, pages - 1)   # the queue may have shrunk since the last press
+        embed = discord.Embed(
+            title="Song Queue",
+            description=self.player.queue_page(self.page) or "The song queue is currently empty.",
+            color=discord.Color.blurple(),
+        )
+        if self.player.current:
+            embed.add_field(name="Now playing", value=self.player.current.title, inline=False)
+        total = _fmt_duration(q.total_duration)
+        if q.unknown_durations:
+            total += f" + {q.unknown_durations} of unknown length"
+        embed.set_footer(text=f"Page {self.page + 1}/{pages} • {len(q)} tracks • {total}")
+        self.first_page.disabled = self.prev_page.disabled = self.page == 0
+        self.next_page.disabled = self.last_page.disabled = self.page >= pages - 1
+        return embed
+
+    async def _show(self, interaction: discord.Interaction, page: int):
+        self.page = max(0, page)
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    @discord.ui.button(emoji="⏮️", style=discord.ButtonStyle.secondary)
+    async def first_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, 0)
+
+    @discord.ui.button(emoji="◀️", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page - 1)
+
+    @discord.ui.button(emoji="▶️", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1)
+
+    @discord.ui.button(emoji="⏭️", style=discord.ButtonStyle.secondary)
+    async def last_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page_count() - 1)
+
+    async def on_timeout(self):
+        if self.message is not None:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
+
+def _page_tracks(page: dict) -> list[tuple[str, str, SpotifyRef]]:
+    """(name, artists, (spotify id, isrc)) for every real track on a Spotify playlist_items page."""
+    out = []
+    for it in page.get("items", []):
+        t = it.get("track")
+        if t and t.get("name"):
+            artists = ", ".join(a["name"] for a in t.get("artists", []))
+            isrc = (t.get("external_ids") or {}).get("isrc")
+            out.append((t["name"], artists, (t.get("id"), isrc)))
+    return out
+
+async def _spotify_pages(fetch_page: Callable[[int], dict], offsets: Iterable[int]) -> AsyncIterator[dict]:
+    """
+    Fetch playlist pages on the default executor, SPOTIFY_PAGE_CONCURRENCY at a time, yielding them
+    in offset order; later pages keep downloading while earlier ones are being consumed.
+    """
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(SPOTIFY_PAGE_CONCURRENCY)
+
+    async def one(offset):
+        async with sem:
+            return await loop.run_in_executor(None, fetch_page, offset)
+
+    tasks = [asyncio.create_task(one(o)) for o in offsets]
+    try:
+        for task in tasks:
+            try:
+                yield await task
+            except spotipy.SpotifyException as e:
+                print(f"[spotify] page fetch failed: {e}")
+    finally:
+        for task in tasks:
+            task.cancel()
 
 
 def _is_spotify_playlist(s: str) -> bool:
@@ -73,12 +786,77 @@ def _load_text_playlist(filename: str) -> list[str]:
     return lines
 
 
+def _open_caches() -> None:
+    global RESOLUTION_CACHE, SPOTIFY_MATCHES, AUDIO_CACHE, LOUDNESS
+    if RESOLUTION_CACHE is None:
+        RESOLUTION_CACHE = ResolutionCache(max_entries=getattr(config, "TRACK_CACHE_SIZE", 2000))
+        SPOTIFY_MATCHES = SpotifyMatchCache()
+        AUDIO_CACHE = AudioCache(max_bytes=getattr(config, "AUDIO_CACHE_MAX_MB", 1024) * 1024 * 1024)
+        LOUDNESS = LoudnessStore()
+
+
 def setup_music(bot: commands.Bot | discord.Bot) -> None:
+    _open_caches()
     spotify = spotipy.Spotify(auth_manager=spotipy.SpotifyClientCredentials(
         client_id=config.SPOTIFY_CLIENT_ID,
         client_secret=config.SPOTIFY_CLIENT_SECRET
     ))
     
+    ytdl.configure(getattr(config, "YTDL_WORKERS", 4))
+
+    @tasks.loop(seconds=JOURNAL_POSITION_INTERVAL)
+    async def checkpoint_positions():
+        for player in PLAYERS.values():
+            player.checkpoint()
+
+    async def restore_queues():
+        """Rebuild journaled queues from disk and pick playback back up where it stopped."""
+        started = time.perf_counter()
+        restored = 0
+        for guild_id, state in load_journals().items():
+            guild = bot.get_guild(guild_id)
+            if guild is None or not (state["tracks"] or state["current"]):
+                QueueJournal(guild_id).discard()
+                continue
+            player = get_player(guild_id)
+            start = player.restore(state)
+            restored += 1
+
+            voice = guild.get_channel(state["voice"]) if state["voice"] else None
+            text = guild.get_channel(state["text"]) if state["text"] else None
+            if not isinstance(voice, discord.VoiceChannel) or text is None or all(m.bot for m in voice.members):
+                continue   # nobody to play to; the queue waits for the next /play
+            try:
+                voice_client = guild.voice_client or await voice.connect()
+            except (discord.ClientException, asyncio.TimeoutError) as e:
+                print(f"[journal] Could not rejoin {voice} in {guild}: {type(e).__name__}: {e}")
+                continue
+            player.attach(voice_client, text)
+            await player.play_next(post_now_playing=True, start=start)
+        if restored:
+            print(f"[journal] restored {restored} queue(s) in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    @bot.listen("on_ready")
+    async def start_music_tasks():
+        if not checkpoint_positions.is_running():
+            checkpoint_positions.start()
+            await restore_queues()   # first ready only; reconnects keep their in-memory players
+
+    @bot.listen("on_voice_state_update")
+    async def music_voice_state(member, before, after):
+        if bot.is_closed():
+            return   # leaving because the bot is shutting down keeps the journal for the next start
+        if member.id == bot.user.id:
+            if before.channel is not None and after.channel is None:
+                # however we left (/stop, kicked, channel deleted), the guild's queue goes with us
+                destroy_player(member.guild.id)
+                return
+        player = PLAYERS.get(member.guild.id)
+        if player is not None and player.voice_client is not None and before.channel != after.channel:
+            # someone joined or left our channel (or we were moved): re-check whether anyone is listening
+            if player.voice_client.channel in (before.channel, after.channel):
+                player.update_idle()
+
     tree = bot.tree
     guilds = [discord.Object(id=config.GUILD_ID)]
 
@@ -107,41 +885,27 @@ def setup_music(bot: commands.Bot | discord.Bot) -> None:
         elif voice_client.channel.id != voice_channel.id:
             voice_client = await voice_client.move_to(voice_channel)
 
-        if song_query.startswith("http://") or song_query.startswith("https://"):
-            query = song_query
-        else:
-            q = song_query.strip()
-            if q and not q.lower().endswith("lyrics"):
-                q = f"{q} lyrics"
-            query = f"ytsearch1:{q}"
+        query = _build_query(song_query, lyrics=True)
 
         print(f"[ytsearch] query={query}")
-        results = await _search_ytdlp(query)
-
-        if "entries" in results:
-            tracks = results.get("entries", [])
-            if not tracks:
-                await interaction.followup.send("No results found.")
-                return
-            first_track = tracks[0]
-        else:
-            first_track = results
+        track = await _lookup(query)
+        if track is None:
+            await interaction.followup.send("No results found.")
+            return
 
-        audio_url = first_track["url"]
-        title = first_track.get("title", "Untitled")
+        title = track.title
         print(f"[ytsearch] result_title={title}")
 
-        guild_id = str(interaction.guild_id)
-        if SONG_QUEUES.get(guild_id) is None:
-            SONG_QUEUES[guild_id] = deque()
-
-        SONG_QUEUES[guild_id].append((audio_url, title))
+        player = get_player(interaction.guild_id)
+        player.attach(voice_client, interaction.channel)
+        player.queue.append(track)
+        player.prefetch_upcoming()
 
-        if voice_client.is_playing() or voice_client.is_paused():
+        if player.is_active():
             await interaction.followup.send(f"Added to queue: **{title}**")
         else:
             await interaction.followup.send(f"Now playing: **{title}**")
-            await play_next_song(voice_client, guild_id, interaction.channel, post_now_playing=False)
+            await player.play_next(post_now_playing=False)
 
     #-------------------------- /skip --------------------------
     @bot.tree.command(name="skip", description="Skips the current playing song", guilds=guilds)
@@ -164,6 +928,8 @@ def setup_music(bot: commands.Bot | discord.Bot) -> None:
             return await interaction.response.send_message("Nothing is currently playing.")
         
         voice_client.pause()
+        if interaction.guild_id in PLAYERS:
+            PLAYERS[interaction.guild_id].update_idle()
         await interaction.response.send_message("Playback paused.")
 
     #-------------------------- /resume --------------------------
@@ -178,6 +944,8 @@ def setup_music(bot: commands.Bot | discord.Bot) -> None:
             return await interaction.response.send_message("I'm not paused right now.")
         
         voice_client.resume()
+        if interaction.guild_id in PLAYERS:
+            PLAYERS[interaction.guild_id].update_idle()
         await interaction.response.send_message("Playback resumed.")
 
     #-------------------------- /stop --------------------------
@@ -190,9 +958,7 @@ def setup_music(bot: commands.Bot | discord.Bot) -> None:
             await interaction.followup.send("I'm not in a voice channel.")
             return
         
-        guild_id_str = str(interaction.guild_id)
-        if guild_id_str in SONG_QUEUES:
-            SONG_QUEUES[guild_id_str].clear()
+        destroy_player(interaction.guild_id)
 
         if voice_client.is_playing() or voice_client.is_paused():
             voice_client.stop()
@@ -203,25 +969,18 @@ def setup_music(bot: commands.Bot | discord.Bot) -> None:
 
     @bot.tree.command(name="queue", description="Lists out the songs currently queued to play.", guilds=guilds)
     async def queue(interaction: discord.Interaction):
-        guild_id = str(interaction.guild_id)
-        queue = SONG_QUEUES.get(guild_id)
+        player = PLAYERS.get(interaction.guild_id)
 
-        if not queue or len(queue) == 0:
+        if player is None or not player.queue:
             await interaction.response.send_message("The song queue is currently empty.")
             return
 
-        message_lines = []
-        for idx, (_, title) in enumerate(queue):
-            message_lines.append(f"{idx + 1}. {title}")
-
-        message = "\n".join(message_lines)
-        if len(message) > 2000:
-            with tempfile.NamedTemporaryFile(mode="w+", delete=False, suffix=".txt") as temp_file:
-                temp_file.write(message)
-                temp_file_path = temp_file.name
-            await interaction.response.send_message("The queue is too long to display here. See the attached file.", file=discord.File(temp_file_path))
-        else:
-            await interaction.response.send_message(f"Current Song Queue:\n{message}") 
+        view = QueueView(player)
+        if view.page_count() == 1:
+            await interaction.response.send_message(embed=view.render())
+            return
+        await interaction.response.send_message(embed=view.render(), view=view)
+        view.message = await interaction.original_response()
 
     @bot.tree.command(name="nowplaying", description="Gets the currently playing song.", guilds=guilds)
     async def nowplaying(interaction: discord.Interaction):
@@ -231,11 +990,10 @@ def setup_music(bot: commands.Bot | discord.Bot) -> None:
             await interaction.response.send_message("No song is currently playing.")
             return
 
-        guild_id = str(interaction.guild_id)
-        queue = SONG_QUEUES.get(guild_id)
+        player = PLAYERS.get(interaction.guild_id)
 
-        if queue and len(queue) > 0:
-            current_song = queue[0][1]
+        if player and player.current:
+            current_song = player.current.title
             await interaction.response.send_message(f"Currently playing: **{current_song}**")
         else:
             await interaction.response.send_message("Currently playing a song, but the title is unknown.")
@@ -256,8 +1014,8 @@ def setup_music(bot: commands.Bot | discord.Bot) -> None:
             await interaction.followup.send("Nothing is currently playing. Use /play instead.", ephemeral=True)
             return
 
-        guild_id = str(interaction.guild_id)
-        q = SONG_QUEUES.get(guild_id)
+        player = get_player(interaction.guild_id)
+        q = player.queue
 
         # Per your requirement: only works if there is currently stuff in the queue
         if not q or len(q) == 0:
@@ -265,34 +1023,97 @@ def setup_music(bot: commands.Bot | discord.Bot) -> None:
             return
 
         # Build query like /play
-        query = song_query if song_query.startswith(("http://", "https://")) else f"ytsearch1:{song_query}"
+        query = _build_query(song_query)
 
         try:
             print(f"[ytsearch] query={query}")
-            results = await _search_ytdlp(query)
+            track = await _lookup(query)
         except Exception:
             await interaction.followup.send("Search failed for that query.", ephemeral=True)
             return
 
-        if "entries" in results:
-            entries = results.get("entries") or []
-            if not entries:
-                await interaction.followup.send("No results found.", ephemeral=True)
-                return
-            first = entries[0]
-        else:
-            first = results
+        if track is None:
+            await interaction.followup.send("No results found.", ephemeral=True)
+            return
 
-        audio_url = first["url"]
-        title = first.get("title", "Untitled")
+        title = track.title
         print(f"[ytsearch] result_title={title}")
 
         # Insert at the front so it becomes the very next song
-        q.appendleft((audio_url, title))
+        q.appendleft(track)
+        player.queue_changed()
 
         await interaction.followup.send(f"Will play next: **{title}**")
 
 
+    #-------------------------- queue editing --------------------------
+    async def editable_player(interaction: discord.Interaction, *positions: int) -> Optional[GuildPlayer]:
+        """The guild's player if its queue has something at every 1-based position given; otherwise says why and returns None."""
+        player = PLAYERS.get(interaction.guild_id)
+        if player is None or not player.queue:
+            await interaction.response.send_message("The song queue is currently empty.", ephemeral=True)
+            return None
+        for pos in positions:
+            if not 1 <= pos <= len(player.queue):
+                await interaction.response.send_message(
+                    f"There's no track at position {pos}. The queue has {len(player.queue)}.", ephemeral=True)
+                return None
+        return player
+
+    @bot.tree.command(name="remove", description="Remove a track from the queue.", guilds=guilds)
+    @app_commands.describe(position="Position in /queue")
+    async def remove(interaction: discord.Interaction, position: int):
+        player = await editable_player(interaction, position)
+        if player is None:
+            return
+        track = player.queue.pop(position - 1)
+        player.queue_changed()
+        await interaction.response.send_message(f"Removed **{track.title}** from the queue.")
+
+    @bot.tree.command(name="move", description="Move a track to a different spot in the queue.", guilds=guilds)
+    @app_commands.describe(from_position="Current position in /queue", to_position="Position it should end up at")
+    async def move(interaction: discord.Interaction, from_position: int, to_position: int):
+        player = await editable_player(interaction, from_position, to_position)
+        if player is None:
+            return
+        track = player.queue.move(from_position - 1, to_position - 1)
+        player.queue_changed()
+        await interaction.response.send_message(f"Moved **{track.title}** to position {to_position}.")
+
+    @bot.tree.command(name="jump", description="Skip straight to a track in the queue.", guilds=guilds)
+    @app_commands.describe(position="Position in /queue")
+    async def jump(interaction: discord.Interaction, position: int):
+        player = await editable_player(interaction, position)
+        if player is None:
+            return
+        dropped = player.queue.jump(position - 1)
+        player.queue_changed()
+        await interaction.response.send_message(f"Jumping to **{player.queue[0].title}** (skipped {len(dropped)}).")
+        if player.is_active():
+            player.voice_client.stop()   # the finished-track callback starts the new head
+        else:
+            player.kick()
+
+    @bot.tree.command(name="dedupe", description="Remove repeated songs from the queue.", guilds=guilds)
+    async def dedupe(interaction: discord.Interaction):
+        player = await editable_player(interaction)
+        if player is None:
+            return
+        removed = player.queue.dedupe(keep=player.current.video_id if player.current else None)
+        if removed:
+            player.queue_changed()
+        await interaction.response.send_message(f"Removed {removed} duplicate track(s).")
+
+    @bot.tree.command(name="shuffle", description="Shuffle the queue.", guilds=guilds)
+    async def shuffle(interaction: discord.Interaction):
+        player = await editable_player(interaction)
+        if player is None:
+            return
+        player.queue.shuffle()
+        player.queue_changed()
+        await interaction.response.send_message(f"Shuffled {len(player.queue)} tracks.")
+
+
     @bot.tree.command(
         name="playlist",
         description="Queue a Spotify playlist URL or a saved .txt file of queries.",
@@ -315,9 +1136,8 @@ def setup_music(bot: commands.Bot | discord.Bot) -> None:
         if voice_client.channel.id != voice_channel.id:
             await voice_client.move_to(voice_channel)
 
-        guild_id = str(interaction.guild_id)
-        if guild_id not in SONG_QUEUES:
-            SONG_QUEUES[guild_id] = deque()
+        player = get_player(interaction.guild_id)
+        player.attach(voice_client, interaction.channel)
 
         # Mode A: Spotify playlist URL
         if _is_spotify_playlist(source):
@@ -327,27 +1147,23 @@ def setup_music(bot: commands.Bot | discord.Bot) -> None:
             except Exception:
                 return await interaction.followup.send("Couldn't parse a playlist ID from that URL.", ephemeral=True)
 
-            items: list[tuple[str, str]] = []
-            # fetch first page
-            results = spotify.playlist_items(
-                playlist_id,
-                fields="items.track(name,artists(name)),next",
-                additional_types=["track"]
-            )
-            def _collect(page):
-                for it in page.get("items", []):
-                    t = it.get("track")
-                    if t and t.get("name"):
-                        artists = ", ".join(a["name"] for a in t.get("artists", []))
-                        items.append((t["name"], artists))
-
-            _collect(results)
-            # optional: follow pagination if you want full lists in the future
-            # next_url = results.get("next")
-            # while next_url:
-            #     page = spotify.next(results)
-            #     results = page
-            #     _collect(results)
+            def fetch_page(offset: int) -> dict:
+                return spotify.playlist_items(
+                    playlist_id,
+                    fields=SPOTIFY_FIELDS,
+                    additional_types=["track"],
+                    limit=SPOTIFY_PAGE_SIZE,
+                    offset=offset,
+                )
+
+            # first page only; it tells us the total and gets the first song going
+            try:
+                first_page = await asyncio.get_running_loop().run_in_executor(None, fetch_page, 0)
+            except spotipy.SpotifyException:
+                return await interaction.followup.send("Couldn't load that Spotify playlist.", ephemeral=True)
+
+            items = _page_tracks(first_page)
+            total = first_page.get("total") or len(items)
             if not items:
                 return await interaction.followup.send("No tracks found in that playlist.", ephemeral=True)
 
@@ -355,35 +1171,42 @@ def setup_music(bot: commands.Bot | discord.Bot) -> None:
                 random.shuffle(items)
 
             # Enqueue first immediately
-            first_name, first_artists = items.pop(0)
-            first_query = f"ytsearch1:{first_name} {first_artists}"
+            first_name, first_artists, first_ref = items.pop(0)
+            first_query = _build_query(f"{first_name} {first_artists}")
             try:
-                first_info = await _search_ytdlp(first_query)
-                first_entry = first_info["entries"][0] if "entries" in first_info else first_info
+                first_track = await _lookup(first_query, first_name, spotify=first_ref)
+                if first_track is None:
+                    raise LookupError(first_query)
             except Exception:
                 return await interaction.followup.send("Failed to enqueue the first track.", ephemeral=True)
 
-            SONG_QUEUES[guild_id].append((first_entry["url"], first_entry.get("title", first_name)))
+            player.queue.append(first_track)
 
-            if not (voice_client.is_playing() or voice_client.is_paused()):
-                await interaction.followup.send(f"Now playing: **{first_entry.get('title', first_name)}**")
-                await play_next_song(voice_client, guild_id, interaction.channel, post_now_playing=False)
+            if not player.is_active():
+                await interaction.followup.send(f"Now playing: **{first_track.title}**")
+                await player.play_next(post_now_playing=False)
             else:
-                await interaction.followup.send(f"Added **{first_entry.get('title', first_name)}** to the queue.")
-
-            async def enqueue_rest_spotify():
-                count = 1
-                for name, artists in items:
-                    q = f"ytsearch1:{name} {artists}"
-                    try:
-                        info = await _search_ytdlp(q)
-                        entry = info["entries"][0] if "entries" in info else info
-                    except Exception:
-                        continue
-                    SONG_QUEUES[guild_id].append((entry["url"], entry.get("title", name)))
-                    count += 1
-                await interaction.channel.send(f"Queued **{count}** tracks.")
-            asyncio.create_task(enqueue_rest_spotify())
+                await interaction.followup.send(f"Added **{first_track.title}** to the queue.")
+
+            def as_queries(tracks):
+                return [(_build_query(f"{name} {artists}"), name, ref) for name, artists, ref in tracks]
+
+            async def feed(loader: PlaylistLoader):
+                offsets = range(SPOTIFY_PAGE_SIZE, total, SPOTIFY_PAGE_SIZE)
+                if shuffle:
+                    # a fair shuffle needs the whole list; enumeration is quick and the first song is already playing
+                    rest = list(items)
+                    async for page in _spotify_pages(fetch_page, offsets):
+                        rest.extend(_page_tracks(page))
+                    random.shuffle(rest)
+                    loader.add(as_queries(rest))
+                    return
+                # in order: start resolving page one while the others are still downloading
+                loader.add(as_queries(items))
+                async for page in _spotify_pages(fetch_page, offsets):
+                    loader.add(as_queries(_page_tracks(page)))
+
+            asyncio.create_task(player.load_playlist(feed, expected=total - 1))
             return
 
         # Mode B: text filename playlist
@@ -404,63 +1227,62 @@ def setup_music(bot: commands.Bot | discord.Bot) -> None:
 
         # Enqueue first line immediately
         first_line = lines.pop(0)
-        if first_line.startswith("http://") or first_line.startswith("https://"):
-            first_query = first_line
-        else:
-            first_query = f"ytsearch1:{first_line}"
+        first_query = _build_query(first_line)
         try:
-            first_info = await _search_ytdlp(first_query)
-            first_entry = first_info["entries"][0] if "entries" in first_info else first_info
+            first_track = await _lookup(first_query, first_line)
+            if first_track is None:
+                raise LookupError(first_query)
         except Exception:
             return await interaction.followup.send("Failed to enqueue the first line from the file.", ephemeral=True)
 
-        SONG_QUEUES[guild_id].append((first_entry["url"], first_entry.get("title", first_line)))
+        player.queue.append(first_track)
 
-        if not (voice_client.is_playing() or voice_client.is_paused()):
-            await interaction.followup.send(f"Now playing: **{first_entry.get('title', first_line)}**")
-            await play_next_song(voice_client, guild_id, interaction.channel, post_now_playing=False)
+        if not player.is_active():
+            await interaction.followup.send(f"Now playing: **{first_track.title}**")
+            await player.play_next(post_now_playing=False)
         else:
-            await interaction.followup.send(f"Added **{first_entry.get('title', first_line)}** to the queue.")
-
-        async def enqueue_rest_file():
-            count = 1
-            for line in lines:
-                q = line if (line.startswith("http://") or line.startswith("https://")) else f"ytsearch1:{line}"
-                try:
-                    info = await _search_ytdlp(q)
-                    entry = info["entries"][0] if "entries" in info else info
-                except Exception:
-                    continue
-                SONG_QUEUES[guild_id].append((entry["url"], entry.get("title", line)))
-                count += 1
-            await interaction.channel.send(f"Queued **{count}** tracks.")
-        asyncio.create_task(enqueue_rest_file())
-
-
-    #-------------------------- helper functions --------------------------
-    async def play_next_song(voice_client, guild_id, channel, post_now_playing=True):
-        if SONG_QUEUES[guild_id]:
-            audio_url, title = SONG_QUEUES[guild_id].popleft()
-
-            ffmpeg_options = {
-                "before_options": "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5",
-                "options": '-vn -af "loudnorm=I=-16:TP=-1.5:LRA=11" -c:a libopus -b:a 96k',
-            }
-
-            source = discord.FFmpegOpusAudio(audio_url, **ffmpeg_options, executable= config.FFMPEG_PATH)
-
-            def after_play(error):
-                if error:
-                    print(f"Error playing {title}: {error}")
-                asyncio.run_coroutine_threadsafe(
-                    play_next_song(voice_client, guild_id, channel, post_now_playing=True),
-                    bot.loop
-                )
-
-            voice_client.play(source, after=after_play)
-
-            if post_now_playing:
-                asyncio.create_task(channel.send(f"Now playing: **{title}**"))
-
-
-
+            await interaction.followup.send(f"Added **{first_track.title}** to the queue.")
+
+        async def feed(loader: PlaylistLoader):
+            loader.add((_build_query(line), line, None) for line in lines)
+
+        asyncio.create_task(player.load_playlist(feed, expected=len(lines)))
+
+
+    #-------------------------- /musicstats --------------------------
+    @bot.tree.command(name="musicstats", description="Show music cache statistics.", guilds=guilds)
+    @app_commands.checks.has_permissions(administrator=True)
+    async def musicstats(interaction: discord.Interaction):
+        st = RESOLUTION_CACHE.stats()
+        au = AUDIO_CACHE.stats()
+        ld = LOUDNESS.stats()
+        ex = ytdl.SCHEDULER.stats()
+        sp = SPOTIFY_MATCHES.stats()
+        lines = [
+            "**Resolution cache**",
+            f"Entries: {st['entries']}/{st['max_entries']} ({st['queries']} query keys)",
+            f"Hits: {st['hits']} • Misses: {st['misses']} • Hit rate: {st['hit_rate']:.0%}",
+            f"URL refreshes: {st['refreshes']} • Evictions: {st['evictions']}",
+            "",
+            "**Spotify matches**",
+            f"Tracks: {sp['tracks']} • ISRCs: {sp['isrcs']} • Hit rate: {sp['hit_rate']:.0%} "
+            f"({sp['hits']}/{sp['hits'] + sp['misses']}) • Invalidated: {sp['invalidations']}",
+            "",
+            "**Audio cache**",
+            f"Files: {au['files']} • Size: {au['bytes'] / 2**20:.1f}/{au['max_bytes'] / 2**20:.0f} MiB",
+            f"Hits: {au['hits']} • Misses: {au['misses']} • Hit rate: {au['hit_rate']:.0%}",
+            f"Fills: {au['fills']} ({au['filling']} running, {au['fill_failures']} failed) • Evictions: {au['evictions']}",
+            "",
+            "**Loudness**",
+            f"Measured: {ld['measured']} • Analyzed this run: {ld['analyzed']} ({ld['pending']} pending, {ld['failures']} failed)",
+            "",
+            "**yt-dlp workers**",
+            f"Processes: {ex['workers']} • Running: {ex['in_flight']} • Queued: {ex['queued_interactive']} interactive, "
+            f"{ex['queued_background']} background • Done: {ex['completed']}",
+            "",
+            f"**yt-dlp clients** (last {ytdl.HEALTH_WINDOW} attempts each, {ytdl.HEALTH.probes} probes)",
+        ]
+        for c in ytdl.HEALTH.stats():
+            latency = "n/a" if c["latency"] == float("inf") else f"{c['latency'] * 1000:.0f} ms"
+            lines.append(f"`{c['client']}`: {c['success_rate']:.0%} ok over {c['attempts']} • avg {latency}")
+        await interaction.response.send_message("\n".join(lines), ephemeral=True)
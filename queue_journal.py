@@ -0,0 +1,137 @@
+from __future__ import annotations
+import json, os
+from typing import Dict, List, Optional
+
+QUEUES_DIR = os.path.join("data", "queues")
+COMPACT_AFTER = 1000   # records appended since the last snapshot before we consider compacting
+
+
+def _empty_state() -> dict:
+    # resume: seconds into tracks[0] to start from, when it was cut off by a restart and not replayed yet
+    return {"tracks": [], "current": None, "position": 0.0, "resume": 0.0, "voice": None, "text": None}
+
+
+def _apply(state: dict, rec: dict) -> None:
+    op = rec["op"]
+    tracks: List[dict] = state["tracks"]
+    head = tracks[0] if tracks else None
+    if op == "snapshot":
+        state.update({k: rec[k] for k in _empty_state() if k in rec})
+    elif op == "append":
+        tracks.append(rec["t"])
+    elif op == "insert":
+        tracks.insert(rec["i"], rec["t"])
+    elif op == "pop":
+        del tracks[rec["i"]]
+    elif op == "move":
+        tracks.insert(rec["dst"], tracks.pop(rec["src"]))
+    elif op == "jump":
+        del tracks[:rec["i"]]
+    elif op == "reset":
+        state["tracks"] = list(rec["tracks"])
+    elif op == "play":
+        state["current"], state["position"] = rec["t"], rec.get("start", 0.0)
+    elif op == "pos":
+        state["position"] = rec["s"]
+    elif op == "idle":
+        state["current"], state["position"] = None, 0.0
+    elif op == "where":
+        state["voice"], state["text"] = rec["voice"], rec["text"]
+    if op != "snapshot" and not (state["tracks"] and state["tracks"][0] is head):
+        state["resume"] = 0.0   # a different track is at the head now
+
+
+def replay(path: str) -> dict:
+    """
+    Rebuild a guild's queue state from its journal. A torn last line (the process died mid-write)
+    ends the replay there; everything before it is kept.
+    """
+    state = _empty_state()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                print(f"[journal] {path}: stopping at a damaged record")
+                break
+            try:
+                _apply(state, rec)
+            except (KeyError, IndexError) as e:
+                print(f"[journal] {path}: skipping bad {rec.get('op')!r} record: {type(e).__name__}: {e}")
+    return state
+
+
+def load_journals(directory: str = QUEUES_DIR) -> Dict[int, dict]:
+    """guild id -> replayed state for every journal on disk."""
+    out: Dict[int, dict] = {}
+    if not os.path.isdir(directory):
+        return out
+    for entry in os.scandir(directory):
+        name, ext = os.path.splitext(entry.name)
+        if ext != ".jsonl" or not name.isdigit():
+            continue
+        try:
+            out[int(name)] = replay(entry.path)
+        except OSError as e:
+            print(f"[journal] Could not read {entry.path}: {type(e).__name__}: {e}")
+    return out
+
+
+class QueueJournal:
+    """
+    Append-only log of one guild's queue edits and playback position, in data/queues/<guild>.jsonl.
+
+    Every record is written and flushed as it happens, so a crash loses at most the line being
+    written. Once enough records pile up the file is rewritten as a single snapshot (tmp file +
+    os.replace, so a crash mid-compaction leaves the old journal intact).
+    """
+
+    def __init__(self, guild_id: int, directory: str = QUEUES_DIR):
+        self.path = os.path.join(directory, f"{guild_id}.jsonl")
+        self._file = None
+        self.records = 0   # since the last snapshot
+
+    def write(self, op: str, **fields) -> None:
+        try:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps({"op": op, **fields}, separators=(",", ":")) + "\n")
+            self._file.flush()
+            self.records += 1
+        except OSError as e:
+            print(f"[journal] write to {self.path} failed: {type(e).__name__}: {e}")
+
+    def needs_compaction(self, queue_len: int) -> bool:
+        return self.records > max(COMPACT_AFTER, 2 * queue_len)
+
+    def compact(self, tracks: List[dict], current: Optional[dict], position: float,
+                voice: Optional[int], text: Optional[int], resume: float = 0.0) -> None:
+        self.close()
+        tmp = self.path + ".tmp"
+        snapshot = {"op": "snapshot", "tracks": tracks, "current": current, "position": position,
+                    "resume": resume, "voice": voice, "text": text}
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(json.dumps(snapshot, separators=(",", ":")) + "\n")
+            os.replace(tmp, self.path)
+            self.records = 0
+        except OSError as e:
+            print(f"[journal] compaction of {self.path} failed: {type(e).__name__}: {e}")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self) -> None:
+        """The queue was cleared on purpose; nothing to restore next time."""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"[journal] Could not remove {self.path}: {type(e).__name__}: {e}")
+        self.records = 0
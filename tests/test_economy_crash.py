@@ -0,0 +1,125 @@
+"""
+Crash recovery of the write-behind economy cache.
+
+A child process plays blackjack rounds against CachedEconomyStore over SQLite and is
+SIGKILLed mid-run. The database is then reopened: it must hold the state after some whole
+number of rounds (never a debit without its settle, never one user's row ahead of the other's),
+and that round must have finished no more than the flush interval before the kill.
+
+    python -m pytest tests        or        python tests/test_economy_crash.py
+"""
+from __future__ import annotations
+import asyncio, os, signal, sqlite3, subprocess, sys, tempfile, time, types, unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FLUSH_INTERVAL = 0.3   # seconds; short so the test runs quickly, the guarantee is the same at 5
+SLACK = 0.3            # scheduling and process start-up noise on a busy machine
+USERS = (1, 2)
+BET = 10
+
+
+def _expected(rounds: int) -> dict:
+    """Each user's row after `rounds` rounds of _play_round, from a fresh economy."""
+    rows = {uid: {"balance": 500, "wins": 0, "losses": 0, "pushes": 0, "hands": 0} for uid in USERS}
+    for n in range(rounds):
+        for uid in USERS:
+            row = rows[uid]
+            outcome = ("wins", "losses", "pushes")[(n + uid) % 3]
+            row["balance"] += {"wins": BET, "losses": -BET, "pushes": 0}[outcome]
+            row[outcome] += 1
+            row["hands"] += 1
+    return rows
+
+
+async def _play_round(store, n: int):
+    # the same store calls /blackjack makes: take the bet, then settle payout and stats at once
+    for uid in USERS:
+        outcome = ("wins", "losses", "pushes")[(n + uid) % 3]
+        assert await store.debit(uid, BET) is not None
+        await store.settle(uid, {"wins": 2 * BET, "losses": 0, "pushes": BET}[outcome], **{outcome: 1},
+                           biggest_win=BET if outcome == "wins" else 0)
+
+
+def _child(db_path: str, rounds: int):
+    """Play rounds forever (or `rounds` of them, then exit cleanly), printing each one's finish time."""
+    sys.path.insert(0, ROOT)
+    sys.modules.setdefault("config", types.ModuleType("config"))
+    import economy_store as E
+
+    async def main():
+        E._STORE = E.CachedEconomyStore(E.SqliteEconomyStore(db_path, db_path + ".json"),
+                                        flush_interval=FLUSH_INTERVAL, flush_rows=10 ** 9)
+        n = 0
+        while not rounds or n < rounds:
+            await _play_round(E._STORE, n)
+            n += 1
+            print(n, time.monotonic(), flush=True)
+            await asyncio.sleep(0.002)
+
+    import atexit
+    atexit.register(E.close_store)
+    asyncio.run(main())
+
+
+class EconomyCrashTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory(prefix="econ-crash-")
+        self.db = os.path.join(self.tmp.name, "economy.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _spawn(self, rounds: int = 0) -> subprocess.Popen:
+        return subprocess.Popen([sys.executable, os.path.abspath(__file__), "--child", self.db, str(rounds)],
+                                stdout=subprocess.PIPE, text=True)
+
+    def _persisted(self) -> dict:
+        db = sqlite3.connect(self.db)
+        try:
+            cur = db.execute("SELECT user_id, balance, wins, losses, pushes, hands FROM users")
+            return {uid: dict(zip(("balance", "wins", "losses", "pushes", "hands"), rest)) for uid, *rest in cur}
+        finally:
+            db.close()
+
+    def _rounds_in(self, rows: dict) -> int:
+        """How many whole rounds `rows` is the state after; fails if it is not a round boundary."""
+        if not rows:
+            return 0
+        rounds = rows[USERS[0]]["hands"]
+        self.assertEqual(rows, _expected(rounds), f"database is not the state after {rounds} whole rounds")
+        return rounds
+
+    @unittest.skipIf(sys.platform == "win32", "needs SIGKILL")
+    def test_kill_loses_at_most_one_flush_interval(self):
+        for run_for in (0.7, 1.1, 1.6):
+            with self.subTest(run_for=run_for):
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(self.db + suffix):
+                        os.remove(self.db + suffix)   # every run starts from a fresh economy
+                child = self._spawn()
+                time.sleep(run_for)
+                child.send_signal(signal.SIGKILL)
+                finished = {int(n): float(t) for n, t in (line.split() for line in child.stdout.read().splitlines())}
+                child.wait()
+                child.stdout.close()
+                self.assertTrue(finished, "child played no rounds before the kill")
+
+                saved = self._rounds_in(self._persisted())
+                last = max(finished)
+                saved_at = finished.get(saved, finished[min(finished)])   # nothing saved: lost since round 1
+                lost = finished[last] - saved_at
+                self.assertLessEqual(lost, FLUSH_INTERVAL + SLACK,
+                                     f"kept {saved} of {last} rounds: lost {lost:.2f}s of play")
+
+    def test_clean_exit_keeps_everything(self):
+        child = self._spawn(rounds=200)
+        child.communicate(timeout=60)
+        self.assertEqual(child.returncode, 0)
+        self.assertEqual(self._rounds_in(self._persisted()), 200)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        _child(sys.argv[2], int(sys.argv[3]))
+    else:
+        unittest.main()
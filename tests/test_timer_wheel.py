@@ -0,0 +1,66 @@
+"""
+TimerWheel wakes once per expiry, not once per tick.
+
+A timer many ticks out must be served by a single sleep, and a sooner timer scheduled while
+the task is asleep must still fire on time rather than waiting for the later one.
+
+    python -m pytest tests        or        python tests/test_timer_wheel.py
+"""
+from __future__ import annotations
+import asyncio, os, sys, time, unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timer_wheel import TimerWheel
+
+TICK = 0.01
+
+
+class TimerWheelTest(unittest.TestCase):
+    def test_long_timer_is_one_wakeup(self):
+        async def run():
+            wheel = TimerWheel(tick=TICK)
+            fired = asyncio.Event()
+            start = time.monotonic()
+            wheel.schedule("far", 100 * TICK, fired.set)
+            await asyncio.wait_for(fired.wait(), 5)
+            self.assertGreaterEqual(time.monotonic() - start, 100 * TICK)
+            self.assertEqual(wheel.wakeups, 1)
+            self.assertEqual(wheel.fired, 1)
+
+        asyncio.run(run())
+
+    def test_sooner_timer_interrupts_the_sleep(self):
+        async def run():
+            wheel = TimerWheel(tick=TICK)
+            order = []
+            wheel.schedule("late", 100 * TICK, lambda: order.append(("late", time.monotonic())))
+            await asyncio.sleep(5 * TICK)
+            start = time.monotonic()
+            wheel.schedule("soon", 5 * TICK, lambda: order.append(("soon", time.monotonic())))
+            while len(order) < 2:
+                await asyncio.sleep(TICK)
+            self.assertEqual([key for key, _ in order], ["soon", "late"])
+            self.assertLess(order[0][1] - start, 50 * TICK)
+
+        asyncio.run(run())
+
+    def test_moved_and_cancelled_timers_do_not_fire(self):
+        async def run():
+            wheel = TimerWheel(tick=TICK)
+            fired = []
+            wheel.schedule("a", 3 * TICK, lambda: fired.append("a-old"))
+            wheel.schedule("a", 6 * TICK, lambda: fired.append("a"))
+            wheel.schedule("b", 3 * TICK, lambda: fired.append("b"))
+            wheel.cancel("b")
+            wheel.schedule("c", 3 * TICK, lambda: wheel.cancel("d"))
+            wheel.schedule("d", 3 * TICK, lambda: fired.append("d"))
+            await asyncio.sleep(20 * TICK)
+            self.assertEqual(fired, ["a"])
+            self.assertEqual(len(wheel), 0)
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    unittest.main()
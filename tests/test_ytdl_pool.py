@@ -0,0 +1,67 @@
+"""
+Recovery of the yt-dlp worker pool when a worker process dies.
+
+Several extractions are in flight when one worker is SIGKILLed. That breaks the whole pool, so
+every dispatcher that had a job on it sees BrokenProcessPool. Exactly one replacement pool must
+be started, and the broken one shut down, rather than one new pool per failed job.
+
+    python -m pytest tests        or        python tests/test_ytdl_pool.py
+"""
+from __future__ import annotations
+import asyncio, os, signal, sys, time, unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ytdl
+
+WORKERS = 3
+
+
+def _hang(query, flat, clients):
+    """Stands in for run_extraction: a lookup that is still running when the worker is killed."""
+    time.sleep(60)
+
+
+class PoolRestartTest(unittest.TestCase):
+    @unittest.skipIf(sys.platform == "win32", "needs SIGKILL")
+    def test_one_new_pool_when_a_worker_dies(self):
+        asyncio.run(self._run())
+
+    async def _run(self):
+        real_extraction = ytdl.run_extraction
+        ytdl.run_extraction = _hang   # the dispatchers look it up at call time; workers unpickle this one
+        scheduler = ytdl.ExtractionScheduler(WORKERS)
+        first = scheduler._pool
+        pools = []
+        new_pool = scheduler._new_pool
+
+        def counting_new_pool():
+            pools.append(new_pool())
+            return pools[-1]
+
+        scheduler._new_pool = counting_new_pool
+        try:
+            futures = [scheduler.submit(f"query {i}", False, ytdl.INTERACTIVE) for i in range(WORKERS)]
+            deadline = time.monotonic() + 30
+            while scheduler.in_flight < WORKERS:
+                self.assertLess(time.monotonic(), deadline, "jobs never reached the pool")
+                await asyncio.sleep(0.05)
+            await asyncio.sleep(0.5)   # let the workers pick them up
+
+            os.kill(next(iter(first._processes)), signal.SIGKILL)
+            results = await asyncio.wait_for(asyncio.gather(*futures, return_exceptions=True), 30)
+
+            self.assertTrue(all(isinstance(r, ytdl.ExtractionError) for r in results), results)
+            self.assertEqual(len(pools), 1, "each failed job started its own pool")
+            self.assertEqual(scheduler.restarts, 1)
+            self.assertIs(scheduler._pool, pools[0])
+            self.assertTrue(first._shutdown_thread, "the broken pool was never shut down")
+        finally:
+            ytdl.run_extraction = real_extraction
+            for task in scheduler._dispatchers:
+                task.cancel()
+            scheduler._pool.shutdown(wait=True, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+from __future__ import annotations
+import asyncio, heapq, itertools, math, time
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class TimerWheel:
+    """
+    Keyed one-shot timers served by a single asyncio task, however many are pending.
+
+    Deadlines are rounded up to whole ticks and kept in a heap ordered by due tick. The task
+    sleeps straight to the earliest one, so a timer costs one wakeup however far out it is,
+    not one per tick. Cancelling and rescheduling only touch the key's dict entry; the heap
+    entry it leaves behind is skipped when it surfaces. The task only runs while something
+    is scheduled.
+
+    Callbacks are plain functions run on the event loop; start a task from them for async work.
+    """
+
+    def __init__(self, tick: float = 1.0, name: str = "timers"):
+        self.tick = tick
+        self.name = name
+        self._heap: List[Tuple[int, int, Hashable]] = []   # (due tick, seq, key), stale ones included
+        self._timers: Dict[Hashable, Tuple[int, int, Callable[[], None]]] = {}   # key -> (due tick, seq, callback)
+        self._seq = itertools.count()
+        self._origin = time.monotonic()
+        self._done = 0   # last tick processed
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None   # made with each run task, so it's on that task's loop
+        self._sleeping_until: Optional[int] = None   # tick the task is asleep until
+        self.fired = 0
+        self.wakeups = 0
+
+    def _tick_now(self) -> int:
+        return int((time.monotonic() - self._origin) / self.tick)
+
+    def schedule(self, key: Hashable, delay: float, callback: Callable[[], None], replace: bool = True) -> None:
+        """
+        Run `callback` about `delay` seconds from now (never early, at most one tick late).
+        An existing timer for `key` is moved unless `replace` is False, in which case it's kept.
+        """
+        if key in self._timers:
+            if not replace:
+                return
+            self.cancel(key)
+        if self._task is None or self._task.done():
+            self._done = self._tick_now()   # nothing was pending; skip the empty ticks since
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        due = max(self._tick_now(), self._done) + max(1, math.ceil(delay / self.tick))
+        seq = next(self._seq)
+        self._timers[key] = (due, seq, callback)
+        heapq.heappush(self._heap, (due, seq, key))
+        if len(self._heap) > 2 * len(self._timers) + 64:
+            self._compact()
+        if self._sleeping_until is not None and due < self._sleeping_until:
+            self._wake.set()   # sooner than what the task is waiting for
+
+    def cancel(self, key: Hashable) -> bool:
+        return self._timers.pop(key, None) is not None
+
+    def pending(self, key: Hashable) -> bool:
+        return key in self._timers
+
+    def remaining(self, key: Hashable) -> Optional[float]:
+        """Seconds until `key` fires, or None if it isn't scheduled."""
+        entry = self._timers.get(key)
+        if entry is None:
+            return None
+        return max(0.0, self._origin + entry[0] * self.tick - time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def _live(self, entry: Tuple[int, int, Hashable]) -> bool:
+        timer = self._timers.get(entry[2])
+        return timer is not None and timer[1] == entry[1]
+
+    def _compact(self):
+        """Drop the heap entries left behind by cancelled and rescheduled timers."""
+        self._heap = [entry for entry in self._heap if self._live(entry)]
+        heapq.heapify(self._heap)
+
+    async def _run(self):
+        try:
+            while self._timers:
+                while not self._live(self._heap[0]):
+                    heapq.heappop(self._heap)
+                self._sleeping_until = self._heap[0][0]
+                self._wake.clear()
+                delay = self._origin + self._sleeping_until * self.tick - time.monotonic()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                self._sleeping_until = None
+                self.wakeups += 1
+                self._done = max(self._done, self._tick_now())
+                self._fire(self._done)
+        finally:
+            self._sleeping_until = None
+
+    def _fire(self, tick: int):
+        due_now = []
+        while self._heap and self._heap[0][0] <= tick:
+            entry = heapq.heappop(self._heap)
+            if self._live(entry):
+                due_now.append(entry)
+        for entry in due_now:
+            if not self._live(entry):
+                continue   # cancelled or moved by an earlier callback in this batch
+            key = entry[2]
+            _, _, callback = self._timers.pop(key)
+            self.fired += 1
+            try:
+                callback()
+            except Exception as e:
+                print(f"[{self.name}] timer {key!r} failed: {type(e).__name__}: {e}")
@@ -0,0 +1,321 @@
+from __future__ import annotations
+import asyncio, atexit, json, os, time
+from collections import OrderedDict
+from typing import Dict, Optional
+from urllib.parse import urlparse, parse_qs
+
+DATA_DIR = "data"
+CACHE_FILE = os.path.join(DATA_DIR, "track_cache.json")
+SPOTIFY_FILE = os.path.join(DATA_DIR, "spotify_matches.json")
+
+DEFAULT_URL_TTL = 3 * 3600     # used when a stream URL carries no expiry of its own
+EXPIRY_MARGIN = 10 * 60        # treat URLs as dead a bit early so a song doesn't die mid-play
+SAVE_INTERVAL = 30             # seconds between disk writes, and the longest a change waits for one
+
+
+def normalize_query(query: str) -> str:
+    """Cache key for a yt-dlp query. URLs are case-sensitive (video ids), searches are not."""
+    q = query.strip()
+    if q.startswith(("http://", "https://")):
+        return q
+    return " ".join(q.casefold().split())
+
+
+def url_expiry(url: str) -> float:
+    """Unix time a signed googlevideo URL stops working, read from its `expire` parameter."""
+    try:
+        parsed = urlparse(url)
+        qs = parse_qs(parsed.query)
+        if "expire" in qs:
+            return float(qs["expire"][0])
+        # manifest style URLs put it in the path: .../expire/1700000000/...
+        parts = parsed.path.split("/")
+        if "expire" in parts:
+            return float(parts[parts.index("expire") + 1])
+    except (ValueError, IndexError):
+        pass
+    return time.time() + DEFAULT_URL_TTL
+
+
+def source_page(query: Optional[str], info: dict) -> Optional[str]:
+    """
+    Page to re-extract a non-YouTube result from (its webpage_url, else the URL it was looked up
+    by). None for YouTube, whose streams are re-extracted from the watch page of the id.
+    """
+    extractor = (info.get("extractor_key") or info.get("ie_key") or "").lower()
+    if not extractor or extractor.startswith("youtube"):
+        return None
+    if info.get("webpage_url"):
+        return info["webpage_url"]
+    return query if query and query.startswith(("http://", "https://")) else None
+
+
+def _read_json(path: str, tag: str) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"[{tag}] Could not read {path}: {type(e).__name__}: {e}")
+        return None
+
+def _write_json(path: str, data: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class _SavedCache:
+    """
+    Write-behind for the JSON-backed caches. Changes are written at most once per SAVE_INTERVAL;
+    one made during a quiet spell is written when the interval is up rather than waiting for
+    the next change, and whatever is still unwritten goes out at exit.
+    """
+
+    path: str
+
+    def _init_saving(self):
+        self._dirty = False
+        self._last_save = 0.0
+        self._save_timer: Optional[asyncio.TimerHandle] = None
+        atexit.register(self.save)
+
+    def _mark_dirty(self):
+        self._dirty = True
+        wait = SAVE_INTERVAL - (time.monotonic() - self._last_save)
+        if wait <= 0:
+            self.save()
+        elif self._save_timer is None:
+            try:
+                self._save_timer = asyncio.get_running_loop().call_later(wait, self.save)
+            except RuntimeError:
+                pass   # no event loop (scripts); the save at exit covers it
+
+    def save(self) -> None:
+        if self._save_timer is not None:
+            self._save_timer.cancel()
+            self._save_timer = None
+        self._last_save = time.monotonic()
+        if not self._dirty:
+            return
+        self._write()
+        self._dirty = False
+
+    def _write(self) -> None:
+        raise NotImplementedError
+
+
+class ResolutionCache(_SavedCache):
+    """
+    LRU cache of yt-dlp lookups, persisted to disk.
+
+    Two tables:
+      queries: normalized query -> video id
+      tracks:  video id -> {"id", "title", "duration", "url", "expires", "page"}
+    so several queries that land on the same video share one stream URL, and an expired
+    URL can be refreshed from the video id alone without repeating the search. "page" is set
+    for videos from other sites (SoundCloud, Bandcamp, ...), whose ids mean nothing to YouTube:
+    it is the page their stream is re-extracted from.
+    """
+
+    def __init__(self, path: str = CACHE_FILE, max_entries: int = 2000):
+        self.path = path
+        self.max_entries = max_entries
+        self._queries: OrderedDict[str, str] = OrderedDict()
+        self._tracks: OrderedDict[str, dict] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.evictions = 0
+        self._init_saving()
+        self.load()
+
+    # ----------------------------- lookups -----------------------------
+    def lookup(self, query: str) -> Optional[dict]:
+        """Cached track for a query (its URL may be stale, see is_fresh). Counts a hit or miss."""
+        key = normalize_query(query)
+        vid = self._queries.get(key)
+        track = self._tracks.get(vid) if vid else None
+        if track is None:
+            self.misses += 1
+            return None
+        self._queries.move_to_end(key)
+        self._tracks.move_to_end(vid)
+        self.hits += 1
+        return track
+
+    def get(self, video_id: str) -> Optional[dict]:
+        return self._tracks.get(video_id)
+
+    @staticmethod
+    def is_fresh(track: dict) -> bool:
+        return bool(track.get("url")) and track.get("expires", 0) - EXPIRY_MARGIN > time.time()
+
+    # ----------------------------- updates -----------------------------
+    def store(self, query: Optional[str], info: dict) -> dict:
+        """
+        Record a yt-dlp info dict (optionally under a query) and return the slim cached track.
+        Pass url=None in `info` for metadata-only results; an existing stream URL is kept.
+        """
+        vid = info.get("id")
+        url = info.get("url")
+        track = {
+            "id": vid,
+            "title": info.get("title"),
+            "duration": info.get("duration"),
+            "url": url,
+            "expires": url_expiry(url) if url else 0,
+            "page": source_page(query, info),
+        }
+        if not vid:
+            # nothing stable to key on (some direct links); hand it back uncached
+            return track
+
+        existing = self._tracks.get(vid)
+        if existing is not None:
+            if url:
+                self.refreshes += 1
+            else:
+                # metadata-only update (flat search); keep the stream URL we already have
+                track["url"] = existing.get("url")
+                track["expires"] = existing.get("expires", 0)
+            track["title"] = track["title"] or existing.get("title")
+            track["duration"] = track["duration"] or existing.get("duration")
+            track["page"] = track["page"] or existing.get("page")
+        self._tracks[vid] = track
+        self._tracks.move_to_end(vid)
+        if query is not None:
+            key = normalize_query(query)
+            self._queries[key] = vid
+            self._queries.move_to_end(key)
+        self._evict()
+        self._mark_dirty()
+        return track
+
+    def invalidate(self, video_id: str) -> None:
+        track = self._tracks.get(video_id)
+        if track is not None:
+            track["url"] = None
+            track["expires"] = 0
+            self._mark_dirty()
+
+    def forget(self, video_id: str) -> None:
+        """Drop a video that turned out to be unplayable, so queries that led to it search again."""
+        keys = [k for k, v in self._queries.items() if v == video_id]
+        for key in keys:
+            del self._queries[key]
+        if self._tracks.pop(video_id, None) is not None or keys:
+            self._mark_dirty()
+
+    def _evict(self):
+        evicted = set()
+        while len(self._tracks) > self.max_entries:
+            evicted.add(self._tracks.popitem(last=False)[0])
+            self.evictions += 1
+        if evicted:
+            # query keys that led to an evicted track could only ever miss; they go with it
+            for key in [k for k, v in self._queries.items() if v in evicted]:
+                del self._queries[key]
+        while len(self._queries) > self.max_entries:
+            self._queries.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._tracks),
+            "queries": len(self._queries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "refreshes": self.refreshes,
+            "evictions": self.evictions,
+        }
+
+    # ----------------------------- persistence -----------------------------
+    def load(self) -> None:
+        data = _read_json(self.path, "cache")
+        if data is None:
+            return
+        self._tracks = OrderedDict(data.get("tracks", {}))
+        # files written before evictions cleaned up after themselves can hold keys for missing tracks
+        self._queries = OrderedDict((k, v) for k, v in data.get("queries", {}).items() if v in self._tracks)
+        self._evict()
+        print(f"[cache] Loaded {len(self._tracks)} track(s), {len(self._queries)} query key(s).")
+
+    def _write(self) -> None:
+        _write_json(self.path, {"queries": self._queries, "tracks": self._tracks})
+
+
+class SpotifyMatchCache(_SavedCache):
+    """
+    Which YouTube video we picked for a Spotify track, keyed by Spotify track id and by ISRC
+    (the same recording often has several Spotify ids across albums and compilations).
+
+    Entries hold {"id", "title", "duration"}, enough to queue a Track without any network call.
+    Persisted to disk; a mapping is dropped when its video turns out to be unavailable.
+    """
+
+    def __init__(self, path: str = SPOTIFY_FILE):
+        self.path = path
+        self._by_track: Dict[str, dict] = {}
+        self._by_isrc: Dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._init_saving()
+        data = _read_json(path, "spotify")
+        if data:
+            self._by_track = data.get("tracks", {})
+            self._by_isrc = data.get("isrc", {})
+
+    def get(self, spotify_id: Optional[str], isrc: Optional[str] = None) -> Optional[dict]:
+        match = (spotify_id and self._by_track.get(spotify_id)) or (isrc and self._by_isrc.get(isrc))
+        if match:
+            self.hits += 1
+            if spotify_id and spotify_id not in self._by_track:
+                self._by_track[spotify_id] = match   # found via ISRC; remember the id too
+                self._mark_dirty()
+            return match
+        self.misses += 1
+        return None
+
+    def put(self, spotify_id: Optional[str], isrc: Optional[str], video_id: str, title: Optional[str],
+            duration: Optional[int]) -> None:
+        match = {"id": video_id, "title": title, "duration": duration}
+        changed = False
+        for table, key in ((self._by_track, spotify_id), (self._by_isrc, isrc)):
+            if key and table.get(key) != match:
+                table[key] = match
+                changed = True
+        if changed:
+            self._mark_dirty()
+
+    def invalidate(self, video_id: str) -> int:
+        """Forget every Spotify track mapped to a video. Returns how many mappings were dropped."""
+        dropped = 0
+        for table in (self._by_track, self._by_isrc):
+            for key in [k for k, m in table.items() if m["id"] == video_id]:
+                del table[key]
+                dropped += 1
+        if dropped:
+            self.invalidations += 1
+            self._mark_dirty()
+        return dropped
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "tracks": len(self._by_track),
+            "isrcs": len(self._by_isrc),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+    def _write(self) -> None:
+        _write_json(self.path, {"tracks": self._by_track, "isrc": self._by_isrc})
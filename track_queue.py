@@ -0,0 +1,333 @@
+from __future__ import annotations
+import random
+from collections import Counter
+from itertools import chain
+from operator import attrgetter
+from typing import Callable, Iterable, Iterator, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from music import Track
+
+CHUNK = 256   # target tracks per chunk; chunks split at twice this
+
+
+class TrackQueue:
+    """
+    Indexable queue of Tracks for queues far too long to shuffle around in a deque.
+
+    Tracks live in a list of chunks of at most 2*CHUNK entries, with a Fenwick tree over the chunk
+    lengths. Finding position i walks the tree in O(log n) and then indexes one short list, so
+    remove, insert, move and reading any position stay cheap at tens of thousands of entries.
+    jump() slices whole chunks off the front; dedupe() keeps every chunk it removes nothing from;
+    shuffle() rebuilds the chunks in one pass.
+
+    A count per video id is kept alongside, so dedupe() returns immediately when there's nothing
+    to do, and so are the running totals shown by /queue. Tracks dropped by jump() are only taken
+    out of those when they're next read. `version` changes on every edit, so anything rendered
+    from the queue can be cached until it moves, and `on_change` (if set) is called with every
+    edit as (op, *args) so it can be journaled. Supports the deque operations the player uses:
+    append, appendleft, popleft, len, iter and indexing.
+    """
+
+    def __init__(self, tracks: Iterable["Track"] = (), chunk: int = CHUNK):
+        self._load = max(1, chunk)
+        self._chunks: List[List["Track"]] = []
+        self._tree: List[int] = [0]   # 1-based Fenwick tree over len(chunk)
+        self._len = 0
+        self._ids: Counter[str] = Counter()
+        self._dupes = 0   # entries whose video id already appears earlier in the counter
+        self._seconds = 0   # over tracks whose duration is known
+        self._unknown = 0
+        self._unsettled: List[List["Track"]] = []   # dropped by jump(), still in the counts above
+        self.version = 0
+        self.on_change: Optional[Callable[..., None]] = None
+        self._reset(list(tracks))
+
+    # ----------------------------- index -----------------------------
+    def _rebuild_tree(self):
+        m = len(self._chunks)
+        tree = [0] * (m + 1)
+        for i, chunk in enumerate(self._chunks, 1):
+            tree[i] += len(chunk)
+            parent = i + (i & -i)
+            if parent <= m:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _bump(self, ci: int, delta: int):
+        i, m = ci + 1, len(self._chunks)
+        while i <= m:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _locate(self, index: int) -> tuple[int, int]:
+        """(chunk number, offset in chunk) of a position already known to be in range."""
+        tree, m = self._tree, len(self._chunks)
+        pos, rem = 0, index
+        step = 1 << (m.bit_length() - 1) if m else 0
+        while step:
+            nxt = pos + step
+            if nxt <= m and tree[nxt] <= rem:
+                pos = nxt
+                rem -= tree[nxt]
+            step >>= 1
+        return pos, rem
+
+    def _position(self, index: int) -> int:
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("queue index out of range")
+        return index
+
+    def _reset(self, tracks: List["Track"]):
+        load = self._load
+        self._chunks = [tracks[i:i + load] for i in range(0, len(tracks), load)]
+        self._len = len(tracks)
+        self._set_ids(Counter(t.video_id for t in tracks if t.video_id))
+        self._seconds = sum(t.duration for t in tracks if t.duration)
+        self._unknown = sum(1 for t in tracks if not t.duration)
+        self._unsettled = []
+        self.version += 1
+        self._rebuild_tree()
+
+    def _set_ids(self, ids: Counter):
+        self._ids = ids
+        self._dupes = sum(ids.values()) - len(ids)
+
+    def _settle(self):
+        """Take the tracks jump() dropped out of the id counts and running totals."""
+        if not self._unsettled:
+            return
+        dropped = list(chain.from_iterable(self._unsettled))
+        self._unsettled = []
+        ids = self._ids
+        for vid, n in Counter(filter(None, map(attrgetter("video_id"), dropped))).items():
+            left = ids[vid] - n
+            if left:
+                ids[vid] = left
+            else:
+                del ids[vid]
+        self._set_ids(ids)
+        self._subtract_durations(dropped)
+
+    def _subtract_durations(self, tracks: List["Track"]):
+        known = list(filter(None, map(attrgetter("duration"), tracks)))
+        self._seconds -= sum(known)
+        self._unknown -= len(tracks) - len(known)
+
+    @property
+    def total_duration(self) -> int:
+        """Seconds, over tracks whose duration is known."""
+        self._settle()
+        return self._seconds
+
+    @property
+    def unknown_durations(self) -> int:
+        self._settle()
+        return self._unknown
+
+    def _emit(self, op: str, *args):
+        if self.on_change is not None:
+            self.on_change(op, *args)
+
+    def _note(self, track: "Track"):
+        # with jump()s unsettled the counts run high, so _dupes may drift until _settle recomputes it
+        self.version += 1
+        if track.duration:
+            self._seconds += track.duration
+        else:
+            self._unknown += 1
+        if track.video_id:
+            if self._ids[track.video_id]:
+                self._dupes += 1
+            self._ids[track.video_id] += 1
+
+    def _forget(self, track: "Track"):
+        self.version += 1
+        if track.duration:
+            self._seconds -= track.duration
+        else:
+            self._unknown -= 1
+        vid = track.video_id
+        if vid:
+            self._ids[vid] -= 1
+            if self._ids[vid]:
+                self._dupes -= 1
+            else:
+                del self._ids[vid]
+
+    # ----------------------------- deque-style -----------------------------
+    def __len__(self) -> int:
+        return self._len
+
+    def __bool__(self) -> bool:
+        return self._len > 0
+
+    def __iter__(self) -> Iterator["Track"]:
+        for chunk in self._chunks:
+            yield from chunk
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.slice(*index.indices(self._len)[:2])
+        ci, off = self._locate(self._position(index))
+        return self._chunks[ci][off]
+
+    def slice(self, start: int, stop: int) -> List["Track"]:
+        """Tracks at positions [start, stop), found without walking the chunks before `start`."""
+        start, stop = max(0, start), min(self._len, stop)
+        out: List["Track"] = []
+        if start >= stop:
+            return out
+        ci, off = self._locate(start)
+        while len(out) < stop - start:
+            out.extend(self._chunks[ci][off:off + (stop - start - len(out))])
+            ci, off = ci + 1, 0
+        return out
+
+    def append(self, track: "Track") -> None:
+        self._append(track)
+        self._emit("append", track)
+
+    def _append(self, track: "Track"):
+        if not self._chunks or len(self._chunks[-1]) >= self._load:
+            self._chunks.append([track])
+            self._rebuild_tree()
+        else:
+            self._chunks[-1].append(track)
+            self._bump(len(self._chunks) - 1, 1)
+        self._len += 1
+        self._note(track)
+
+    def extend(self, tracks: Iterable["Track"]) -> None:
+        for track in tracks:
+            self.append(track)
+
+    def appendleft(self, track: "Track") -> None:
+        self.insert(0, track)
+
+    def popleft(self) -> "Track":
+        return self.pop(0)
+
+    def clear(self) -> None:
+        self._reset([])
+        self._emit("reset", [])
+
+    # ----------------------------- positional -----------------------------
+    def insert(self, index: int, track: "Track") -> None:
+        """Insert before `index`; anything past the end appends."""
+        if index < 0:
+            index = max(0, index + self._len)
+        if index >= self._len:
+            self.append(track)
+            return
+        self._insert(index, track)
+        self._emit("insert", index, track)
+
+    def _insert(self, index: int, track: "Track"):
+        ci, off = self._locate(index)
+        chunk = self._chunks[ci]
+        chunk.insert(off, track)
+        self._len += 1
+        self._note(track)
+        if len(chunk) > 2 * self._load:
+            self._chunks[ci:ci + 1] = [chunk[:self._load], chunk[self._load:]]
+            self._rebuild_tree()
+        else:
+            self._bump(ci, 1)
+
+    def pop(self, index: int = -1) -> "Track":
+        index = self._position(index)
+        track = self._pop(index)
+        self._emit("pop", index)
+        return track
+
+    def _pop(self, index: int) -> "Track":
+        ci, off = self._locate(index)
+        chunk = self._chunks[ci]
+        track = chunk.pop(off)
+        self._len -= 1
+        self._forget(track)
+        if chunk:
+            self._bump(ci, -1)
+        else:
+            del self._chunks[ci]
+            self._rebuild_tree()
+        return track
+
+    def move(self, src: int, dst: int) -> "Track":
+        """Move the track at `src` so it ends up at position `dst`. Returns it."""
+        src, dst = self._position(src), self._position(dst)
+        track = self._pop(src)
+        if dst >= self._len:
+            self._append(track)
+        else:
+            self._insert(dst, track)
+        self._emit("move", src, dst)
+        return track
+
+    def jump(self, index: int) -> List["Track"]:
+        """Drop everything before `index` so it becomes the head. Returns the dropped tracks."""
+        index = self._position(index)
+        if not index:
+            return []
+        ci, off = self._locate(index)
+        dropped = list(chain.from_iterable(self._chunks[:ci]))
+        dropped += self._chunks[ci][:off]
+        self._chunks[:ci + 1] = [self._chunks[ci][off:]] if off else [self._chunks[ci]]
+        self._len -= len(dropped)
+        self._unsettled.append(dropped)
+        self.version += 1
+        self._rebuild_tree()
+        self._emit("jump", index)
+        return dropped
+
+    def dedupe(self, keep: Optional[str] = None) -> int:
+        """
+        Drop every later copy of a video already in the queue, keeping first occurrences. A video
+        id passed as `keep` (e.g. the track playing now) counts as already seen. Returns how many
+        tracks were removed.
+        """
+        self._settle()
+        if not self._dupes and not (keep and self._ids[keep]):
+            return 0
+        seen = {keep} if keep else set()
+        removed: List["Track"] = []
+        chunks = []
+        for chunk in self._chunks:
+            kept = []
+            for track in chunk:
+                vid = track.video_id
+                if vid:
+                    if vid in seen:
+                        removed.append(track)
+                        continue
+                    seen.add(vid)
+                kept.append(track)
+            if len(kept) == len(chunk):
+                chunks.append(chunk)   # nothing dropped here; keep the chunk as it is
+            elif kept:
+                chunks.append(kept)
+        if not removed:
+            return 0
+        seen.discard(keep)
+        self._chunks = chunks
+        self._len -= len(removed)
+        self._ids, self._dupes = Counter(dict.fromkeys(seen, 1)), 0
+        self._subtract_durations(removed)
+        self.version += 1
+        self._rebuild_tree()
+        if self.on_change is not None:
+            self._emit("reset", list(self))
+        return len(removed)
+
+    def shuffle(self) -> None:
+        tracks = list(self)
+        random.shuffle(tracks)
+        self._reset(tracks)
+        self._emit("reset", tracks)
+
+    def count(self, video_id: str) -> int:
+        self._settle()
+        return self._ids.get(video_id, 0)
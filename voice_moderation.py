@@ -0,0 +1,200 @@
+from __future__ import annotations
+import asyncio, json, os, time
+from typing import Dict, Optional, Tuple
+
+import discord, config
+from discord import app_commands
+from discord.ext import commands
+
+from member_edits import EDITS
+from timer_wheel import TimerWheel
+
+SANCTIONS_FILE = os.path.join("data", "sanctions.json")
+
+NOT_IN_VOICE = 40032   # Discord error code: "Target user is not connected to voice"
+
+Key = Tuple[int, int]   # (guild id, member id)
+
+
+class VoiceModeration:
+    """
+    Server mute/deafen sanctions (/cringe, /timeout) enforced from voice state events.
+
+    A sanction is re-applied only when Discord reports the member's state no longer matches it
+    (someone unmuted them, they rejoined), and lifted by a single timer rather than a polling
+    loop per command. Active sanctions are saved to data/sanctions.json so they keep holding,
+    and still end on time, across a restart.
+
+    Server mutes outlive a voice session, so a sanction that ends while the member is out of
+    voice is kept as `released` and lifted the next time they join.
+    """
+
+    def __init__(self, path: str = SANCTIONS_FILE):
+        self.path = path
+        self.bot: Optional[commands.Bot] = None
+        self._sanctions: Dict[Key, dict] = {}
+        self._timers = TimerWheel(tick=1, name="sanctions")
+        self._load()
+
+    def attach(self, bot: commands.Bot) -> None:
+        if self.bot is not None:
+            return
+        self.bot = bot
+        bot.add_listener(self._on_ready, "on_ready")
+        bot.add_listener(self._on_voice_state_update, "on_voice_state_update")
+
+        @bot.tree.command(name="modstats", description="Show voice moderation statistics.",
+                          guilds=[discord.Object(id=config.GUILD_ID)])
+        @app_commands.checks.has_permissions(administrator=True)
+        async def modstats(interaction: discord.Interaction):
+            ed = EDITS.stats()
+            active = sum(not s.get("released") for s in self._sanctions.values())
+            lines = [
+                "**Sanctions**",
+                f"Active: {active} • Awaiting release: {len(self._sanctions) - active} • Timers: {len(self._timers)}",
+                "",
+                "**Member edits**",
+                f"Queued: {ed['queued']} • In flight: {ed['in_flight']} • Sent: {ed['sent']} • "
+                f"Coalesced: {ed['coalesced']} • Failed: {ed['failed']}",
+                f"429s: {EDITS.rate_limited.get(interaction.guild_id, 0)} here, {ed['rate_limited']} total",
+            ]
+            await interaction.response.send_message("\n".join(lines), ephemeral=True)
+
+    # ----------------------------- commands -----------------------------
+    async def sanction(self, member: discord.Member, seconds: int, *, mute: bool, deafen: bool,
+                       reason: str, release_reason: str, channel: Optional[discord.abc.Messageable] = None,
+                       release_message: Optional[str] = None) -> None:
+        """
+        Mute and/or deafen `member` for `seconds`. Overlapping sanctions merge: the member stays
+        under every restriction either one asked for, until the later of the two ends.
+        """
+        key = (member.guild.id, member.id)
+        s = self._sanctions.get(key)
+        if s is None or s.get("released"):
+            s = self._sanctions[key] = {"mute": False, "deafen": False, "until": 0.0}
+        s.update({
+            "mute": s["mute"] or mute,
+            "deafen": s["deafen"] or deafen,
+            "until": max(s["until"], time.time() + seconds),
+            "reason": reason,
+            "release_reason": release_reason,
+            "channel": getattr(channel, "id", None),
+            "release_message": release_message,
+            "released": False,
+        })
+        self._save()
+        self._schedule(key)
+        await self._enforce(member)
+
+    def active(self, member: discord.Member) -> Optional[dict]:
+        s = self._sanctions.get((member.guild.id, member.id))
+        return None if s is None or s.get("released") else s
+
+    # ----------------------------- enforcement -----------------------------
+    @staticmethod
+    def _wanted(s: dict) -> dict:
+        """The member.edit() fields a sanction (or its release) calls for."""
+        on = not s.get("released")
+        out = {}
+        if s["mute"]:
+            out["mute"] = on
+        if s["deafen"]:
+            out["deafen"] = on
+        return out
+
+    @staticmethod
+    def _differs(voice: discord.VoiceState, wanted: dict) -> bool:
+        return ("mute" in wanted and voice.mute != wanted["mute"]) or ("deafen" in wanted and voice.deaf != wanted["deafen"])
+
+    async def _on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
+        s = self._sanctions.get((member.guild.id, member.id))
+        if s is None or after.channel is None:
+            return
+        if self._differs(after, self._wanted(s)):
+            await self._enforce(member)
+
+    async def _enforce(self, member: discord.Member) -> None:
+        """Bring the member in line with their sanction via EDITS, which merges repeats into one PATCH."""
+        key = (member.guild.id, member.id)
+        s = self._sanctions.get(key)
+        if s is None:
+            return
+        releasing = bool(s.get("released"))
+        try:
+            await EDITS.submit(member, s["release_reason"] if releasing else s["reason"], **self._wanted(s))
+        except discord.HTTPException as e:
+            if getattr(e, "code", None) != NOT_IN_VOICE:   # otherwise re-applied when they join
+                print(f"[moderation] edit of {member} failed: {type(e).__name__}: {e}")
+            return
+        if releasing and self._sanctions.get(key) is s:
+            self._sanctions.pop(key)   # release went through
+            self._save()
+
+    # ----------------------------- release -----------------------------
+    def _schedule(self, key: Key):
+        s = self._sanctions[key]
+        self._timers.schedule(key, max(0.0, s["until"] - time.time()), lambda: asyncio.create_task(self._release(key)))
+
+    async def _release(self, key: Key):
+        s = self._sanctions.get(key)
+        if s is None or s.get("released"):
+            return
+        if s["until"] > time.time() + 1:
+            self._schedule(key)   # extended while the timer was pending
+            return
+        s["released"] = True
+        self._save()
+
+        guild = self.bot.get_guild(key[0]) if self.bot else None
+        member = guild.get_member(key[1]) if guild else None
+        if member is None and guild is not None:
+            try:
+                member = await guild.fetch_member(key[1])
+            except discord.HTTPException:
+                member = None
+        if member is not None:
+            await self._enforce(member)
+            channel = self.bot.get_channel(s["channel"]) if s.get("channel") else None
+            if channel is not None and s.get("release_message"):
+                try:
+                    await channel.send(s["release_message"].format(name=member.display_name))
+                except discord.HTTPException:
+                    pass
+
+    async def _on_ready(self):
+        # sanctions from before a restart: release the ones that ran out, re-arm the rest
+        for key, s in list(self._sanctions.items()):
+            if s.get("released"):
+                continue
+            if s["until"] <= time.time():
+                await self._release(key)
+            else:
+                self._schedule(key)
+
+    # ----------------------------- persistence -----------------------------
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"[moderation] Could not read {self.path}: {type(e).__name__}: {e}")
+            return
+        for k, s in raw.items():
+            guild_id, member_id = k.split(":")
+            self._sanctions[(int(guild_id), int(member_id))] = s
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({f"{g}:{m}": s for (g, m), s in self._sanctions.items()}, f)
+        os.replace(tmp, self.path)
+
+
+MODERATION = VoiceModeration()
+
+
+def setup(bot: commands.Bot | discord.Bot) -> None:
+    MODERATION.attach(bot)
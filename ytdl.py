@@ -0,0 +1,328 @@
+from __future__ import annotations
+import asyncio, contextlib, importlib, itertools, multiprocessing, sys, threading, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+
+import yt_dlp
+from yt_dlp.utils import DownloadError, ExtractorError
+
+CLIENT_CHAIN = ["tv_embedded", "android", "web_creator"]  # avoid plain "web"
+
+HEALTH_WINDOW = 50   # recent attempts remembered per client
+PROBE_EVERY = 25     # every Nth query leads with a demoted client to see if it recovered
+
+INTERACTIVE = 0   # someone is waiting on this (/play, /playnext, the track about to play)
+BACKGROUND = 1    # playlist backfill, prefetch
+
+_local = threading.local()
+
+Attempt = Tuple[str, bool, float]   # (client, succeeded, seconds)
+
+
+class ExtractionError(Exception):
+    """A yt-dlp failure carried back from a worker process as plain text."""
+
+
+class ClientHealth:
+    """
+    Sliding-window success rate and latency per player client, used to order the fallback chain
+    so the client that currently works is tried first. Only touched from the event loop.
+    """
+
+    def __init__(self, clients: Sequence[str], window: int = HEALTH_WINDOW, probe_every: int = PROBE_EVERY):
+        self.clients = list(clients)
+        self.probe_every = probe_every
+        self._samples: Dict[str, Deque[Tuple[bool, float]]] = {c: deque(maxlen=window) for c in self.clients}
+        self._last_tried: Dict[str, float] = {c: 0.0 for c in self.clients}
+        self._queries = 0
+        self.probes = 0
+
+    def record(self, client: str, ok: bool, latency: float) -> None:
+        self._samples[client].append((ok, latency))
+        self._last_tried[client] = time.monotonic()
+
+    def success_rate(self, client: str) -> float:
+        samples = self._samples[client]
+        if not samples:
+            return 1.0   # untried clients get the benefit of the doubt
+        return sum(ok for ok, _ in samples) / len(samples)
+
+    def latency(self, client: str) -> float:
+        ok_times = [t for ok, t in self._samples[client] if ok]
+        return sum(ok_times) / len(ok_times) if ok_times else float("inf")
+
+    def order(self) -> List[str]:
+        """Healthiest client first; the original chain order breaks ties."""
+        self._queries += 1
+        ranked = sorted(self.clients, key=lambda c: (-self.success_rate(c), self.latency(c), self.clients.index(c)))
+        if self.probe_every and self._queries % self.probe_every == 0 and len(ranked) > 1:
+            # lead with the demoted client we've heard from least recently
+            stale = min(ranked[1:], key=lambda c: self._last_tried[c])
+            ranked.remove(stale)
+            ranked.insert(0, stale)
+            self.probes += 1
+        return ranked
+
+    def stats(self) -> List[dict]:
+        return [
+            {
+                "client": c,
+                "attempts": len(self._samples[c]),
+                "success_rate": self.success_rate(c),
+                "latency": self.latency(c),
+            }
+            for c in sorted(self.clients, key=lambda c: (-self.success_rate(c), self.latency(c)))
+        ]
+
+
+HEALTH = ClientHealth(CLIENT_CHAIN)
+
+
+def _options(client: str, flat: bool) -> dict:
+    opts = {
+        "format": "ba/bestaudio/best",
+        "noplaylist": True,
+        # Do not force-disable manifests; let yt-dlp pick workable ones
+        "extractor_args": {"youtube": {"player_client": client}},
+        "quiet": True,
+        "no_warnings": True,
+    }
+    if flat:
+        opts["extract_flat"] = "in_playlist"
+    return opts
+
+
+def _instance(client: str, flat: bool) -> yt_dlp.YoutubeDL:
+    """
+    This thread's long-lived YoutubeDL for a player client. Instances are never shared between
+    threads, so each keeps its own extractor state, cookie jar and HTTP connections warm across
+    queries without any locking.
+    """
+    pool: Dict[Tuple[str, bool], yt_dlp.YoutubeDL] = getattr(_local, "instances", None)
+    if pool is None:
+        pool = _local.instances = {}
+    ydl = pool.get((client, flat))
+    if ydl is None:
+        ydl = pool[(client, flat)] = yt_dlp.YoutubeDL(_options(client, flat))
+    return ydl
+
+
+def _retryable(e: Exception) -> bool:
+    # SABR or missing URL indicators mean this client can't serve the video; another might.
+    msg = str(e)
+    return ("SABR" in msg) or ("missing a url" in msg) or ("Requested format is not available" in msg)
+
+
+# how yt-dlp words it when the video itself is gone (removed, private, blocked), rather than the
+# network or a player client failing us
+_UNAVAILABLE = ("video unavailable", "this video is unavailable", "no longer available", "private video",
+                "has been removed", "has been terminated")
+
+def is_unavailable(e: Exception) -> bool:
+    """True only for an extraction error that says the video can't be played by anyone."""
+    msg = str(e).lower()
+    return isinstance(e, ExtractionError) and any(marker in msg for marker in _UNAVAILABLE)
+
+
+_KEEP_FIELDS = ("_type", "id", "title", "duration", "url", "webpage_url", "extractor_key", "ie_key")
+
+def _slim(info: Optional[dict]) -> Optional[dict]:
+    """Only the fields music.py and the caches read, so results are cheap to send back across the process boundary."""
+    if info is None:
+        return None
+    out = {k: info[k] for k in _KEEP_FIELDS if k in info}
+    if "entries" in info:
+        out["entries"] = [_slim(e) for e in (info.get("entries") or [])]
+    return out
+
+
+def run_extraction(query: str, flat: bool, clients: Sequence[str]) -> Tuple[Optional[dict], Optional[Exception], List[Attempt]]:
+    """
+    Blocking extraction with SABR-resistant client fallbacks, tried in the given order. Runs in an
+    extraction worker process. Returns (info, error, attempts) so the caller can update ClientHealth.
+    """
+    attempts: List[Attempt] = []
+    last_err = None
+    for client in clients:
+        started = time.perf_counter()
+        try:
+            info = _instance(client, flat).extract_info(query, download=False)
+            attempts.append((client, True, time.perf_counter() - started))
+            return _slim(info), None, attempts
+        except (DownloadError, ExtractorError) as e:
+            if _retryable(e):
+                attempts.append((client, False, time.perf_counter() - started))
+                last_err = e
+                continue
+            # Other error (bad video, network). Not the client's fault; bubble up.
+            return None, ExtractionError(str(e)), attempts
+    # If all clients failed, raise the last error so callers can message the user.
+    return None, ExtractionError(str(last_err) if last_err else "yt-dlp failed with unknown error"), attempts
+
+
+def extract(query: str, flat: bool = False, clients: Sequence[str] = CLIENT_CHAIN) -> dict:
+    info, err, _ = run_extraction(query, flat, clients)
+    if err is not None:
+        raise err
+    return info
+
+
+def _warm_worker():
+    """Process pool initializer: pay the yt_dlp import and YoutubeDL construction before the first query."""
+    import yt_dlp.extractor.youtube  # noqa: F401  (the extractor we actually use)
+    for client in CLIENT_CHAIN:
+        _instance(client, False)
+        _instance(client, True)
+
+
+def _ping() -> bool:
+    return True
+
+
+@contextlib.contextmanager
+def _worker_main():
+    """Processes spawned inside this block run ytdl_worker as their __main__ rather than bot.py."""
+    # multiprocessing tells a spawned child what to import as __main__ from __main__.__spec__
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = importlib.import_module("ytdl_worker")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+class _Job:
+    __slots__ = ("key", "priority", "future", "started")
+
+    def __init__(self, key: Tuple[str, bool], priority: int, future: asyncio.Future):
+        self.key = key
+        self.priority = priority
+        self.future = future
+        self.started = False
+
+
+class ExtractionScheduler:
+    """
+    Runs yt-dlp in a dedicated pool of warm worker processes, away from the default executor and
+    the GIL that discord.py's voice and gateway threads share.
+
+    Requests wait in a priority queue and exactly `workers` dispatchers feed the pool, so the pool
+    never builds its own FIFO backlog: an interactive /play submitted behind 50 playlist lookups
+    starts on the next free worker. Identical pending requests share one job; a higher priority
+    caller promotes it.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self._pool = self._new_pool()
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._jobs: Dict[Tuple[str, bool], _Job] = {}
+        self._seq = itertools.count()
+        self._dispatchers: List[asyncio.Task] = []
+        self.in_flight = 0
+        self.completed = 0
+        self.restarts = 0
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn everywhere so Linux workers start as clean as Windows ones (no forked event loop)
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_warm_worker)
+        # start and warm every worker now rather than on the first /play; the pool only spawns from
+        # submit(), so every worker it will ever have is started here, from ytdl_worker
+        with _worker_main():
+            for _ in range(self.workers):
+                pool.submit(_ping)
+        return pool
+
+    def submit(self, query: str, flat: bool, priority: int) -> asyncio.Future:
+        if self._queue is None:
+            self._queue = asyncio.PriorityQueue()
+            self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        key = (query, flat)
+        job = self._jobs.get(key)
+        if job is None:
+            job = self._jobs[key] = _Job(key, priority, asyncio.get_running_loop().create_future())
+            self._queue.put_nowait((priority, next(self._seq), job))
+        elif priority < job.priority and not job.started:
+            job.priority = priority
+            self._queue.put_nowait((priority, next(self._seq), job))   # old entry is skipped when popped
+        return job.future
+
+    def promote(self, query: str, flat: bool = False) -> None:
+        job = self._jobs.get((query, flat))
+        if job is not None and not job.started and job.priority > INTERACTIVE:
+            job.priority = INTERACTIVE
+            self._queue.put_nowait((INTERACTIVE, next(self._seq), job))
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, job = await self._queue.get()
+            if job.started:
+                continue
+            job.started = True
+            self.in_flight += 1
+            query, flat = job.key
+            pool = self._pool
+            try:
+                info, err, attempts = await loop.run_in_executor(pool, run_extraction, query, flat, HEALTH.order())
+            except BrokenProcessPool as e:
+                # every job that was on the dead pool lands here; only the first one replaces it
+                if self._pool is pool:
+                    print("[ytdl] worker process died; restarting the pool")
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    self._pool = self._new_pool()
+                    self.restarts += 1
+                info, err, attempts = None, ExtractionError(str(e) or "worker process died"), []
+            except Exception as e:
+                info, err, attempts = None, e, []
+            finally:
+                self.in_flight -= 1
+                self._jobs.pop(job.key, None)
+            self.completed += 1
+            for client, ok, latency in attempts:
+                HEALTH.record(client, ok, latency)
+            if not job.future.done():
+                if err is not None:
+                    job.future.set_exception(err)
+                else:
+                    job.future.set_result(info)
+
+    def stats(self) -> dict:
+        waiting = [j for j in self._jobs.values() if not j.started]
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queued_interactive": sum(j.priority == INTERACTIVE for j in waiting),
+            "queued_background": sum(j.priority != INTERACTIVE for j in waiting),
+            "completed": self.completed,
+            "restarts": self.restarts,
+        }
+
+
+SCHEDULER: Optional[ExtractionScheduler] = None
+
+
+def configure(workers: int) -> None:
+    """Start the extraction process pool. Only call from the bot process, never at import time."""
+    global SCHEDULER
+    if SCHEDULER is None:
+        SCHEDULER = ExtractionScheduler(workers)
+
+
+async def search(query: str, flat: bool = False, priority: int = INTERACTIVE) -> dict:
+    """
+    Return yt-dlp info dict (trimmed to _type/id/title/duration/url/entries) for a single track or
+    ytsearch1 result. flat=True only lists search results without resolving any stream formats.
+    """
+    if SCHEDULER is None:
+        configure(4)
+    return await asyncio.shield(SCHEDULER.submit(query, flat, priority))
+
+
+def promote(query: str, flat: bool = False) -> None:
+    """Someone is now waiting on a pending background extraction; move it to the front."""
+    if SCHEDULER is not None:
+        SCHEDULER.promote(query, flat)
@@ -0,0 +1,8 @@
+"""
+Entry module for the yt-dlp worker processes.
+
+Spawned children re-run their parent's __main__ before unpickling any work. For the bot that is
+bot.py, which imports music and every command module (opening their caches and data files) in
+each worker. ExtractionScheduler starts its workers with this module as __main__ instead, so a
+worker imports nothing beyond ytdl itself, which it loads when the first job arrives.
+"""